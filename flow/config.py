@@ -4,12 +4,23 @@ import os
 
 PYTHON_COMMAND = "python"
 
-SUMO_SLEEP = 1.0  # Delay between initializing SUMO and connecting with TraCI
+# Maximum delay between initializing SUMO and connecting with TraCI
+SUMO_CONNECT_TIMEOUT = 60.0
 
 PROJECT_PATH = osp.abspath(osp.join(osp.dirname(__file__), '..'))
 
 LOG_DIR = PROJECT_PATH + "/data"
 
+# directory of the cache of networks generated by sumo's netconvert, unless
+# another one is specified in the simulation parameters. The networks are
+# unpickled, so the directory must only be writable by the current user.
+NET_CACHE_DIR = osp.join(osp.expanduser("~"), ".cache", "flow", "net")
+
+# directory of the cache of the states of environments after warm-up, unless
+# another one is specified in the simulation parameters. The states are
+# unpickled, so the directory must only be writable by the current user.
+WARMUP_CACHE_DIR = osp.join(osp.expanduser("~"), ".cache", "flow", "warmup")
+
 # users set both of these in their bash_rc or bash_profile
 # and also should run aws configure after installing awscli
 AWS_ACCESS_KEY = os.environ.get("AWS_ACCESS_KEY", None)
@@ -29,6 +29,10 @@ class BaseController:
         variance of the gaussian from which to sample a noisy acceleration
     """
 
+    # whether the controller may skip the intermediate simulation steps of an
+    # environment step, see flow.core.params.EnvParams.batch_substeps
+    batch_substeps = False
+
     def __init__(self,
                  veh_id,
                  car_following_params,
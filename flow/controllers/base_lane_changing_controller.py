@@ -17,6 +17,10 @@ class BaseLaneChangeController:
         is willing to lane-change into.
     """
 
+    # whether the controller may skip the intermediate simulation steps of an
+    # environment step, see flow.core.params.EnvParams.batch_substeps
+    batch_substeps = False
+
     def __init__(self, veh_id, lane_change_params=None):
         """Instantiate the base class for lane-changing controllers."""
         if lane_change_params is None:
@@ -15,6 +15,10 @@ class BaseRouter:
         Dictionary of router params
     """
 
+    # whether the controller may skip the intermediate simulation steps of an
+    # environment step, see flow.core.params.EnvParams.batch_substeps
+    batch_substeps = False
+
     def __init__(self, veh_id, router_params):
         """Instantiate the base class for routing controllers."""
         self.veh_id = veh_id
@@ -36,3 +40,26 @@ class BaseRouter:
             time step.
         """
         raise NotImplementedError
+
+    @classmethod
+    def choose_routes(cls, routers, env):
+        """Return the routes chosen by several controllers of this class.
+
+        This is called once per step for all routing controllers of the same
+        class, and may be overridden to choose the routes of all vehicles at
+        once (e.g. with a single batch query to the vehicle kernel). By
+        default, the routes are chosen one vehicle at a time.
+
+        Parameters
+        ----------
+        routers : list of BaseRouter
+            routing controllers of the vehicles
+        env : flow.envs.Env
+            see flow/envs/base_env.py
+
+        Returns
+        -------
+        list of (list or None)
+            the route chosen by every controller, see choose_route
+        """
+        return [router.choose_route(env) for router in routers]
@@ -408,6 +408,9 @@ class SimCarFollowingController(BaseController):
     available through sumo when initializing the parameters of the vehicle.
     """
 
+    # the simulator acts at every simulation step on its own
+    batch_substeps = True
+
     def get_accel(self, env):
         """See parent class."""
         return None
@@ -7,6 +7,9 @@ from flow.controllers.base_lane_changing_controller import \
 class SimLaneChangeController(BaseLaneChangeController):
     """A controller used to enforce sumo lane-change dynamics on a vehicle."""
 
+    # the simulator acts at every simulation step on its own
+    batch_substeps = True
+
     def get_lane_change_action(self, env):
         """See parent class."""
         return None
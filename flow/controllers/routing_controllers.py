@@ -1,10 +1,33 @@
-import random
-
 """Contains a list of custom routing controllers."""
 
 from flow.controllers.base_routing_controller import BaseRouter
 
 
+def _route_ends(routers, env):
+    """Return the edge of every vehicle, and whether it ends its route.
+
+    Parameters
+    ----------
+    routers : list of flow.controllers.BaseRouter
+        routing controllers of the vehicles
+    env : flow.envs.Env
+        see flow/envs/base_env.py
+
+    Returns
+    -------
+    list of str
+        the edge of every vehicle
+    list of bool
+        whether every vehicle is on the last edge of its route
+    """
+    veh_ids = [router.veh_id for router in routers]
+    edges = env.k.vehicle.get_edge(veh_ids)
+    routes = env.k.vehicle.get_route(veh_ids)
+    at_end = [len(route) > 0 and edge == route[-1]
+              for edge, route in zip(edges, routes)]
+    return edges, at_end
+
+
 class ContinuousRouter(BaseRouter):
     """A router used to continuously re-route of the vehicle in a closed loop.
 
@@ -20,6 +43,17 @@ class ContinuousRouter(BaseRouter):
         else:
             return None
 
+    @classmethod
+    def choose_routes(cls, routers, env):
+        """See parent class."""
+        if cls.choose_route is not ContinuousRouter.choose_route:
+            # subclasses with their own routing logic route one at a time
+            return super().choose_routes(routers, env)
+
+        edges, at_end = _route_ends(routers, env)
+        return [env.available_routes[edge] if end else None
+                for edge, end in zip(edges, at_end)]
+
 
 class MinicityRouter(BaseRouter):
     """A router used to continuously re-route vehicles in minicity scenario.
@@ -29,31 +63,39 @@ class MinicityRouter(BaseRouter):
 
     def choose_route(self, env):
         """See parent class."""
-        vehicles = env.k.vehicle
-        veh_id = self.veh_id
-        veh_edge = vehicles.get_edge(veh_id)
-        veh_route = vehicles.get_route(veh_id)
-        veh_next_edge = env.k.scenario.next_edge(veh_edge,
-                                                 vehicles.get_lane(veh_id))
-        not_an_edge = ":"
-        no_next = 0
-
-        if len(veh_next_edge) == no_next:
-            next_route = None
-        elif veh_route[-1] == veh_edge:
-            random_route = random.randint(0, len(veh_next_edge) - 1)
-            while veh_next_edge[0][0][0] == not_an_edge:
-                veh_next_edge = env.k.scenario.next_edge(
-                    veh_next_edge[random_route][0],
-                    veh_next_edge[random_route][1])
-            next_route = [veh_edge, veh_next_edge[0][0]]
-        else:
-            next_route = None
-
-        if veh_edge in ['e_37', 'e_51']:
-            next_route = [veh_edge, 'e_29_u', 'e_21']
-
-        return next_route
+        return MinicityRouter.choose_routes([self], env)[0]
+
+    @classmethod
+    def choose_routes(cls, routers, env):
+        """See parent class.
+
+        The next edge of every vehicle that reached the end of its route is
+        chosen at random from the routing engine of the scenario, among the
+        edges that can be reached from the lane the vehicle is in.
+        """
+        if cls.choose_route is not MinicityRouter.choose_route:
+            # subclasses with their own routing logic route one at a time
+            return super().choose_routes(routers, env)
+
+        edges, at_end = _route_ends(routers, env)
+        ending = [edge for edge, end in zip(edges, at_end) if end]
+        lanes = env.k.vehicle.get_lane(
+            [router.veh_id for router, end in zip(routers, at_end) if end])
+        random_routes = iter(
+            env.k.scenario.get_routing_engine().random_routes(
+                ending, lanes=lanes))
+
+        routes = []
+        for edge, end in zip(edges, at_end):
+            next_route = next(random_routes) if end else None
+            if next_route is not None and len(next_route) < 2:
+                # no edge follows the current edge
+                next_route = None
+            if edge in ['e_37', 'e_51']:
+                next_route = [edge, 'e_29_u', 'e_21']
+            routes.append(next_route)
+
+        return routes
 
 
 class GridRouter(BaseRouter):
@@ -68,6 +110,62 @@ class GridRouter(BaseRouter):
 
         return new_route
 
+    @classmethod
+    def choose_routes(cls, routers, env):
+        """See parent class."""
+        if cls.choose_route is not GridRouter.choose_route:
+            # subclasses with their own routing logic route one at a time
+            return super().choose_routes(routers, env)
+
+        edges, at_end = _route_ends(routers, env)
+        return [[edge] if end else None for edge, end in zip(edges, at_end)]
+
+
+class ShortestPathRouter(BaseRouter):
+    """A router used to route vehicles along shortest paths to a destination.
+
+    Once a vehicle reaches the end of its route, it is re-routed along the
+    shortest path (in distance) from its current edge to the edge specified
+    by the "destination" router parameter. Vehicles that already reached
+    their destination, or cannot reach it, keep their current route.
+
+    Usage
+    -----
+    >>> from flow.core.params import VehicleParams
+    >>> vehicles = VehicleParams()
+    >>> vehicles.add(
+    >>>     veh_id="human",
+    >>>     routing_controller=(ShortestPathRouter, {"destination": "top"}))
+    """
+
+    def choose_route(self, env):
+        """See parent class."""
+        return ShortestPathRouter.choose_routes([self], env)[0]
+
+    @classmethod
+    def choose_routes(cls, routers, env):
+        """See parent class.
+
+        The shortest paths are read from the routing engine of the scenario,
+        which computes the shortest path tree towards every destination once.
+        """
+        if cls.choose_route is not ShortestPathRouter.choose_route:
+            # subclasses with their own routing logic route one at a time
+            return super().choose_routes(routers, env)
+
+        engine = env.k.scenario.get_routing_engine()
+        edges, at_end = _route_ends(routers, env)
+
+        routes = []
+        for router, edge, end in zip(routers, edges, at_end):
+            destination = router.router_params["destination"]
+            if not end or edge == destination:
+                routes.append(None)
+            else:
+                routes.append(engine.shortest_path(edge, destination))
+
+        return routes
+
 
 class BayBridgeRouter(ContinuousRouter):
     """Assists in choosing routes in select cases for the Bay Bridge scenario.
@@ -0,0 +1,128 @@
+"""Script containing the storage of environment checkpoints."""
+
+import collections
+import os
+import pickle
+import shutil
+import tempfile
+
+
+class CheckpointStore(object):
+    """Storage of the checkpoints of an environment, see Env.checkpoint.
+
+    Every checkpoint is pickled to a file as soon as it is saved, and only the
+    most recently used checkpoints are additionally kept in memory, so that
+    holding many checkpoints (e.g. when branching rollouts in a tree search)
+    does not hold the state of all of them in memory.
+
+    Usage
+    -----
+        >>> store = CheckpointStore(max_in_memory=4)
+        >>> token = store.save(state)
+        >>> state = store.load(token)
+        >>> store.clear()
+
+    Attributes
+    ----------
+    max_in_memory : int
+        maximum number of checkpoints kept in memory
+    """
+
+    def __init__(self, max_in_memory=8):
+        """Instantiate the store.
+
+        Parameters
+        ----------
+        max_in_memory : int, optional
+            maximum number of checkpoints kept in memory
+        """
+        self.max_in_memory = max_in_memory
+        # directory of the pickled checkpoints, created when the first
+        # checkpoint is saved
+        self._directory = None
+        # token of the next checkpoint
+        self._next_token = 0
+        # recently used checkpoints, from the least to the most recently used
+        self._in_memory = collections.OrderedDict()
+
+    def __contains__(self, token):
+        return self._directory is not None and \
+            os.path.exists(self._path(token))
+
+    def save(self, state):
+        """Store a checkpoint.
+
+        Parameters
+        ----------
+        state : any
+            the checkpoint, which must be picklable. It must not be modified
+            afterwards.
+
+        Returns
+        -------
+        int
+            the token used to load the checkpoint
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="flow_checkpoints_")
+        token = self._next_token
+        self._next_token += 1
+
+        with open(self._path(token), "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(token, state)
+
+        return token
+
+    def load(self, token):
+        """Return a stored checkpoint.
+
+        The returned checkpoint must not be modified, as it may be returned
+        again by later calls.
+
+        Parameters
+        ----------
+        token : int
+            the token returned when the checkpoint was saved
+
+        Raises
+        ------
+        KeyError
+            if no checkpoint with this token is stored
+        """
+        state = self._in_memory.get(token)
+        if state is not None:
+            self._in_memory.move_to_end(token)
+            return state
+
+        if token not in self:
+            raise KeyError("No checkpoint with token {}".format(token))
+        with open(self._path(token), "rb") as f:
+            state = pickle.load(f)
+        self._remember(token, state)
+
+        return state
+
+    def remove(self, token):
+        """Remove a stored checkpoint (if it exists)."""
+        self._in_memory.pop(token, None)
+        if token in self:
+            os.remove(self._path(token))
+
+    def clear(self):
+        """Remove all stored checkpoints."""
+        self._in_memory.clear()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def _path(self, token):
+        """Return the file a checkpoint is pickled to."""
+        return os.path.join(self._directory, "{}.pkl".format(token))
+
+    def _remember(self, token, state):
+        """Keep a checkpoint in memory, forgetting the least recently used."""
+        self._in_memory[token] = state
+        self._in_memory.move_to_end(token)
+        while len(self._in_memory) > self.max_in_memory:
+            self._in_memory.popitem(last=False)
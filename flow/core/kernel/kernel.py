@@ -5,6 +5,7 @@ from flow.core.kernel.scenario import TraCIScenario, AimsunKernelScenario
 from flow.core.kernel.vehicle import TraCIVehicle, AimsunKernelVehicle
 from flow.core.kernel.traffic_light import TraCITrafficLight, \
     AimsunKernelTrafficLight
+from flow.core.params import SubscriptionProfile
 from flow.utils.exceptions import FatalFlowError
 
 
@@ -44,7 +45,7 @@ class Kernel(object):
     traffic simulators, e.g. SUMO, AIMSUN, TruckSim, etc...
     """
 
-    def __init__(self, simulator, sim_params):
+    def __init__(self, simulator, sim_params, subscriptions=None):
         """Instantiate a Flow kernel object.
 
         Parameters
@@ -53,6 +54,10 @@ class Kernel(object):
             simulator type, must be one of {"traci"}
         sim_params : flow.core.params.SimParams
             simulation-specific parameters
+        subscriptions : flow.core.params.SubscriptionProfile, optional
+            variables the kernel subclasses subscribe to in the simulator.
+            Defaults to the profile in the simulation parameters, or to the
+            default profile if none is specified there.
 
         Raises
         ------
@@ -61,6 +66,15 @@ class Kernel(object):
         """
         self.kernel_api = None
 
+        # profiler of the phases of environment steps, set by the environment
+        # if profiling is enabled (see flow.core.params.EnvParams.profile)
+        self.profiler = None
+
+        # variables the kernel subclasses subscribe to in the simulator
+        self.subscriptions = subscriptions \
+            or getattr(sim_params, "subscriptions", None) \
+            or SubscriptionProfile()
+
         if simulator == "traci":
             self.simulation = TraCISimulation(self)
             self.scenario = TraCIScenario(self, sim_params)
@@ -102,6 +116,45 @@ class Kernel(object):
         self.scenario.update(reset)
         self.simulation.update(reset)
 
+    def save_state(self, in_memory=False):
+        """Save the current state of the simulation and of the kernel.
+
+        The state of the simulator is saved by the simulation kernel, and the
+        matching information stored by the vehicle and traffic light kernels
+        is copied, so that the kernel can be restored to the current time
+        step with `load_state` instead of being recomputed from the
+        simulator.
+
+        Parameters
+        ----------
+        in_memory : bool, optional
+            specifies whether the state of the simulator is held in memory
+            (see flow.core.kernel.simulation.KernelSimulation.save_state)
+
+        Returns
+        -------
+        dict
+            the saved states of the simulation, vehicle, and traffic light
+            kernels
+        """
+        return {
+            "simulation": self.simulation.save_state(in_memory),
+            "vehicle": self.vehicle.save_state(),
+            "traffic_light": self.traffic_light.save_state(),
+        }
+
+    def load_state(self, state):
+        """Restore the simulation and the kernel to a saved state.
+
+        Parameters
+        ----------
+        state : dict
+            a state returned by `save_state` since the simulation was started
+        """
+        self.simulation.load_state(state["simulation"])
+        self.vehicle.load_state(state["vehicle"])
+        self.traffic_light.load_state(state["traffic_light"])
+
     def close(self):
         """Terminate all components within the simulation and scenario."""
         self.scenario.close()
@@ -39,6 +39,8 @@ class AimsunKernelScenario(KernelScenario):
 
     def generate_network(self, scenario):
         self.network = scenario
+        self._lane_graph = None
+        self._routing_engine = None
 
         output = {
             "edges": scenario.edges,
@@ -156,6 +158,7 @@ class AimsunKernelScenario(KernelScenario):
         self.total_edgestarts.sort(key=lambda tup: tup[1])
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
+        self._index_edgestarts()
 
         # specify routes vehicles can take  # TODO: move into a method
         self.rts = self.network.routes
@@ -233,14 +236,15 @@ class AimsunKernelScenario(KernelScenario):
         return list(
             set(self._edges.keys()) - set(self._edge_list))
 
-    def get_edge(self, x):  # TODO: maybe remove
+    def get_edge(self, x):
         """See parent class."""
-        for (edge, start_pos) in reversed(self.total_edgestarts):
-            if x >= start_pos:
-                return edge, x - start_pos
+        return self._find_edge(x)
 
-    def get_x(self, edge, position):  # TODO: maybe remove
+    def get_x(self, edge, position):
         """See parent class."""
+        if not isinstance(edge, str):
+            return self._batch_x(edge, position)
+
         # if there was a collision which caused the vehicle to disappear,
         # return an x value of -1001
         if len(edge) == 0:
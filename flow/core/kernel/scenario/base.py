@@ -5,6 +5,8 @@ import random
 import numpy as np
 from copy import deepcopy
 from flow.utils.exceptions import FatalFlowError
+from flow.core.kernel.scenario.lane_graph import LaneGraph
+from flow.core.kernel.scenario.routing import RoutingEngine
 
 # length of vehicles in the network, in meters
 VEHICLE_LENGTH = 5
@@ -73,6 +75,18 @@ class KernelScenario(object):
         self.total_edgestarts = None
         self.total_edgestarts_dict = None
 
+        # index of every edge in total_edgestarts, and the starting positions
+        # of all edges in the same order, see `_index_edgestarts`
+        self._edge_index = None
+        self._edge_ids = None
+        self._edge_starts = None
+
+        # lane graph of the network, computed once per generated network
+        self._lane_graph = None
+
+        # routing engine of the network, computed once per generated network
+        self._routing_engine = None
+
     def generate_network(self, network):
         """Generate the necessary prerequisites for the simulating a network.
 
@@ -154,7 +168,7 @@ class KernelScenario(object):
         """Return the names of all junctions in the network."""
         raise NotImplementedError
 
-    def get_edge(self, x):  # TODO: maybe remove
+    def get_edge(self, x):
         """Compute an edge and relative position from an absolute position.
 
         Parameters
@@ -170,19 +184,22 @@ class KernelScenario(object):
         """
         raise NotImplementedError
 
-    def get_x(self, edge, position):  # TODO: maybe remove
+    def get_x(self, edge, position):
         """Return the absolute position on the track.
 
+        If a list of edges is provided, the absolute positions of all
+        edge/position pairs are computed at once.
+
         Parameters
         ----------
-        edge : str
+        edge : str or list of str
             name of the edge
-        position : float
+        position : float or array_like
             relative position on the edge
 
         Returns
         -------
-        float
+        float or np.ndarray
             position with respect to some global reference
         """
         raise NotImplementedError
@@ -203,6 +220,163 @@ class KernelScenario(object):
         """
         raise NotImplementedError
 
+    def get_edge_mean_speed(self, edge_id):
+        """Return the mean speed (m/s) of the vehicles on an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_edge_vehicle_number(self, edge_id):
+        """Return the number of vehicles on an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        int
+        """
+        raise NotImplementedError
+
+    def get_edge_halting_number(self, edge_id):
+        """Return the number of halting vehicles on an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        int
+        """
+        raise NotImplementedError
+
+    def get_edge_occupancy(self, edge_id):
+        """Return the occupancy (in %) of an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_edge_waiting_time(self, edge_id):
+        """Return the total waiting time (s) of the vehicles on an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_edge_travel_time(self, edge_id):
+        """Return the current travel time (in seconds) of an edge.
+
+        Parameters
+        ----------
+        edge_id : str
+            name of the edge
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def _index_edgestarts(self):
+        """Index the starting positions of the edges in total_edgestarts.
+
+        This is called by the generate_network method once total_edgestarts
+        is known, and allows the get_edge and get_x methods to find edges and
+        positions with binary searches and array operations.
+        """
+        self._edge_ids = [edge for edge, _ in self.total_edgestarts]
+        self._edge_starts = np.array(
+            [start for _, start in self.total_edgestarts], dtype=float)
+        self._edge_index = {
+            edge: i for i, edge in enumerate(self._edge_ids)}
+
+    def _find_edge(self, x):
+        """Return the edge and relative position of an absolute position.
+
+        See get_edge. None is returned if the position is before the start of
+        the first edge.
+        """
+        i = int(np.searchsorted(self._edge_starts, x, side='right')) - 1
+        if i < 0:
+            return None
+        return self._edge_ids[i], x - self._edge_starts[i]
+
+    def _batch_x(self, edges, positions):
+        """Return the absolute positions of several edge/position pairs.
+
+        See get_x. Edges that are not in total_edgestarts (e.g. the empty edge
+        of vehicles that disappeared, or internal links that are generalized
+        for by a single element) are handled individually by get_x.
+        """
+        positions = np.asarray(positions, dtype=float)
+        index = np.fromiter(
+            (self._edge_index.get(edge, -1) for edge in edges),
+            dtype=int, count=len(edges))
+
+        x = self._edge_starts[index] + positions
+        for i in np.flatnonzero(index < 0):
+            x[i] = self.get_x(edges[i], positions[i])
+
+        return x
+
+    def get_lane_graph(self):
+        """Return the lane graph of the network.
+
+        The lane graph is computed the first time this method is called after
+        a network is generated, and reused in all subsequent calls.
+
+        Returns
+        -------
+        flow.core.kernel.scenario.lane_graph.LaneGraph
+            array representation of the lanes and lane connections
+        """
+        if self._lane_graph is None:
+            self._lane_graph = LaneGraph(self)
+        return self._lane_graph
+
+    def get_routing_engine(self):
+        """Return the routing engine of the network.
+
+        The routing engine is computed the first time this method is called
+        after a network is generated, and reused in all subsequent calls.
+
+        Returns
+        -------
+        flow.core.kernel.scenario.routing.RoutingEngine
+            adjacency structure of the edges of the network, used to choose
+            routes
+        """
+        if self._routing_engine is None:
+            self._routing_engine = RoutingEngine(self)
+        return self._routing_engine
+
     ###########################################################################
     #            Methods for generating initial vehicle positions.            #
     ###########################################################################
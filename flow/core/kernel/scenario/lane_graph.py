@@ -0,0 +1,336 @@
+"""Script containing the lane graph used for vectorized lane queries."""
+
+import collections
+import numpy as np
+
+# default headway/tailway when no leader/follower can be found, in meters
+NO_NEIGHBOR_GAP = 1000
+
+#: result of sorting all vehicles in the network by lane and position, see
+#: `LaneGraph.sort`
+LaneOrder = collections.namedtuple('LaneOrder', [
+    'positions',  # position of every vehicle (unsorted)
+    'sorted_index',  # index of the vehicles, sorted by (lane key, position)
+    'composite',  # sorted composite (lane key, position) keys
+    'stride',  # multiplier of the lane keys in the composite keys
+    'offset',  # offset of the positions in the composite keys
+    'start',  # index in the sorted arrays of the first vehicle in each lane
+    'count',  # number of vehicles in each lane
+])
+
+
+class LaneGraph(object):
+    """Array representation of the lanes of a network and their connections.
+
+    Every lane of every edge and junction in the network is assigned an
+    integer key (``edge_index * max_lanes + lane``). The lanes directly in
+    front of and behind every lane (as specified by the ``next_edge`` and
+    ``prev_edge`` methods of the scenario kernel) are stored in offset tables
+    indexed by these keys, so that walking the network lane by lane can be
+    performed with array gathers for many vehicles at once.
+
+    Only the first connection of every lane is stored, and the routes of
+    vehicles are not taken into account: where a lane continues into (or is
+    reached from) several lanes, e.g. at intersections, the other lanes are
+    not searched, and the leaders and followers found past such a junction
+    may not be on the route of the vehicle. The leaders subscribed from
+    sumo, which follow the routes of vehicles, are accordingly used by
+    default (see SumoParams.flow_leaders).
+
+    The lane graph is static, and is accordingly only computed once per
+    generated network (see `KernelScenario.get_lane_graph`).
+
+    Attributes
+    ----------
+    edges : list of str
+        name of every edge/junction in the lane graph
+    max_lanes : int
+        maximum number of lanes of any edge/junction in the network
+    num_edges : int
+        number of edges and junctions in the network. This is the maximum
+        number of edges that are checked when searching for leaders and
+        followers in edges ahead or behind a vehicle.
+    next_key : np.ndarray
+        key of the lane directly in front of every lane, -1 if none exists
+    prev_key : np.ndarray
+        key of the lane directly behind every lane, -1 if none exists
+    key_length : np.ndarray
+        length of the edge of every lane
+    """
+
+    def __init__(self, scenario):
+        """Instantiate the lane graph.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.KernelScenario
+            the scenario kernel whose (generated) network should be represented
+        """
+        tot_list = scenario.get_edge_list() + scenario.get_junction_list()
+        self.num_edges = len(tot_list)
+
+        # collect all edges that can be reached from the edges and junctions
+        # in the network, as well as their lane connections
+        self.edges = list(tot_list)
+        self._edge_index = {edge: i for i, edge in enumerate(self.edges)}
+        max_lanes = max([scenario.num_lanes(edge) for edge in tot_list])
+        connections = {}
+        i = 0
+        while i < len(self.edges):
+            edge = self.edges[i]
+            num_lanes = scenario.num_lanes(edge) if i < self.num_edges \
+                else max_lanes
+            for lane in range(max(num_lanes, 0)):
+                nxt = scenario.next_edge(edge, lane)
+                prv = scenario.prev_edge(edge, lane)
+                connections[edge, lane] = (nxt[0] if len(nxt) > 0 else None,
+                                           prv[0] if len(prv) > 0 else None)
+                for other in (nxt[:1] + prv[:1]):
+                    max_lanes = max(max_lanes, other[1] + 1)
+                    if other[0] not in self._edge_index:
+                        self._edge_index[other[0]] = len(self.edges)
+                        self.edges.append(other[0])
+            i += 1
+        self.max_lanes = max_lanes
+
+        num_keys = len(self.edges) * max_lanes
+        self.next_key = np.full(num_keys, -1, dtype=np.int64)
+        self.prev_key = np.full(num_keys, -1, dtype=np.int64)
+        self.key_length = np.repeat(
+            np.array([scenario.edge_length(edge) for edge in self.edges],
+                     dtype=np.float64), max_lanes)
+
+        for (edge, lane), (nxt, prv) in connections.items():
+            key = self.lane_key(edge, lane)
+            if nxt is not None:
+                self.next_key[key] = self.lane_key(*nxt)
+            if prv is not None:
+                self.prev_key[key] = self.lane_key(*prv)
+
+    @property
+    def num_keys(self):
+        """Return the number of lane keys in the graph."""
+        return len(self.next_key)
+
+    def lane_key(self, edge, lane):
+        """Return the key of a lane, or -1 if the lane is not in the graph."""
+        index = self._edge_index.get(edge)
+        if index is None or not 0 <= lane < self.max_lanes:
+            return -1
+        return index * self.max_lanes + lane
+
+    def lane_keys(self, edges, lanes):
+        """Return the key of several lanes at once.
+
+        Parameters
+        ----------
+        edges : list of str
+            edge of every lane
+        lanes : list of int
+            index of every lane in its edge
+
+        Returns
+        -------
+        np.ndarray
+            key of every lane, -1 for lanes that are not in the graph
+        """
+        edge_index = self._edge_index
+        index = np.fromiter((edge_index.get(edge, -1) for edge in edges),
+                            dtype=np.int64, count=len(edges))
+        lanes = np.asarray(lanes, dtype=np.int64).reshape(-1)
+        valid = (index >= 0) & (lanes >= 0) & (lanes < self.max_lanes)
+        return np.where(valid, index * self.max_lanes + lanes, -1)
+
+    def edge_of_key(self, keys):
+        """Return the index (in `edges`) of the edge of every lane key."""
+        return np.asarray(keys) // self.max_lanes
+
+    def sort(self, keys, positions):
+        """Sort vehicles by their lane and position in the lane.
+
+        This is performed once per simulation step, after which leaders and
+        followers of any number of vehicles can be computed via
+        `lane_neighbors`.
+
+        Parameters
+        ----------
+        keys : np.ndarray
+            lane key of every vehicle (see `lane_keys`). Vehicles with a key
+            of -1 are ignored.
+        positions : array_like
+            position of every vehicle in its lane
+
+        Returns
+        -------
+        LaneOrder
+            the vehicles sorted by (lane key, position)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.float64)
+        index = np.flatnonzero(keys >= 0)
+
+        # combine the lane keys and positions into a single sortable value.
+        # The stride is a power of two so that the lane component is exact.
+        span = np.abs(positions[index]).max() if len(index) > 0 else 0
+        stride = 2. ** np.ceil(np.log2(2 * span + 2))
+        offset = stride / 2
+        composite = keys[index] * stride + positions[index] + offset
+
+        # stable sort, so that vehicles with the same position remain in the
+        # order in which they were provided
+        perm = np.argsort(composite, kind='mergesort')
+        sorted_index = index[perm]
+
+        count = np.bincount(keys[sorted_index], minlength=self.num_keys)
+        start = np.cumsum(count) - count
+
+        return LaneOrder(positions=positions,
+                         sorted_index=sorted_index,
+                         composite=composite[perm],
+                         stride=stride,
+                         offset=offset,
+                         start=start,
+                         count=count)
+
+    def lane_neighbors(self, order, lengths, veh, keys, own):
+        """Compute the leaders and followers of vehicles in specific lanes.
+
+        Every query consists of a vehicle and a lane (which need not be the
+        lane the vehicle is currently in). The leader of the query is the
+        first vehicle ahead of the vehicle's position in the requested lane;
+        if this lane is empty ahead of the vehicle, the lanes in front of it
+        are searched, up to `num_edges` edges ahead. Followers are searched
+        for in a similar manner behind the vehicle.
+
+        Parameters
+        ----------
+        order : LaneOrder
+            all vehicles, sorted by lane and position (see `sort`)
+        lengths : np.ndarray
+            length of every vehicle
+        veh : array_like
+            index of the vehicle of every query
+        keys : array_like
+            lane key of every query
+        own : array_like
+            whether the lane of every query is the lane the vehicle is in
+
+        Returns
+        -------
+        leader : np.ndarray
+            index of the leader of every query, -1 if none was found
+        headway : np.ndarray
+            headway to the leader of every query
+        follower : np.ndarray
+            index of the follower of every query, -1 if none was found
+        tailway : np.ndarray
+            tailway to the follower of every query
+        """
+        veh = np.asarray(veh, dtype=np.int64)
+        keys = np.asarray(keys, dtype=np.int64)
+        own = np.asarray(own, dtype=bool)
+        lengths = np.asarray(lengths, dtype=np.float64)
+        num_queries = len(veh)
+
+        leader = np.full(num_queries, -1, dtype=np.int64)
+        follower = np.full(num_queries, -1, dtype=np.int64)
+        headway = np.full(num_queries, NO_NEIGHBOR_GAP, dtype=np.float64)
+        tailway = np.full(num_queries, NO_NEIGHBOR_GAP, dtype=np.float64)
+        if num_queries == 0:
+            return leader, headway, follower, tailway
+
+        valid = keys >= 0
+        safe_keys = np.where(valid, keys, 0)
+        pos = order.positions[veh]
+        start = order.start[safe_keys]
+        count = np.where(valid, order.count[safe_keys], 0)
+
+        # location of the vehicles in the requested lanes
+        local = np.searchsorted(
+            order.composite,
+            safe_keys * order.stride + pos + order.offset) - start
+
+        last = max(len(order.sorted_index) - 1, 0)
+        if len(order.sorted_index) > 0:
+            # leaders within the same lane
+            has_leader = (count > 0) & np.where(own, local < count - 1,
+                                                local < count)
+            ahead = np.minimum(start + local, last)
+            ahead = np.where(order.sorted_index[ahead] == veh,
+                             np.minimum(ahead + 1, last), ahead)
+            lead = order.sorted_index[ahead]
+            leader[has_leader] = lead[has_leader]
+            headway[has_leader] = (order.positions[lead] - pos
+                                   - lengths[lead])[has_leader]
+
+            # followers within the same lane
+            has_follower = (count > 0) & (local > 0)
+            follow = order.sorted_index[np.clip(start + local - 1, 0, last)]
+            follower[has_follower] = follow[has_follower]
+            tailway[has_follower] = (pos - order.positions[follow]
+                                     - lengths[veh])[has_follower]
+        else:
+            has_leader = np.zeros(num_queries, dtype=bool)
+            has_follower = np.zeros(num_queries, dtype=bool)
+
+        # if the leader/follower was not found, search the lanes ahead/behind
+        self._search_ahead(order, lengths, pos, keys,
+                           np.flatnonzero(valid & ~has_leader),
+                           leader, headway)
+        self._search_behind(order, lengths, pos, keys, veh,
+                            np.flatnonzero(valid & ~has_follower),
+                            follower, tailway)
+
+        return leader, headway, follower, tailway
+
+    def _search_ahead(self, order, lengths, pos, keys, rows, leader, headway):
+        """Search for leaders in the lanes in front of the queried lanes."""
+        current = keys[rows]
+        add_length = np.zeros(len(rows))
+        for _ in range(self.num_edges):
+            # stop for lanes with no lanes in front of them
+            nxt = self.next_key[current]
+            keep = nxt >= 0
+            rows, current, nxt = rows[keep], current[keep], nxt[keep]
+            add_length = add_length[keep] + self.key_length[current]
+            current = nxt
+            if len(rows) == 0:
+                break
+
+            # the leader is the first vehicle in the first non-empty lane
+            found = order.count[current] > 0
+            if found.any():
+                first = order.sorted_index[order.start[current[found]]]
+                leader[rows[found]] = first
+                headway[rows[found]] = (order.positions[first]
+                                        - pos[rows[found]]
+                                        + add_length[found] - lengths[first])
+                rows, current = rows[~found], current[~found]
+                add_length = add_length[~found]
+
+    def _search_behind(self, order, lengths, pos, keys, veh, rows, follower,
+                       tailway):
+        """Search for followers in the lanes behind the queried lanes."""
+        current = keys[rows]
+        add_length = np.zeros(len(rows))
+        for _ in range(self.num_edges):
+            # stop for lanes with no lanes behind them
+            prv = self.prev_key[current]
+            keep = prv >= 0
+            rows, current = rows[keep], prv[keep]
+            add_length = add_length[keep] + self.key_length[current]
+            if len(rows) == 0:
+                break
+
+            # the follower is the last vehicle in the first non-empty lane
+            found = order.count[current] > 0
+            if found.any():
+                last = order.sorted_index[order.start[current[found]]
+                                          + order.count[current[found]] - 1]
+                follower[rows[found]] = last
+                tailway[rows[found]] = (pos[rows[found]]
+                                        - order.positions[last]
+                                        + add_length[found]
+                                        - lengths[veh[rows[found]]])
+                rows, current = rows[~found], current[~found]
+                add_length = add_length[~found]
@@ -0,0 +1,206 @@
+"""Script containing a cache of the networks generated by netconvert."""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from flow.core.util import ensure_private_dir
+
+# version of the format of the cache entries, included in every key so that
+# entries written by previous versions of Flow are never read
+CACHE_VERSION = 1
+
+# file extension of the cache entries
+ENTRY_EXTENSION = '.net.pkl'
+
+
+class NetworkCache(object):
+    """Content-addressed cache of the networks generated by netconvert.
+
+    Every entry is stored as a single file named after a hash of the inputs of
+    netconvert (nodes, edges, types, connections, traffic lights, and
+    options), and contains the generated .net.xml file together with the
+    edges and connections parsed from it. Networks with identical inputs are
+    accordingly only generated and parsed once, regardless of the name of the
+    scenario they belong to.
+
+    The cache is safe to share between concurrent processes: entries are
+    first written to a temporary file which is then atomically renamed, so
+    that other processes only ever read complete entries, and entries removed
+    by another process while being read are treated as misses.
+
+    The modification time of an entry is updated every time it is read. Once
+    the total size of the entries exceeds the size of the cache, the least
+    recently used entries are removed.
+
+    The entries are unpickled when they are read, so the directory of the
+    cache must only be writable by the current user (see
+    flow.core.util.ensure_private_dir).
+
+    Usage
+    -----
+        >>> cache = NetworkCache('~/.cache/flow/net', max_size=2 ** 27)
+        >>> key = cache.key(nodes, edges)
+        >>> cache.put(key, net_xml, edges_dict, conn_dict)
+        >>> net_xml, edges_dict, conn_dict = cache.get(key)
+
+    Attributes
+    ----------
+    directory : str
+        directory the entries are stored in
+    max_size : int
+        maximum total size of the entries, in bytes
+    """
+
+    def __init__(self, directory, max_size):
+        """Instantiate the cache.
+
+        Parameters
+        ----------
+        directory : str
+            directory the entries are stored in, created if needed
+        max_size : int
+            maximum total size of the entries, in bytes
+
+        Raises
+        ------
+        PermissionError
+            if the directory is owned by another user, or is writable by the
+            group or other users
+        """
+        self.directory = ensure_private_dir(directory)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*inputs):
+        """Return the key of a network given the inputs used to generate it.
+
+        Parameters
+        ----------
+        inputs : list
+            JSON-serializable inputs of netconvert. Any value that cannot be
+            serialized is converted to a string.
+
+        Returns
+        -------
+        str
+            hexadecimal digest of the inputs
+        """
+        # the key also depends on the netconvert binary, so that networks are
+        # generated again once sumo is updated
+        binary = shutil.which('netconvert')
+        try:
+            binary = (binary, os.path.getmtime(binary))
+        except (TypeError, OSError):
+            pass
+
+        content = json.dumps([CACHE_VERSION, binary, inputs],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def file_digest(path):
+        """Return a hexadecimal digest of the content of a file.
+
+        This may be used to include (potentially large) input files of
+        netconvert in the key of a network.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the network stored under a key.
+
+        Returns
+        -------
+        bytes
+            content of the .net.xml file
+        dict <dict>
+            edges of the network, see TraCIScenario.generate_net
+        dict < dict < list < (edge, pos) > > >
+            connections of the network, see TraCIScenario.generate_net
+
+        or None if the network is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry['net'], entry['edges'], entry['connections']
+
+    def put(self, key, net, edges, connections):
+        """Store a network under a key.
+
+        Parameters
+        ----------
+        key : str
+            key of the network, see `key`
+        net : bytes
+            content of the .net.xml file
+        edges : dict <dict>
+            edges of the network, see TraCIScenario.generate_net
+        connections : dict < dict < list < (edge, pos) > > >
+            connections of the network, see TraCIScenario.generate_net
+        """
+        entry = {'net': net, 'edges': edges, 'connections': connections}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        """Return the path of the file of an entry."""
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    def _entries(self):
+        """Return the path, size, and modification time of all entries."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # removed by another process in the meantime
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits."""
+        entries = self._entries()
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in sorted(entries, key=lambda e: e[2]):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
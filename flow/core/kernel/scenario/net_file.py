@@ -0,0 +1,168 @@
+"""Script containing methods for importing the edges of .net.xml files."""
+
+import os
+import pickle
+import tempfile
+
+from lxml import etree
+
+# version of the format of the sidecar files, see `read_net`
+SIDECAR_VERSION = 1
+
+# extension appended to the path of a .net.xml file to name its sidecar file
+SIDECAR_EXTENSION = '.flow.pkl'
+
+# speed limit of edges whose speed is not specified anywhere in the file
+DEFAULT_SPEED = 30
+
+
+def read_net(path, no_internal_links, sidecar=False):
+    """Import the edges and connections of a .net.xml file.
+
+    The file is parsed in a single streaming pass, during which every element
+    is discarded once it was processed, so that the memory used remains small
+    even for very large networks (e.g. ones imported from OpenStreetMap).
+
+    If requested, the result is also written to a sidecar file next to the
+    .net.xml file, from which it is read directly as long as the .net.xml
+    file is not modified.
+
+    Parameters
+    ----------
+    path : str
+        path to the .net.xml file
+    no_internal_links : bool
+        whether the network was generated without internal links. If not,
+        connections from regular edges lead to the internal links they go
+        through.
+    sidecar : bool, optional
+        whether to read and write the sidecar file
+
+    Returns
+    -------
+    net_data : dict <dict>
+        Key = name of the edge/junction
+        Element = lanes, speed, length
+    connection_data : dict < dict < list < (edge, pos) > > >
+        Key = "prev" or "next", indicating coming from or to this
+        edge/lane pair
+            Key = name of the edge
+                Key = lane index
+                Element = list of edge/lane pairs preceding or following
+                the edge/lane pairs
+    """
+    if not sidecar:
+        return _parse_net(path, no_internal_links)
+
+    stat = os.stat(path)
+    source = (SIDECAR_VERSION, stat.st_size, stat.st_mtime_ns,
+              bool(no_internal_links))
+
+    sidecar_path = path + SIDECAR_EXTENSION
+    try:
+        with open(sidecar_path, 'rb') as f:
+            data = pickle.load(f)
+        if data['source'] == source:
+            return data['edges'], data['connections']
+    except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        pass
+
+    net_data, connection_data = _parse_net(path, no_internal_links)
+
+    # the sidecar is written atomically, since several processes may import
+    # the same file at once. It is not written if the directory is read-only.
+    data = {'source': source, 'edges': net_data,
+            'connections': connection_data}
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, sidecar_path)
+    except OSError:
+        pass
+
+    return net_data, connection_data
+
+
+def _parse_net(path, no_internal_links):
+    """Parse the edges and connections of a .net.xml file, see `read_net`."""
+    # speed limit of every type (if any are available). This may be used when
+    # specifying some edge data.
+    types_data = dict()
+    # type of every edge with a known type
+    edge_types = dict()
+
+    net_data = dict()
+    next_conn_data = dict()  # forward looking connections
+    prev_conn_data = dict()  # backward looking connections
+
+    context = etree.iterparse(
+        path, events=('end',), tag=('type', 'edge', 'connection'),
+        recover=True, huge_tree=True)
+
+    for _, element in context:
+        attrib = element.attrib
+
+        if element.tag == 'edge':
+            # collect the length from the first lane of the edge, the number
+            # of lanes from the number of lane elements, and if needed, also
+            # collect the speed value (assuming it is there)
+            edge = {'speed': None, 'lanes': 0}
+            for lane in element.iterchildren('lane'):
+                if edge['lanes'] == 0:
+                    edge['length'] = float(lane.attrib['length'])
+                    if 'speed' in lane.attrib:
+                        edge['speed'] = float(lane.attrib['speed'])
+                edge['lanes'] += 1
+            net_data[attrib['id']] = edge
+            if 'type' in attrib:
+                edge_types[attrib['id']] = attrib['type']
+
+        elif element.tag == 'connection':
+            from_edge = attrib['from']
+            from_lane = int(attrib['fromLane'])
+
+            if from_edge[0] != ":" and not no_internal_links:
+                # if the edge is not an internal links and the network is
+                # allowed to have internal links, then get the next edge/lane
+                # pair from the "via" element
+                via = attrib['via'].rsplit('_', 1)
+                to_edge = via[0]
+                to_lane = int(via[1])
+            else:
+                to_edge = attrib['to']
+                to_lane = int(attrib['toLane'])
+
+            next_conn_data.setdefault(from_edge, dict()).setdefault(
+                from_lane, list()).append((to_edge, to_lane))
+            prev_conn_data.setdefault(to_edge, dict()).setdefault(
+                to_lane, list()).append((from_edge, from_lane))
+
+        else:
+            if 'speed' in attrib:
+                types_data[attrib['id']] = float(attrib['speed'])
+
+        # discard the element, as well as any previous (unprocessed) elements
+        # of the file, e.g. junctions
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+    del context
+
+    # if the edge has a type with a speed limit, it is used instead of the one
+    # of its lanes. If no speed value is present anywhere, set it to some
+    # default
+    for edge_id, edge in net_data.items():
+        type_speed = types_data.get(edge_types.get(edge_id))
+        if type_speed is not None:
+            edge['speed'] = type_speed
+        elif edge['speed'] is None:
+            edge['speed'] = DEFAULT_SPEED
+
+    connection_data = {'next': next_conn_data, 'prev': prev_conn_data}
+
+    return net_data, connection_data
@@ -0,0 +1,254 @@
+"""Script containing the routing engine used by the routing controllers."""
+
+import heapq
+import numpy as np
+
+
+class RoutingEngine(object):
+    """Compact representation of the edge graph of a network for routing.
+
+    Every (non-internal) edge of the network is assigned an integer index, and
+    the edges that can be reached directly from every edge (possibly through
+    one or several internal links, as specified by the ``next_edge`` method of
+    the scenario kernel) are stored in a compressed adjacency structure, as
+    are the edges that can be reached from every lane of every edge. This
+    allows routes to be chosen without walking the lane connections of the
+    network every time a vehicle reaches the end of its route.
+
+    Shortest paths are computed from a shortest path tree towards every
+    destination, which is built the first time a path to the destination is
+    requested and reused afterwards, so that every subsequent query only
+    takes time proportional to the length of the path.
+
+    The routing engine is static, and is accordingly only computed once per
+    generated network (see `KernelScenario.get_routing_engine`).
+
+    Attributes
+    ----------
+    edges : list of str
+        name of every edge in the network
+    indptr : np.ndarray
+        the successors of the i-th edge are stored in
+        ``indices[indptr[i]:indptr[i + 1]]``
+    indices : np.ndarray
+        index of the successors of every edge
+    lengths : np.ndarray
+        length of every edge
+    """
+
+    def __init__(self, scenario):
+        """Instantiate the routing engine.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.KernelScenario
+            the scenario kernel whose (generated) network should be routed in
+        """
+        self.edges = list(scenario.get_edge_list())
+        self._edge_index = {edge: i for i, edge in enumerate(self.edges)}
+        self.lengths = np.array(
+            [scenario.edge_length(edge) for edge in self.edges], dtype=float)
+
+        # Key = (edge, lane)
+        # Element = index of the edges that can be reached from the lane
+        self._lane_successors = {}
+        indptr = [0]
+        indices = []
+        for edge in self.edges:
+            successors = set()
+            for lane in range(scenario.num_lanes(edge)):
+                lane_successors = sorted(
+                    self._edge_index[s]
+                    for s in self._successors(scenario, edge, lane))
+                self._lane_successors[edge, lane] = \
+                    np.array(lane_successors, dtype=int)
+                successors.update(lane_successors)
+            indices.extend(sorted(successors))
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=int)
+        self.indices = np.array(indices, dtype=int)
+
+        # predecessors of every edge, in the same compressed form
+        order = np.argsort(self.indices, kind='mergesort')
+        self._rev_indptr = np.searchsorted(
+            self.indices[order], np.arange(len(self.edges) + 1))
+        self._rev_indices = np.repeat(
+            np.arange(len(self.edges)), np.diff(self.indptr))[order]
+
+        # shortest path tree towards every destination a path was requested to
+        self._trees = {}
+
+    def _successors(self, scenario, edge, lane):
+        """Return the edges that can be reached directly from a lane.
+
+        The lane connections of the lane are followed through any internal
+        links until a (non-internal) edge of the network is reached.
+        """
+        successors = set()
+        visited = set()
+        stack = [(edge, lane)]
+        while len(stack) > 0:
+            for next_edge, next_lane in scenario.next_edge(*stack.pop()):
+                if next_edge in self._edge_index:
+                    successors.add(next_edge)
+                elif (next_edge, next_lane) not in visited:
+                    visited.add((next_edge, next_lane))
+                    stack.append((next_edge, next_lane))
+        return successors
+
+    def successors(self, edge, lane=None):
+        """Return the edges that can be reached directly from an edge.
+
+        If a lane is specified, only the edges that can be reached from this
+        lane of the edge are returned.
+        """
+        return [self.edges[j] for j in self._successor_indices(edge, lane)]
+
+    def _successor_indices(self, edge, lane=None):
+        """Return the index of the edges reachable from an edge or lane."""
+        if lane is not None and (edge, lane) in self._lane_successors:
+            return self._lane_successors[edge, lane]
+        i = self._edge_index[edge]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def shortest_path(self, source, destination):
+        """Return the shortest path between two edges.
+
+        Parameters
+        ----------
+        source : str
+            name of the edge the path starts on
+        destination : str
+            name of the edge the path ends on
+
+        Returns
+        -------
+        list of str or None
+            sequence of edges from the source to the destination (both
+            included), or None if the destination cannot be reached
+        """
+        next_hop, _ = self.shortest_path_tree(destination)
+        i = self._edge_index[source]
+        if next_hop[i] < 0 and source != destination:
+            return None
+
+        path = [source]
+        while self.edges[i] != destination:
+            i = next_hop[i]
+            path.append(self.edges[i])
+        return path
+
+    def shortest_paths(self, sources, destination):
+        """Return the shortest paths from several edges to a destination.
+
+        See shortest_path.
+        """
+        return [self.shortest_path(source, destination) for source in sources]
+
+    def shortest_path_tree(self, destination):
+        """Return the shortest path tree towards a destination.
+
+        The tree is computed with Dijkstra's algorithm over the reversed edge
+        graph the first time it is requested, and cached afterwards. The cost
+        of a path is the total length of the edges that follow its first edge.
+
+        Parameters
+        ----------
+        destination : str
+            name of the edge the paths end on
+
+        Returns
+        -------
+        np.ndarray
+            index of the next edge on the shortest path from every edge, -1 if
+            the destination cannot be reached (or for the destination itself)
+        np.ndarray
+            distance from the end of every edge to the end of the
+            destination, inf if the destination cannot be reached
+        """
+        if destination in self._trees:
+            return self._trees[destination]
+
+        target = self._edge_index[destination]
+        next_hop = np.full(len(self.edges), -1, dtype=int)
+        dist = np.full(len(self.edges), np.inf)
+        dist[target] = 0.
+        heap = [(0., target)]
+        while len(heap) > 0:
+            d, j = heapq.heappop(heap)
+            if d > dist[j]:
+                continue
+            # the cost of moving from an edge onto edge j is the length of j
+            d += self.lengths[j]
+            for i in self._rev_indices[
+                    self._rev_indptr[j]:self._rev_indptr[j + 1]]:
+                if d < dist[i]:
+                    dist[i] = d
+                    next_hop[i] = j
+                    heapq.heappush(heap, (d, i))
+
+        self._trees[destination] = next_hop, dist
+        return next_hop, dist
+
+    def random_route(self, edge, length=2, rng=np.random, lane=None):
+        """Return a random continuation of the route of a vehicle.
+
+        See random_routes.
+        """
+        lanes = None if lane is None else [lane]
+        return self.random_routes([edge], length, rng, lanes)[0]
+
+    def random_routes(self, edges, length=2, rng=np.random, lanes=None):
+        """Return random continuations for several edges at once.
+
+        Starting from every edge, successors are chosen uniformly at random
+        until the route contains `length` edges or an edge without successors
+        is reached. If the lanes of the vehicles are specified, the second
+        edge of every route is chosen among the edges that can be reached
+        from the lane the vehicle is in.
+
+        Parameters
+        ----------
+        edges : list of str
+            name of the edges the routes start on
+        length : int, optional
+            maximum number of edges in every route (including the first one)
+        rng : np.random.RandomState, optional
+            random number generator used to choose the successors
+        lanes : list of int, optional
+            lane of every vehicle in the edge its route starts on
+
+        Returns
+        -------
+        list of list of str
+            random route starting from every edge
+        """
+        current = np.array([self._edge_index[edge] for edge in edges],
+                           dtype=int)
+        steps = [current]
+        alive = np.ones(len(current), dtype=bool)
+        for step in range(length - 1):
+            if step == 0 and lanes is not None:
+                # the successors of the lanes the vehicles are in
+                choices = [self._successor_indices(edge, lane)
+                           for edge, lane in zip(edges, lanes)]
+                count = np.array([len(c) for c in choices], dtype=int)
+            else:
+                count = self.indptr[current + 1] - self.indptr[current]
+
+            # routes that reached an edge without successors are not extended
+            alive &= count > 0
+            if not alive.any():
+                break
+            offset = (rng.random_sample(len(current)) * count).astype(int)
+            if step == 0 and lanes is not None:
+                current = np.array(
+                    [c[k] if a else i for c, k, a, i
+                     in zip(choices, offset, alive, current)], dtype=int)
+            else:
+                pick = np.where(alive, self.indptr[current] + offset, 0)
+                current = np.where(alive, self.indices[pick], current)
+            steps.append(np.where(alive, current, -1))
+
+        return [[self.edges[i] for i in row if i >= 0]
+                for row in np.stack(steps, axis=1)]
@@ -1,20 +1,18 @@
 """Script containing the TraCI scenario kernel class."""
 
 from flow.core.kernel.scenario import KernelScenario
+from flow.core.kernel.scenario.net_cache import NetworkCache
+from flow.core.kernel.scenario.net_file import read_net
 from flow.core.util import makexml, printxml, ensure_dir
-import time
+from flow.utils import traci_pipeline
+import flow.config as config
 import os
 import subprocess
-import xml.etree.ElementTree as ElementTree
+import warnings
 from lxml import etree
 
 E = etree.Element
 
-# Number of retries on accessing the .net.xml file before giving up
-RETRIES_ON_ERROR = 10
-# number of seconds to wait before trying to access the .net.xml file again
-WAIT_ON_ERROR = 1
-
 
 def _flow(name, vtype, route, **kwargs):
     return E('flow', id=name, route=route, type=vtype, **kwargs)
@@ -82,6 +80,22 @@ class TraCIScenario(KernelScenario):
         self.rts = None
         self.cfg = None
 
+        # ids of the variables every edge is subscribed to, see
+        # flow.core.params.SubscriptionProfile
+        self._subscription_variables = traci_pipeline.subscription_variables(
+            'edge', master_kernel.subscriptions.edge)
+
+        # subscription results of the edges in the current step
+        self.__edge_obs = {}
+
+        # cache of the networks generated by netconvert (if enabled)
+        if sim_params.net_cache_size > 0:
+            self.net_cache = NetworkCache(
+                sim_params.net_cache_dir or config.NET_CACHE_DIR,
+                int(sim_params.net_cache_size * 2 ** 20))
+        else:
+            self.net_cache = None
+
     def generate_network(self, network):
         """See parent class.
 
@@ -98,6 +112,8 @@ class TraCIScenario(KernelScenario):
         # store the scenario object in the network variable
         self.network = network
         self.orig_name = network.orig_name
+        self._lane_graph = None
+        self._routing_engine = None
         self.name = network.name
 
         # names of the soon-to-be-generated xml and sumo config files
@@ -191,6 +207,7 @@ class TraCIScenario(KernelScenario):
         self.total_edgestarts.sort(key=lambda tup: tup[1])
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
+        self._index_edgestarts()
 
         if self.network.routes is None:
             print("No routes specified, defaulting to single edge routes.")
@@ -209,9 +226,68 @@ class TraCIScenario(KernelScenario):
         # specify the location of the sumo configuration file
         self.cfg = self.cfg_path + cfg_name
 
+    def pass_api(self, kernel_api):
+        """See parent class.
+
+        Also subscribes to the variables of all edges in the subscription
+        profile.
+        """
+        KernelScenario.pass_api(self, kernel_api)
+        if len(self._subscription_variables) > 0:
+            traci_pipeline.subscribe(
+                kernel_api, 'edge', self.get_edge_list(),
+                self._subscription_variables)
+
     def update(self, reset):
-        """Perform no action of value (scenarios are static)."""
-        pass
+        """See parent class.
+
+        The network is static, only the subscribed variables of its edges are
+        updated (if the subscription profile contains any).
+        """
+        if len(self._subscription_variables) > 0:
+            self.__edge_obs = \
+                self.kernel_api.edge.getSubscriptionResults().copy()
+        elif self.__edge_obs:
+            # the variables requested in the previous step are outdated
+            self.__edge_obs = {}
+
+    def get_edge_mean_speed(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "mean_speed")
+
+    def get_edge_vehicle_number(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "vehicle_number")
+
+    def get_edge_halting_number(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "halting_number")
+
+    def get_edge_occupancy(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "occupancy")
+
+    def get_edge_waiting_time(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "waiting_time")
+
+    def get_edge_travel_time(self, edge_id):
+        """See parent class."""
+        return self._get_variable(edge_id, "travel_time")
+
+    def _get_variable(self, edge_id, name):
+        """Return the value of a variable of an edge in the current step.
+
+        Variables that are not in the subscription profile are requested from
+        sumo the first time they are accessed in a step, and are stored with
+        the subscription results of the edge until the next step.
+        """
+        obs = self.__edge_obs.setdefault(edge_id, {})
+        var_id = traci_pipeline.SUBSCRIPTION_VARIABLES['edge'][name][0]
+        if var_id not in obs:
+            obs[var_id] = traci_pipeline.get_variable(
+                self.kernel_api, 'edge', name, edge_id)
+        return obs[var_id]
 
     def close(self):
         """Close the scenario class.
@@ -221,35 +297,31 @@ class TraCIScenario(KernelScenario):
         the case of import .net.xml files we do not want to delete them.
         """
         if self.network.net_params.netfile is None:
-            os.remove(self.net_path + self.nodfn)
-            os.remove(self.net_path + self.edgfn)
-            os.remove(self.net_path + self.cfgfn)
-            os.remove(self.cfg_path + self.addfn)
-            os.remove(self.cfg_path + self.guifn)
-            os.remove(self.cfg_path + self.netfn)
-            os.remove(self.cfg_path + self.roufn)
-            os.remove(self.cfg_path + self.sumfn)
-
-            # the connection file is not always created
-            try:
-                os.remove(self.net_path + self.confn)
-            except OSError:
-                pass
-
-            # neither is the type file
-            try:
-                os.remove(self.net_path + self.typfn)
-            except OSError:
-                pass
+            files = [
+                self.net_path + self.nodfn, self.net_path + self.edgfn,
+                self.net_path + self.cfgfn, self.net_path + self.confn,
+                self.net_path + self.typfn, self.cfg_path + self.addfn,
+                self.cfg_path + self.guifn, self.cfg_path + self.netfn,
+                self.cfg_path + self.roufn, self.cfg_path + self.sumfn
+            ]
+            for path in files:
+                # the connection and type files are not always created, and
+                # neither are the input files of netconvert if the network was
+                # read from the network cache
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
 
     def get_edge(self, x):
         """See parent class."""
-        for (edge, start_pos) in reversed(self.total_edgestarts):
-            if x >= start_pos:
-                return edge, x - start_pos
+        return self._find_edge(x)
 
     def get_x(self, edge, position):
         """See parent class."""
+        if not isinstance(edge, str):
+            return self._batch_x(edge, position)
+
         # if there was a collision which caused the vehicle to disappear,
         # return an x value of -1001
         if len(edge) == 0:
@@ -417,6 +489,18 @@ class TraCIScenario(KernelScenario):
             if 'radius' in node:
                 node['radius'] = str(node['radius'])
 
+        # reuse the network if one was already generated from the same inputs
+        if self.net_cache is not None:
+            cache_key = self.net_cache.key(
+                nodes, edges, types, connections,
+                traffic_lights.get_properties(), net_params.no_internal_links)
+            cached = self.net_cache.get(cache_key)
+            if cached is not None:
+                net, edges_dict, conn_dict = cached
+                with open(self.cfg_path + self.netfn, 'wb') as f:
+                    f.write(net)
+                return edges_dict, conn_dict
+
         # xml file for nodes; contains nodes for the boundary points with
         # respect to the x and y axes
         x = makexml('nodes', 'http://sumo.dlr.de/xsd/nodes_file.xsd')
@@ -506,25 +590,43 @@ class TraCIScenario(KernelScenario):
         x.append(t)
         printxml(x, self.net_path + self.cfgfn)
 
-        subprocess.call(
-            [
-                'netconvert -c ' + self.net_path + self.cfgfn +
-                ' --output-file=' + self.cfg_path + self.netfn +
-                ' --no-internal-links="%s"' % no_internal_links
-            ],
-            shell=True)
+        self.netconvert([
+            '-c', self.net_path + self.cfgfn,
+            '--output-file=' + self.cfg_path + self.netfn,
+            '--no-internal-links=' + no_internal_links
+        ])
 
         # collect data from the generated network configuration file
-        error = None
-        for _ in range(RETRIES_ON_ERROR):
+        edges_dict, conn_dict = self._import_edges_from_net()
+
+        # store the network for scenarios with the same inputs
+        if self.net_cache is not None:
             try:
-                edges_dict, conn_dict = self._import_edges_from_net()
-                return edges_dict, conn_dict
-            except Exception as e:
-                print('Error during start: {}'.format(e))
-                print('Retrying in {} seconds...'.format(WAIT_ON_ERROR))
-                time.sleep(WAIT_ON_ERROR)
-        raise error
+                with open(self.cfg_path + self.netfn, 'rb') as f:
+                    net = f.read()
+                self.net_cache.put(cache_key, net, edges_dict, conn_dict)
+            except OSError as e:
+                warnings.warn('Error while caching the network: {}'.format(e))
+
+        return edges_dict, conn_dict
+
+    def netconvert(self, args):
+        """Run sumo's netconvert binary and wait for it to exit.
+
+        The generated files are complete once the process exits, so they may
+        be read immediately afterwards.
+
+        Parameters
+        ----------
+        args : list of str
+            command line arguments of netconvert
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            if netconvert fails to generate the network
+        """
+        subprocess.check_call(['netconvert'] + args)
 
     def generate_net_from_osm(self, net_params):
         """Generate .net.xml files from OpenStreetMap files.
@@ -556,29 +658,50 @@ class TraCIScenario(KernelScenario):
         netfn = "%s.net.xml" % self.name
 
         # generate the network file with sumo
-        net_cmd = "netconvert --osm-files {0} --output-file {1}".\
-            format(osm_path, self.cfg_path + netfn)
+        net_args = ["--osm-files", osm_path,
+                    "--output-file", self.cfg_path + netfn]
 
         # this handles removing all roads in the network that cannot be ridden
         # by vehicles
-        net_cmd += " --keep-edges.by-vclass passenger"
+        net_args += ["--keep-edges.by-vclass", "passenger"]
 
         # this removes edges that are not connected to a network (isolated)
-        net_cmd += " --remove-edges.isolated"
+        net_args += ["--remove-edges.isolated"]
 
         # this removes internal links from the network (useful when the network
         # becomes very large)
         if net_params.no_internal_links:
-            net_cmd += " --no_internal_links"
-
-        subprocess.call(net_cmd, shell=True)
+            net_args += ["--no-internal-links"]
 
         # name of the .net.xml file (located in cfg_path)
         self.netfn = netfn
 
+        # reuse the network if the same osm file was already converted
+        if self.net_cache is not None:
+            cache_key = self.net_cache.key(
+                NetworkCache.file_digest(osm_path),
+                net_params.no_internal_links)
+            cached = self.net_cache.get(cache_key)
+            if cached is not None:
+                net, edges_dict, conn_dict = cached
+                with open(self.cfg_path + netfn, 'wb') as f:
+                    f.write(net)
+                return edges_dict, conn_dict
+
+        self.netconvert(net_args)
+
         # collect data from the generated network configuration file
         edges_dict, conn_dict = self._import_edges_from_net()
 
+        # store the network for later conversions of the same osm file
+        if self.net_cache is not None:
+            try:
+                with open(self.cfg_path + netfn, 'rb') as f:
+                    net = f.read()
+                self.net_cache.put(cache_key, net, edges_dict, conn_dict)
+            except OSError as e:
+                warnings.warn('Error while caching the network: {}'.format(e))
+
         return edges_dict, conn_dict
 
     def generate_net_from_netfile(self, net_params):
@@ -607,8 +730,9 @@ class TraCIScenario(KernelScenario):
         # name of the .net.xml file (located in cfg_path)
         self.netfn = net_params.netfile
 
-        # collect data from the generated network configuration file
-        edges_dict, conn_dict = self._import_edges_from_net()
+        # collect data from the network configuration file, which is only
+        # parsed once as long as it is not modified
+        edges_dict, conn_dict = self._import_edges_from_net(sidecar=True)
 
         return edges_dict, conn_dict
 
@@ -761,7 +885,7 @@ class TraCIScenario(KernelScenario):
         if self.network.net_params.inflows is not None:
             total_inflows = self.network.net_params.inflows.get()
             for inflow in total_inflows:
-                for key in inflow:
+                for key in list(inflow):
                     if not isinstance(inflow[key], str):
                         inflow[key] = repr(inflow[key])
                     if key == 'edge':
@@ -771,13 +895,20 @@ class TraCIScenario(KernelScenario):
 
         printxml(routes, self.cfg_path + self.roufn)
 
-    def _import_edges_from_net(self):
+    def _import_edges_from_net(self, sidecar=False):
         """Import edges from a configuration file.
 
         This is a utility function for computing edge information. It imports a
         network configuration file, and returns the information on the edges
         and junctions located in the file.
 
+        Parameters
+        ----------
+        sidecar : bool, optional
+            whether the imported data should be stored in (and read from) a
+            sidecar file next to the network configuration file, see
+            flow.core.kernel.scenario.net_file.read_net
+
         Returns
         -------
         net_data : dict <dict>
@@ -791,104 +922,6 @@ class TraCIScenario(KernelScenario):
                     Element = list of edge/lane pairs preceding or following
                     the edge/lane pairs
         """
-        # import the .net.xml file containing all edge/type data
-        parser = etree.XMLParser(recover=True)
-        tree = ElementTree.parse(
-            os.path.join(self.cfg_path, self.netfn), parser=parser)
-
-        root = tree.getroot()
-
-        # Collect information on the available types (if any are available).
-        # This may be used when specifying some edge data.
-        types_data = dict()
-
-        for typ in root.findall('type'):
-            type_id = typ.attrib['id']
-            types_data[type_id] = dict()
-
-            if 'speed' in typ.attrib:
-                types_data[type_id]['speed'] = float(typ.attrib['speed'])
-            else:
-                types_data[type_id]['speed'] = None
-
-            if 'numLanes' in typ.attrib:
-                types_data[type_id]['numLanes'] = int(typ.attrib['numLanes'])
-            else:
-                types_data[type_id]['numLanes'] = None
-
-        net_data = dict()
-        next_conn_data = dict()  # forward looking connections
-        prev_conn_data = dict()  # backward looking connections
-
-        # collect all information on the edges and junctions
-        for edge in root.findall('edge'):
-            edge_id = edge.attrib['id']
-
-            # create a new key for this edge
-            net_data[edge_id] = dict()
-
-            # check for speed
-            if 'speed' in edge:
-                net_data[edge_id]['speed'] = float(edge.attrib['speed'])
-            else:
-                net_data[edge_id]['speed'] = None
-
-            # if the edge has a type parameters, check that type for a
-            # speed and parameter if one was not already found
-            if 'type' in edge.attrib and edge.attrib['type'] in types_data:
-                if net_data[edge_id]['speed'] is None:
-                    net_data[edge_id]['speed'] = \
-                        float(types_data[edge.attrib['type']]['speed'])
-
-            # collect the length from the lane sub-element in the edge, the
-            # number of lanes from the number of lane elements, and if needed,
-            # also collect the speed value (assuming it is there)
-            net_data[edge_id]['lanes'] = 0
-            for i, lane in enumerate(edge):
-                net_data[edge_id]['lanes'] += 1
-                if i == 0:
-                    net_data[edge_id]['length'] = float(lane.attrib['length'])
-                    if net_data[edge_id]['speed'] is None \
-                            and 'speed' in lane.attrib:
-                        net_data[edge_id]['speed'] = float(
-                            lane.attrib['speed'])
-
-            # if no speed value is present anywhere, set it to some default
-            if net_data[edge_id]['speed'] is None:
-                net_data[edge_id]['speed'] = 30
-
-        # collect connection data
-        for connection in root.findall('connection'):
-            from_edge = connection.attrib['from']
-            from_lane = int(connection.attrib['fromLane'])
-
-            no_internal_links = self.network.net_params.no_internal_links
-            if from_edge[0] != ":" and not no_internal_links:
-                # if the edge is not an internal links and the network is
-                # allowed to have internal links, then get the next edge/lane
-                # pair from the "via" element
-                via = connection.attrib['via'].rsplit('_', 1)
-                to_edge = via[0]
-                to_lane = int(via[1])
-            else:
-                to_edge = connection.attrib['to']
-                to_lane = int(connection.attrib['toLane'])
-
-            if from_edge not in next_conn_data:
-                next_conn_data[from_edge] = dict()
-
-            if from_lane not in next_conn_data[from_edge]:
-                next_conn_data[from_edge][from_lane] = list()
-
-            if to_edge not in prev_conn_data:
-                prev_conn_data[to_edge] = dict()
-
-            if to_lane not in prev_conn_data[to_edge]:
-                prev_conn_data[to_edge][to_lane] = list()
-
-            next_conn_data[from_edge][from_lane].append((to_edge, to_lane))
-            prev_conn_data[to_edge][to_lane].append((from_edge, from_lane))
-
-        connection_data = {'next': next_conn_data, 'prev': prev_conn_data}
-
-        return net_data, connection_data
+        return read_net(os.path.join(self.cfg_path, self.netfn),
+                        self.network.net_params.no_internal_links,
+                        sidecar=sidecar)
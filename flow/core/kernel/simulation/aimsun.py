@@ -61,9 +61,11 @@ class AimsunKernelSimulation(KernelSimulation):
 
         return FlowAimsunAPI(port=sim_params.port)
 
-    def simulation_step(self):
+    def simulation_step(self, num_steps=1):
         """See parent class."""
-        self.kernel_api.simulation_step()
+        for _ in range(num_steps):
+            self.kernel_api.simulation_step()
+        self.num_substeps = num_steps
 
     def update(self, reset):
         """See parent class.
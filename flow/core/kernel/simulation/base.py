@@ -26,6 +26,8 @@ class KernelSimulation(object):
         """
         self.master_kernel = master_kernel
         self.kernel_api = None
+        # number of simulation steps advanced by the last simulation step
+        self.num_substeps = 1
 
     def pass_api(self, kernel_api):
         """Acquire the kernel api that was generated by the simulation kernel.
@@ -49,13 +51,42 @@ class KernelSimulation(object):
         """
         raise NotImplementedError
 
-    def simulation_step(self):
+    def simulation_step(self, num_steps=1):
         """Advance the simulation by one step.
 
         This is done in most cases by calling a relevant simulator API method.
+
+        Parameters
+        ----------
+        num_steps : int, optional
+            number of simulation steps to advance at once, if supported by
+            the simulator. Defaults to 1
         """
         raise NotImplementedError
 
+    def simulation_step_async(self, num_steps=1):
+        """Start advancing the simulation, without waiting for it to finish.
+
+        The simulator computes the simulation step(s) while the caller
+        continues, until `simulation_step_wait` is called. No other request
+        may be sent to the simulator in between. Simulators that do not
+        support this advance the simulation before this method returns.
+
+        Parameters
+        ----------
+        num_steps : int, optional
+            number of simulation steps to advance at once, see
+            `simulation_step`
+        """
+        self.simulation_step(num_steps)
+
+    def simulation_step_wait(self):
+        """Wait for the step(s) started by `simulation_step_async` to finish.
+
+        This is a no-op if no step was started.
+        """
+        pass
+
     def update(self, reset):
         """Update the internal attributes of the simulation kernel.
 
@@ -80,6 +111,52 @@ class KernelSimulation(object):
         """
         raise NotImplementedError
 
+    def get_colliding_ids(self):
+        """Return the ids of the vehicles that collided in the last time step.
+
+        Returns
+        -------
+        list of str
+        """
+        raise NotImplementedError
+
+    def get_min_expected_number(self):
+        """Return the number of vehicles in or waiting to enter the network.
+
+        Returns
+        -------
+        int
+        """
+        raise NotImplementedError
+
+    def save_state(self, in_memory=False):
+        """Save the current state of the simulation.
+
+        Parameters
+        ----------
+        in_memory : bool, optional
+            specifies whether the saved state is held in memory, in which
+            case it does not use any resource of the simulation instance, and
+            may be restored after the state is pickled
+
+        Returns
+        -------
+        any
+            the saved state, which may be restored with `load_state` as long
+            as the simulation instance is not closed
+        """
+        raise NotImplementedError
+
+    def load_state(self, state):
+        """Restore a state of the simulation saved with `save_state`.
+
+        Parameters
+        ----------
+        state : any
+            the saved state
+        """
+        raise NotImplementedError
+
     def close(self):
         """Closes the current simulation instance."""
         raise NotImplementedError
@@ -2,20 +2,89 @@
 
 from flow.core.kernel.simulation import KernelSimulation
 from flow.core.util import ensure_dir
+from flow.utils import libsumo_connection
+from flow.utils import traci_pipeline
+from flow.utils.traci_pipeline import TraCICommandBuffer
 import flow.config as config
-import traci.constants as tc
-import traci
+from traci.connection import Connection
+from traci.exceptions import FatalTraCIError
+import collections
 import traceback
 import os
+import warnings
+import random
+import shutil
+import tempfile
 import time
 import logging
+import socket
 import subprocess
 import signal
+import sumolib
 
 
 # Number of retries on restarting SUMO before giving up
 RETRIES_ON_ERROR = 10
 
+# initial and maximum number of seconds between two attempts to connect to a
+# sumo instance that does not accept connections yet
+CONNECT_BACKOFF_MIN = 0.005
+CONNECT_BACKOFF_MAX = 0.1
+
+# variables of the simulation that are always subscribed to, in addition to
+# the ones in the subscription profile, see
+# flow.core.params.SubscriptionProfile. These are needed to check for
+# entering, exiting, and colliding vehicles.
+REQUIRED_SUBSCRIPTIONS = [
+    "departed_ids", "arrived_ids", "teleport_starting_ids", "time_step",
+    "delta_t"
+]
+
+
+def connect_when_ready(port, proc, timeout):
+    """Connect to a sumo instance as soon as it accepts TraCI connections.
+
+    Connections are attempted with an exponentially increasing delay (from
+    CONNECT_BACKOFF_MIN to CONNECT_BACKOFF_MAX seconds) between attempts, so
+    that the connection is established shortly after sumo opens its port
+    instead of after a fixed delay.
+
+    Parameters
+    ----------
+    port : int
+        port the sumo instance listens on
+    proc : subprocess.Popen or None
+        the sumo process, used to stop waiting if it exits prematurely
+    timeout : float
+        maximum number of seconds to wait for the connection
+
+    Returns
+    -------
+    traci.connection.Connection
+        the connection to the sumo instance
+
+    Raises
+    ------
+    traci.exceptions.FatalTraCIError
+        if sumo exits or does not accept connections before the timeout
+    """
+    deadline = time.time() + timeout
+    delay = CONNECT_BACKOFF_MIN
+    while True:
+        try:
+            return Connection("localhost", port, None)
+        except socket.error as e:
+            if proc is not None and proc.poll() is not None:
+                raise FatalTraCIError(
+                    "sumo exited with code {} before accepting connections "
+                    "on port {}".format(proc.returncode, port))
+            if time.time() + delay > deadline:
+                raise FatalTraCIError(
+                    "Could not connect to sumo on port {} within {} seconds: "
+                    "{}".format(port, timeout, e))
+            time.sleep(delay)
+            delay = min(2 * delay, CONNECT_BACKOFF_MAX)
+
 
 class TraCISimulation(KernelSimulation):
     """Sumo simulation kernel.
@@ -35,6 +104,24 @@ class TraCISimulation(KernelSimulation):
         KernelSimulation.__init__(self, master_kernel)
         # contains the subprocess.Popen instance used to start traci
         self.sumo_proc = None
+        # sumo instances launched in advance, as (command without port and
+        # seed, subprocess.Popen instance, port) tuples
+        self._pool = collections.deque()
+        # buffer of commands sent to sumo together before the next step
+        self.command_buffer = None
+        # ids of the subscribed variables of the simulation
+        self._subscription_variables = traci_pipeline.subscription_variables(
+            'simulation',
+            REQUIRED_SUBSCRIPTIONS + master_kernel.subscriptions.simulation)
+        # subscription results of the simulation in the current step
+        self.__sim_obs = {}
+        # directory of the sumo states saved by `save_state`, which is removed
+        # when the simulation is closed
+        self._state_dir = None
+        self._num_states = 0
+        # simulation time of the step requested by `simulation_step_async`
+        # whose reply has not been read yet
+        self._pending_step = None
 
     def pass_api(self, kernel_api):
         """See parent class.
@@ -43,29 +130,156 @@ class TraCISimulation(KernelSimulation):
         """
         KernelSimulation.pass_api(self, kernel_api)
 
-        # subscribe some simulation parameters needed to check for entering,
-        # exiting, and colliding vehicles
-        self.kernel_api.simulation.subscribe([
-            tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS,
-            tc.VAR_TELEPORT_STARTING_VEHICLES_IDS, tc.VAR_TIME_STEP,
-            tc.VAR_DELTA_T
-        ])
+        # commands that are sent to sumo in a single message before every
+        # simulation step
+        self.command_buffer = TraCICommandBuffer(kernel_api)
+        self._pending_step = None
 
-    def simulation_step(self):
+        # subscribe the simulation parameters in the subscription profile
+        self.kernel_api.simulation.subscribe(self._subscription_variables)
+        self.__sim_obs = {}
+
+    def simulation_step(self, num_steps=1):
+        """See parent class.
+
+        Any commands queued in the command buffer are sent to sumo first.
+        Several simulation steps are advanced with a single call to sumo,
+        which reports the vehicles that departed, arrived, or collided in any
+        of these steps in the subscription results of the last step.
+        """
+        self.simulation_step_async(num_steps)
+        self.simulation_step_wait()
+
+    def simulation_step_async(self, num_steps=1):
+        """See parent class.
+
+        The step is requested from sumo without reading the reply, which is
+        only read by `simulation_step_wait`. With libsumo, the step is
+        performed before this method returns.
+        """
+        self.command_buffer.flush()
+        if num_steps == 1:
+            step = 0.
+        else:
+            # time_step is in milliseconds, and delta_t in seconds
+            step = self._get_variable("time_step") / 1000. + \
+                num_steps * self._get_variable("delta_t")
+        if traci_pipeline.send_simulation_step(self.kernel_api, step):
+            self._pending_step = step
+        self.num_substeps = num_steps
+
+    def simulation_step_wait(self):
         """See parent class."""
-        self.kernel_api.simulationStep()
+        if self._pending_step is not None:
+            step, self._pending_step = self._pending_step, None
+            traci_pipeline.receive_simulation_step(self.kernel_api, step)
 
     def update(self, reset):
         """See parent class."""
-        pass
+        self.__sim_obs = dict(
+            self.kernel_api.simulation.getSubscriptionResults())
 
-    def close(self):
+    def save_state(self, in_memory=False):
+        """See parent class.
+
+        The state of sumo is saved to a file with TraCI's saveState. The
+        random number generators of sumo are not saved, so that simulations
+        restored to the same state are not replicas of each other. If the
+        state is held in memory, the content of the file is read and the file
+        is removed.
+
+        Returns
+        -------
+        (str or bytes, dict)
+            the state file (or its content), and the subscription results of
+            the simulation in the current step
+        """
+        # commands queued for this step are part of the saved state
+        self.command_buffer.flush()
+
+        if self._state_dir is None:
+            self._state_dir = tempfile.mkdtemp(prefix="flow_state_")
+        filename = os.path.join(
+            self._state_dir, "state_{}.xml".format(self._num_states))
+        self._num_states += 1
+
+        self.kernel_api.simulation.saveState(filename)
+
+        if in_memory:
+            with open(filename, "rb") as f:
+                content = f.read()
+            os.remove(filename)
+            return content, dict(self.__sim_obs)
+
+        return filename, dict(self.__sim_obs)
+
+    def load_state(self, state):
         """See parent class."""
+        filename, sim_obs = state
+
+        # commands queued for the current state do not apply to the new one
+        self.command_buffer.clear()
+
+        if isinstance(filename, bytes):
+            # the state was held in memory, and is written to a file for as
+            # long as sumo loads it
+            content = filename
+            if self._state_dir is None:
+                self._state_dir = tempfile.mkdtemp(prefix="flow_state_")
+            fd, filename = tempfile.mkstemp(
+                suffix=".xml", dir=self._state_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                self.kernel_api.simulation.loadState(filename)
+            finally:
+                os.remove(filename)
+        else:
+            self.kernel_api.simulation.loadState(filename)
+
+        self.__sim_obs = dict(sim_obs)
+
+    def close(self):
+        """See parent class.
+
+        The states saved with `save_state` are removed.
+        """
+        # the reply to a pending step would otherwise be read as the reply
+        # to the close command
+        try:
+            self.simulation_step_wait()
+        except Exception:
+            pass
         self.kernel_api.close()
 
+        if self._state_dir is not None:
+            shutil.rmtree(self._state_dir, ignore_errors=True)
+            self._state_dir = None
+
     def check_collision(self):
         """See parent class."""
-        return self.kernel_api.simulation.getStartingTeleportNumber() != 0
+        return len(self._get_variable("teleport_starting_ids")) != 0
+
+    def get_colliding_ids(self):
+        """See parent class."""
+        return self._get_variable("colliding_ids")
+
+    def get_min_expected_number(self):
+        """See parent class."""
+        return self._get_variable("min_expected_number")
+
+    def _get_variable(self, name):
+        """Return the value of a variable of the simulation in this step.
+
+        Variables that are not in the subscription profile are requested from
+        sumo the first time they are accessed in a step, and are stored with
+        the subscription results until the next step.
+        """
+        var_id = traci_pipeline.SUBSCRIPTION_VARIABLES['simulation'][name][0]
+        if var_id not in self.__sim_obs:
+            self.__sim_obs[var_id] = traci_pipeline.get_variable(
+                self.kernel_api, 'simulation', name)
+        return self.__sim_obs[var_id]
 
     def start_simulation(self, scenario, sim_params):
         """Start a sumo simulation instance.
@@ -73,87 +287,58 @@ class TraCISimulation(KernelSimulation):
         This method uses the configuration files created by the scenario class
         to initialize a sumo instance. Also initializes a traci connection to
         interface with sumo from Python.
+
+        If a pool of sumo instances is requested (see
+        SumoParams.sumo_pool_size), an instance that was launched in advance
+        with the same configuration is used if one is available, and a new
+        instance is launched in the background to replace it in the pool.
+
+        If libsumo is requested (see SumoParams.use_libsumo), sumo is run
+        within this process instead, unless libsumo cannot be used, in which
+        case a warning is issued and a sumo process is started as usual.
         """
+        if getattr(sim_params, "use_libsumo", False):
+            traci_connection = self._start_libsumo(scenario, sim_params)
+            if traci_connection is not None:
+                return traci_connection
+
+        pooled = self._pool_enabled(sim_params)
+        if pooled:
+            traci_connection = self._start_from_pool(scenario, sim_params)
+            if traci_connection is not None:
+                self._fill_pool(scenario, sim_params)
+                return traci_connection
+
         error = None
         for _ in range(RETRIES_ON_ERROR):
             try:
                 # port number the sumo instance will be run on
                 port = sim_params.port
 
-                sumo_binary = "sumo-gui" if sim_params.render is True \
-                    else "sumo"
-
                 # command used to start sumo
-                sumo_call = [
-                    sumo_binary, "-c", scenario.cfg,
-                    "--remote-port", str(sim_params.port),
-                    "--num-clients", str(sim_params.num_clients),
-                    "--step-length", str(sim_params.sim_step)
-                ]
-
-                # add step logs (if requested)
-                if sim_params.no_step_log:
-                    sumo_call.append("--no-step-log")
-
-                # add the lateral resolution of the sublanes (if requested)
-                if sim_params.lateral_resolution is not None:
-                    sumo_call.append("--lateral-resolution")
-                    sumo_call.append(str(sim_params.lateral_resolution))
-
-                # add the emission path to the sumo command (if requested)
-                if sim_params.emission_path is not None:
-                    ensure_dir(sim_params.emission_path)
-                    emission_out = sim_params.emission_path + \
-                        "{0}-emission.xml".format(scenario.name)
-                    sumo_call.append("--emission-output")
-                    sumo_call.append(emission_out)
-                else:
-                    emission_out = None
-
-                if sim_params.overtake_right:
-                    sumo_call.append("--lanechange.overtake-right")
-                    sumo_call.append("true")
-
-                # specify a simulation seed (if requested)
-                if sim_params.seed is not None:
-                    sumo_call.append("--seed")
-                    sumo_call.append(str(sim_params.seed))
-
-                if not sim_params.print_warnings:
-                    sumo_call.append("--no-warnings")
-                    sumo_call.append("true")
-
-                # set the time it takes for a gridlock teleport to occur
-                sumo_call.append("--time-to-teleport")
-                sumo_call.append(str(int(sim_params.teleport_time)))
-
-                # check collisions at intersections
-                sumo_call.append("--collision.check-junctions")
-                sumo_call.append("true")
+                sumo_call = self._sumo_call(scenario, sim_params) + \
+                    self._instance_args(port, sim_params.seed)
 
                 logging.info(" Starting SUMO on port " + str(port))
                 logging.debug(" Cfg file: " + str(scenario.cfg))
                 if sim_params.num_clients > 1:
                     logging.info(" Num clients are" +
                                  str(sim_params.num_clients))
-                logging.debug(" Emission file: " + str(emission_out))
                 logging.debug(" Step length: " + str(sim_params.sim_step))
 
                 # Opening the I/O thread to SUMO
                 self.sumo_proc = subprocess.Popen(
                     sumo_call, preexec_fn=os.setsid)
 
-                # wait a small period of time for the subprocess to activate
-                # before trying to connect with traci
-                if os.environ.get("TEST_FLAG", 0):
-                    time.sleep(0.1)
-                else:
-                    time.sleep(config.SUMO_SLEEP)
-
-                traci_connection = traci.connect(port, numRetries=100)
+                # connect with traci as soon as sumo accepts connections
+                traci_connection = connect_when_ready(
+                    port, self.sumo_proc, config.SUMO_CONNECT_TIMEOUT)
                 traci_connection.setOrder(0)
                 traci_connection.simulationStep()
 
+                if pooled:
+                    self._fill_pool(scenario, sim_params)
+
                 return traci_connection
             except Exception as e:
                 print("Error during start: {}".format(traceback.format_exc()))
@@ -161,8 +346,195 @@ class TraCISimulation(KernelSimulation):
                 self.teardown_sumo()
         raise error
 
+    def _sumo_call(self, scenario, sim_params):
+        """Return the command used to start sumo, without port and seed.
+
+        The port and seed of every instance are specified separately (see
+        _instance_args), so that instances in the pool that were launched with
+        the same command can be used interchangeably.
+        """
+        sumo_binary = "sumo-gui" if sim_params.render is True else "sumo"
+
+        sumo_call = [
+            sumo_binary, "-c", scenario.cfg,
+            "--num-clients", str(sim_params.num_clients),
+            "--step-length", str(sim_params.sim_step)
+        ]
+
+        # add step logs (if requested)
+        if sim_params.no_step_log:
+            sumo_call.append("--no-step-log")
+
+        # add the lateral resolution of the sublanes (if requested)
+        if sim_params.lateral_resolution is not None:
+            sumo_call.append("--lateral-resolution")
+            sumo_call.append(str(sim_params.lateral_resolution))
+
+        # add the emission path to the sumo command (if requested)
+        if sim_params.emission_path is not None:
+            ensure_dir(sim_params.emission_path)
+            emission_out = sim_params.emission_path + \
+                "{0}-emission.xml".format(scenario.name)
+            sumo_call.append("--emission-output")
+            sumo_call.append(emission_out)
+            logging.debug(" Emission file: " + str(emission_out))
+
+        if sim_params.overtake_right:
+            sumo_call.append("--lanechange.overtake-right")
+            sumo_call.append("true")
+
+        if not sim_params.print_warnings:
+            sumo_call.append("--no-warnings")
+            sumo_call.append("true")
+
+        # set the time it takes for a gridlock teleport to occur
+        sumo_call.append("--time-to-teleport")
+        sumo_call.append(str(int(sim_params.teleport_time)))
+
+        # check collisions at intersections
+        sumo_call.append("--collision.check-junctions")
+        sumo_call.append("true")
+
+        return sumo_call
+
+    def _start_libsumo(self, scenario, sim_params):
+        """Start the simulation within this process through libsumo.
+
+        Returns
+        -------
+        flow.utils.libsumo_connection.LibsumoConnection or None
+            the connection to the simulation, or None if libsumo cannot be
+            used with these parameters
+        """
+        if sim_params.render is True or sim_params.num_clients > 1:
+            reason = "sumo-gui and multiple clients are not supported"
+        elif not libsumo_connection.installed():
+            reason = "libsumo is not installed"
+        elif not libsumo_connection.available():
+            reason = "libsumo is already used by another simulation in " \
+                "this process"
+        else:
+            reason = None
+
+        if reason is not None:
+            warnings.warn("Cannot use libsumo ({}), falling back to TraCI."
+                          .format(reason))
+            return None
+
+        sumo_call = self._sumo_call(scenario, sim_params)
+
+        # specify a simulation seed (if requested)
+        if sim_params.seed is not None:
+            sumo_call.append("--seed")
+            sumo_call.append(str(sim_params.seed))
+
+        logging.info(" Starting SUMO with libsumo")
+        logging.debug(" Cfg file: " + str(scenario.cfg))
+
+        traci_connection = libsumo_connection.LibsumoConnection(sumo_call)
+        traci_connection.simulationStep()
+        self.sumo_proc = None
+
+        return traci_connection
+
+    @staticmethod
+    def _instance_args(port, seed):
+        """Return the port and (optional) seed arguments of a sumo call."""
+        args = ["--remote-port", str(port)]
+
+        # specify a simulation seed (if requested)
+        if seed is not None:
+            args.append("--seed")
+            args.append(str(seed))
+
+        return args
+
+    @staticmethod
+    def _pool_enabled(sim_params):
+        """Return whether sumo instances should be launched in advance.
+
+        Instances are not pooled if sumo-gui is used, or if emissions are
+        recorded (since all instances would write to the same file).
+        """
+        return getattr(sim_params, "sumo_pool_size", 0) > 0 \
+            and sim_params.render is not True \
+            and sim_params.emission_path is None
+
+    def _start_from_pool(self, scenario, sim_params):
+        """Connect to an instance of the pool with the same configuration.
+
+        Instances of the pool that were launched with a different
+        configuration, or that cannot be connected to, are terminated.
+
+        Returns
+        -------
+        traci.connection.Connection or None
+            the connection to the instance, or None if no instance of the pool
+            could be used
+        """
+        sumo_call = tuple(self._sumo_call(scenario, sim_params))
+        while len(self._pool) > 0:
+            pool_call, proc, port = self._pool.popleft()
+            if pool_call != sumo_call:
+                self._kill(proc)
+                continue
+
+            try:
+                traci_connection = connect_when_ready(
+                    port, proc, config.SUMO_CONNECT_TIMEOUT)
+                traci_connection.setOrder(0)
+                traci_connection.simulationStep()
+            except Exception as e:
+                logging.warning(" Error while starting a pooled SUMO "
+                                "instance: {}".format(e))
+                self._kill(proc)
+                continue
+
+            logging.info(" Using pooled SUMO instance on port " + str(port))
+            self.sumo_proc = proc
+            sim_params.port = port
+            return traci_connection
+
+        return None
+
+    def _fill_pool(self, scenario, sim_params):
+        """Launch sumo instances until the pool is full.
+
+        The instances are only launched here. They load the network in the
+        background while the current instance is being simulated, and are
+        connected to by a later call to start_simulation. Every instance is
+        given its own random seed if a seed was specified, as the seed is
+        re-drawn at every restart of the simulation anyway.
+        """
+        sumo_call = self._sumo_call(scenario, sim_params)
+        while len(self._pool) < sim_params.sumo_pool_size:
+            port = sumolib.miscutils.getFreeSocketPort()
+            seed = None if sim_params.seed is None \
+                else random.randint(0, 100000)
+            proc = subprocess.Popen(
+                sumo_call + self._instance_args(port, seed),
+                preexec_fn=os.setsid)
+            self._pool.append((tuple(sumo_call), proc, port))
+
+    def drain_pool(self):
+        """Terminate all sumo instances in the pool."""
+        while len(self._pool) > 0:
+            _, proc, _ = self._pool.popleft()
+            self._kill(proc)
+
+    @staticmethod
+    def _kill(proc):
+        """Kill a sumo process launched by this class."""
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
     def teardown_sumo(self):
         """Kill the sumo subprocess instance."""
+        if self.sumo_proc is None:
+            # sumo is run within this process through libsumo
+            return
         try:
             os.killpg(self.sumo_proc.pid, signal.SIGTERM)
         except Exception as e:
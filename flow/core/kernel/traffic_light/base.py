@@ -64,6 +64,18 @@ class KernelTrafficLight(object):
         """
         raise NotImplementedError
 
+    def save_state(self):
+        """Return a copy of the traffic light data of the current time step.
+
+        This is restored with `load_state` when the simulation is restored to
+        the current state, see flow.core.kernel.Kernel.save_state.
+        """
+        raise NotImplementedError
+
+    def load_state(self, state):
+        """Restore the traffic light data returned by `save_state`."""
+        raise NotImplementedError
+
     def get_ids(self):
         """Return the names of all nodes with traffic lights."""
         raise NotImplementedError
@@ -98,3 +110,45 @@ class KernelTrafficLight(object):
             Element = state of the traffic light at that node/lane
         """
         raise NotImplementedError
+
+    def get_phase(self, node_id):
+        """Return the index of the current phase of the specified node.
+
+        Parameters
+        ----------
+        node_id: str
+            name of the node
+
+        Returns
+        -------
+        int
+        """
+        raise NotImplementedError
+
+    def get_program(self, node_id):
+        """Return the id of the current program of the specified node.
+
+        Parameters
+        ----------
+        node_id: str
+            name of the node
+
+        Returns
+        -------
+        str
+        """
+        raise NotImplementedError
+
+    def get_next_switch(self, node_id):
+        """Return the time (in seconds) of the next phase switch of the node.
+
+        Parameters
+        ----------
+        node_id: str
+            name of the node
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
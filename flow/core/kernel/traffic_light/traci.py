@@ -1,8 +1,13 @@
 """Script containing the TraCI traffic light kernel class."""
 
 from flow.core.kernel.traffic_light import KernelTrafficLight
+from flow.utils import traci_pipeline
 import traci.constants as tc
 
+# variables every traffic light is subscribed to, in addition to the ones in
+# the subscription profile, see flow.core.params.SubscriptionProfile
+REQUIRED_SUBSCRIPTIONS = ["state"]
+
 
 class TraCITrafficLight(KernelTrafficLight):
     """Sumo traffic light kernel.
@@ -30,6 +35,11 @@ class TraCITrafficLight(KernelTrafficLight):
         # number of traffic light nodes
         self.num_traffic_lights = 0
 
+        # ids of the variables every traffic light is subscribed to
+        self._subscription_variables = traci_pipeline.subscription_variables(
+            'trafficlight',
+            REQUIRED_SUBSCRIPTIONS + master_kernel.subscriptions.traffic_light)
+
     def pass_api(self, kernel_api):
         """See parent class.
 
@@ -44,15 +54,28 @@ class TraCITrafficLight(KernelTrafficLight):
         self.num_traffic_lights = len(self.__ids)
 
         # subscribe the traffic light signal data
-        for node_id in self.__ids:
-            self.kernel_api.trafficlight.subscribe(
-                node_id, [tc.TL_RED_YELLOW_GREEN_STATE])
+        traci_pipeline.subscribe(
+            self.kernel_api, 'trafficlight', self.__ids,
+            self._subscription_variables)
 
     def update(self, reset):
         """See parent class."""
         tls_obs = self.kernel_api.trafficlight.getSubscriptionResults()
         self.__tls = tls_obs.copy()
 
+    def save_state(self):
+        """See parent class."""
+        return {tl_id: dict(obs) for tl_id, obs in self.__tls.items()}
+
+    def load_state(self, state):
+        """See parent class.
+
+        The subscriptions to the traffic lights are kept by sumo when a state
+        is loaded, and accordingly only the data of the traffic lights needs
+        to be restored.
+        """
+        self.__tls = {tl_id: dict(obs) for tl_id, obs in state.items()}
+
     def get_ids(self):
         """See parent class."""
         return self.__ids
@@ -71,3 +94,29 @@ class TraCITrafficLight(KernelTrafficLight):
     def get_state(self, node_id):
         """See parent class."""
         return self.__tls[node_id][tc.TL_RED_YELLOW_GREEN_STATE]
+
+    def get_phase(self, node_id):
+        """See parent class."""
+        return self._get_variable(node_id, "phase")
+
+    def get_program(self, node_id):
+        """See parent class."""
+        return self._get_variable(node_id, "program")
+
+    def get_next_switch(self, node_id):
+        """See parent class."""
+        return self._get_variable(node_id, "next_switch")
+
+    def _get_variable(self, node_id, name):
+        """Return the value of a variable of a traffic light.
+
+        Variables that are not in the subscription profile are requested from
+        sumo the first time they are accessed in a step, and are stored with
+        the subscription results of the traffic light until the next step.
+        """
+        obs = self.__tls.setdefault(node_id, {})
+        var_id = traci_pipeline.SUBSCRIPTION_VARIABLES['trafficlight'][name][0]
+        if var_id not in obs:
+            obs[var_id] = traci_pipeline.get_variable(
+                self.kernel_api, 'trafficlight', name, node_id)
+        return obs[var_id]
@@ -1,5 +1,6 @@
 """Script containing the base vehicle kernel class."""
 from flow.core.kernel.vehicle.base import KernelVehicle
+from flow.core.kernel.vehicle.window import StepCountWindow
 import collections
 import numpy as np
 from copy import deepcopy
@@ -49,12 +50,14 @@ class AimsunKernelVehicle(KernelVehicle):
         self._ids_by_edge = dict()
 
         # number of vehicles that entered the network for every time-step
-        self._num_departed = []
-        self._departed_ids = []
+        # (within the last `max_flow_window` seconds)
+        flow_window = max(int(round(
+            sim_params.max_flow_window / sim_params.sim_step)), 1)
+        self._departed = StepCountWindow(flow_window)
 
-        # number of vehicles to exit the network for every time-step
-        self._num_arrived = []
-        self._arrived_ids = []
+        # number of vehicles to exit the network for every time-step (within
+        # the last `max_flow_window` seconds)
+        self._arrived = StepCountWindow(flow_window)
 
         # contains conversion from Flow-ID to Aimsun-ID
         self._id_aimsun2flow = {}
@@ -120,6 +123,17 @@ class AimsunKernelVehicle(KernelVehicle):
             for veh_id in exited_vehicles:
                 self.remove(veh_id)
 
+        # update the number of departed and arrived vehicles
+        if reset:
+            self._departed.clear()
+            self._arrived.clear()
+        else:
+            self._departed.append(
+                len(added_vehicles),
+                [self._id_aimsun2flow[aimsun_id]
+                 for aimsun_id in added_vehicles])
+            self._arrived.append(len(exited_vehicles), list(exited_vehicles))
+
         for veh_id in self.__ids:
             aimsun_id = self._id_flow2aimsun[veh_id]
 
@@ -443,29 +457,40 @@ class AimsunKernelVehicle(KernelVehicle):
     def get_ids_by_edge(self, edges):
         """See parent class."""
         if isinstance(edges, (list, np.ndarray)):
-            return sum([self.get_ids_by_edge(edge) for edge in edges], [])
+            # collect the vehicles of all edges in a single pass
+            ids_by_edge = {edge: [] for edge in edges}
+            for veh in self.__ids:
+                ids = ids_by_edge.get(self.get_edge(veh))
+                if ids is not None:
+                    ids.append(veh)
+            return [veh for edge in edges for veh in ids_by_edge[edge]]
         return [veh for veh in self.__ids if self.get_edge(veh) == edges]
 
+    def get_ids_by_lane(self, edge, lane):
+        """See parent class."""
+        ids = [veh for veh in self.get_ids_by_edge(edge)
+               if self.get_lane(veh) == lane]
+        return sorted(ids, key=self.get_position)
+
     def get_inflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_departed) == 0:
+        num_inflow, num_steps = self._departed.sum(
+            int(time_span / self.sim_step))
+        if num_steps == 0:
             return 0
-        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+        return 3600 * num_inflow / (num_steps * self.sim_step)
 
     def get_outflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_arrived) == 0:
+        num_outflow, num_steps = self._arrived.sum(
+            int(time_span / self.sim_step))
+        if num_steps == 0:
             return 0
-        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+        return 3600 * num_outflow / (num_steps * self.sim_step)
 
     def get_num_arrived(self):
         """See parent class."""
-        if len(self._num_arrived) > 0:
-            return self._num_arrived[-1]
-        else:
-            return 0
+        return self._arrived.last_count
 
     def get_type(self, veh_id):
         """See parent class."""
@@ -613,6 +638,9 @@ class AimsunKernelVehicle(KernelVehicle):
 
     def get_x_by_id(self, veh_id):
         """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return self.master_kernel.scenario.get_x(
+                self.get_edge(veh_id), self.get_position(veh_id)).tolist()
         return self.master_kernel.scenario.get_x(self.get_edge(veh_id),
                                                  self.get_position(veh_id))
 
@@ -51,6 +51,7 @@ class KernelVehicle(object):
         self.master_kernel = master_kernel
         self.kernel_api = None
         self.sim_step = sim_params.sim_step
+        self.sight_radius = sim_params.sight_radius
 
     def pass_api(self, kernel_api):
         """Acquire the kernel api that was generated by the simulation kernel.
@@ -80,6 +81,18 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def save_state(self):
+        """Return a copy of the state of the vehicle kernel.
+
+        This is restored with `load_state` when the simulation is restored to
+        the current state, see flow.core.kernel.Kernel.save_state.
+        """
+        raise NotImplementedError
+
+    def load_state(self, state):
+        """Restore the state of the vehicle kernel returned by `save_state`."""
+        raise NotImplementedError
+
     def add(self, veh_id, type_id, edge, pos, lane, speed):
         """Add a vehicle to the network.
 
@@ -260,6 +273,14 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def get_ids_by_lane(self, edge, lane):
+        """Return the names of all vehicles in the specified lane of an edge.
+
+        The vehicles are sorted by their position in the lane. If no vehicles
+        are currently in the lane, then returns an empty list.
+        """
+        raise NotImplementedError
+
     def get_inflow_rate(self, time_span):
         """Return the inflow rate (in veh/hr) of vehicles from the network.
 
@@ -382,6 +403,86 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def get_acceleration(self, veh_id, error=-1001):
+        """Return the acceleration (m/s^2) of the specified vehicle.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_waiting_time(self, veh_id, error=-1001):
+        """Return the time (in seconds) the specified vehicle has been halting.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_co2_emission(self, veh_id, error=-1001):
+        """Return the CO2 emission (mg/s) of the specified vehicle.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_fuel_consumption(self, veh_id, error=-1001):
+        """Return the fuel consumption (ml/s) of the specified vehicle.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
+    def get_distance(self, veh_id, error=-1001):
+        """Return the distance (in meters) driven by the specified vehicle.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        float
+        """
+        raise NotImplementedError
+
     def get_length(self, veh_id, error=-1001):
         """Return the length of the specified vehicle.
 
@@ -626,6 +727,32 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def get_neighbors(self, veh_id, radius=None, error=list()):
+        """Return the vehicles located within a radius of a vehicle.
+
+        Distances are computed between the world positions of the vehicles,
+        regardless of the edges and lanes they are located in. When called
+        with a list of vehicle ids, the neighbors of all vehicles are computed
+        at once.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
+        radius : float, optional
+            radius around the vehicle (in meters). Defaults to the sight radius
+            specified in the simulation parameters.
+        error : list, optional
+            value that is returned if the vehicle is not found
+
+        Returns
+        -------
+        list of str or list of list of str
+            ids of the neighboring vehicles, sorted by distance (excluding the
+            vehicle itself)
+        """
+        raise NotImplementedError
+
     def get_x_by_id(self, veh_id):
         """Provide a 1-D representation of the position of a vehicle.
 
@@ -635,12 +762,12 @@ class KernelVehicle(object):
 
         Parameters
         ----------
-        veh_id : str
-            vehicle identifier
+        veh_id : str or list of str
+            vehicle id, or list of vehicle ids
 
         Returns
         -------
-        float
+        float or list of float
         """
         raise NotImplementedError
 
@@ -0,0 +1,213 @@
+"""Script containing a columnar (array-backed) store of vehicle states."""
+
+import numpy as np
+
+# default number of slots allocated when the store is created
+INITIAL_CAPACITY = 64
+
+
+class ColumnarVehicleState(object):
+    """Array-backed storage of the state of all vehicles in the network.
+
+    Every vehicle is assigned a fixed slot (row) when it enters the network,
+    and every state variable (speed, position, lane, ...) is stored as a
+    separate NumPy array (column) indexed by these slots. Columns are filled
+    once per simulation step, after which the state of any subset of vehicles
+    can be gathered with a single fancy-indexing operation instead of one
+    dictionary lookup per vehicle and variable.
+
+    Slots of vehicles that exit the network are recycled for vehicles that
+    enter it later on, and the columns grow geometrically when more slots are
+    needed.
+
+    Edges are interned into integer indices, so that the "edge" column is a
+    numeric array as well. The edge names can be recovered by indexing
+    `edge_names` with the values in this column.
+
+    Attributes
+    ----------
+    slots : dict < str, int >
+        slot index of every vehicle currently in the store
+    edge_names : list of str
+        name of every edge that has been interned, indexed by the edge index
+    """
+
+    #: name and dtype of every column maintained by the store
+    COLUMNS = (
+        ('speed', np.float64),
+        ('default_speed', np.float64),
+        ('position', np.float64),
+        ('lane', np.int64),
+        ('edge', np.int64),
+        ('length', np.float64),
+        ('headway', np.float64),
+        ('leader', object),
+        ('follower', object),
+    )
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """Instantiate the columnar vehicle state.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            number of slots initially allocated for every column
+        """
+        self.slots = {}
+        self.edge_names = []
+        self._edge_index = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._columns = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in self.COLUMNS
+        }
+
+    def __len__(self):
+        """Return the number of vehicles currently stored."""
+        return len(self.slots)
+
+    def __contains__(self, veh_id):
+        """Return whether the vehicle is currently stored."""
+        return veh_id in self.slots
+
+    @property
+    def capacity(self):
+        """Return the number of slots currently allocated."""
+        return len(self._columns['speed'])
+
+    def add(self, veh_id):
+        """Assign a slot to a vehicle and return it.
+
+        If the vehicle already has a slot, its current slot is returned.
+        """
+        slot = self.slots.get(veh_id)
+        if slot is not None:
+            return slot
+
+        if not self._free:
+            self._grow()
+
+        slot = self._free.pop()
+        self.slots[veh_id] = slot
+        for name, dtype in self.COLUMNS:
+            self._columns[name][slot] = None if dtype is object else 0
+        return slot
+
+    def remove(self, veh_id):
+        """Release the slot of a vehicle, if it has one."""
+        slot = self.slots.pop(veh_id, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def clear(self):
+        """Remove all vehicles from the store."""
+        self.slots.clear()
+        self._free = list(range(self.capacity - 1, -1, -1))
+
+    def edge_index(self, edge):
+        """Return the integer index of an edge, interning it if needed."""
+        index = self._edge_index.get(edge)
+        if index is None:
+            index = len(self.edge_names)
+            self._edge_index[edge] = index
+            self.edge_names.append(edge)
+        return index
+
+    def slots_of(self, veh_ids):
+        """Return the slots of the specified vehicles.
+
+        Vehicles that are not in the store are assigned the slot -1.
+
+        Parameters
+        ----------
+        veh_ids : list of str or np.ndarray
+            vehicle identifiers
+
+        Returns
+        -------
+        np.ndarray
+            slot of every vehicle
+        """
+        slots = self.slots
+        return np.fromiter((slots.get(veh_id, -1) for veh_id in veh_ids),
+                           dtype=np.int64, count=len(veh_ids))
+
+    def set(self, name, veh_id, value):
+        """Set the value of a column for a single vehicle."""
+        slot = self.slots.get(veh_id)
+        if slot is not None:
+            self._columns[name][slot] = value
+
+    def fill(self, name, slots, values):
+        """Set the value of a column for several vehicles at once.
+
+        Parameters
+        ----------
+        name : str
+            name of the column
+        slots : np.ndarray
+            slots of the vehicles, see `slots_of`
+        values : array_like
+            new values, one per slot
+        """
+        self._columns[name][slots] = values
+
+    def gather(self, name, veh_ids, error):
+        """Return the values of a column for the specified vehicles.
+
+        Parameters
+        ----------
+        name : str
+            name of the column
+        veh_ids : list of str or np.ndarray
+            vehicle identifiers
+        error : any
+            value returned for vehicles that are not in the store
+
+        Returns
+        -------
+        np.ndarray
+            value of the column for every vehicle
+        """
+        slots = self.slots_of(veh_ids)
+        values = self._columns[name][slots]
+        missing = slots < 0
+        if missing.any():
+            if values.dtype != object and not np.can_cast(
+                    np.min_scalar_type(error), values.dtype):
+                values = values.astype(object)
+            values[missing] = error
+        return values
+
+    def gather_edges(self, veh_ids, error):
+        """Return the name of the edge of the specified vehicles.
+
+        Parameters
+        ----------
+        veh_ids : list of str or np.ndarray
+            vehicle identifiers
+        error : any
+            value returned for vehicles that are not in the store
+
+        Returns
+        -------
+        np.ndarray
+            edge of every vehicle, as an array of python objects
+        """
+        slots = self.slots_of(veh_ids)
+        names = np.empty(len(self.edge_names) + 1, dtype=object)
+        names[:-1] = self.edge_names
+        names[-1] = error
+        indices = self._columns['edge'][slots]
+        indices[slots < 0] = len(self.edge_names)
+        return names[indices]
+
+    def _grow(self):
+        """Double the number of slots allocated for every column."""
+        capacity = self.capacity
+        new_capacity = max(2 * capacity, 1)
+        for name, dtype in self.COLUMNS:
+            column = np.zeros(new_capacity, dtype=dtype)
+            column[:capacity] = self._columns[name]
+            self._columns[name] = column
+        self._free.extend(range(new_capacity - 1, capacity - 1, -1))
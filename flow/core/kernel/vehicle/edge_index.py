@@ -0,0 +1,148 @@
+"""Script containing an incrementally maintained index of vehicle locations."""
+
+import bisect
+
+
+class EdgeIndex(object):
+    """Index of the vehicles located in every edge and lane of the network.
+
+    Instead of being rebuilt from scratch every time step, the index is only
+    modified when a vehicle enters, exits, or changes its edge or lane. The
+    vehicles in every lane are kept sorted by their position by `sort`, which
+    checks the order of every occupied lane and only sorts the lanes whose
+    order changed. Vehicles usually keep their order within a lane, but may
+    overtake each other without changing lanes, e.g. with the sublane model,
+    when teleported, or when moved with moveTo.
+
+    The vehicles in an edge are sorted by lane and then by position. These
+    lists are cached, and only recomputed once a vehicle enters or exits the
+    edge, changes lanes within it, or overtakes another vehicle. The lists
+    returned by the index should accordingly not be modified.
+
+    Usage
+    -----
+        >>> index = EdgeIndex()
+        >>> index.update('human_0', 'top', 0)
+        >>> index.update('human_1', 'top', 1)
+        >>> index.sort(positions.get)
+        >>> index.ids_by_edge('top')
+        ['human_0', 'human_1']
+    """
+
+    def __init__(self):
+        """Instantiate an empty index."""
+        # (edge, lane) of every vehicle in the index
+        self._location = {}
+        # vehicles in every occupied lane, sorted by position
+        self._lanes = {}
+        # sorted indices of the occupied lanes of every edge
+        self._edge_lanes = {}
+        # vehicles in every edge, see `ids_by_edge`
+        self._edge_ids = {}
+
+    def __len__(self):
+        """Return the number of vehicles in the index."""
+        return len(self._location)
+
+    def __contains__(self, veh_id):
+        """Return whether the vehicle is in the index."""
+        return veh_id in self._location
+
+    def update(self, veh_id, edge, lane):
+        """Set the current edge and lane of a vehicle.
+
+        Nothing is done if the vehicle's location did not change since the
+        last call. Otherwise, the vehicle is moved to its new lane, which must
+        then be sorted by calling `sort` before the index is queried.
+
+        Returns
+        -------
+        bool
+            whether the location of the vehicle changed
+        """
+        location = (edge, lane)
+        previous = self._location.get(veh_id)
+        if previous == location:
+            return False
+
+        if previous is not None:
+            self._discard(veh_id, previous)
+
+        self._location[veh_id] = location
+        vehicles = self._lanes.get(location)
+        if vehicles is None:
+            self._lanes[location] = [veh_id]
+            bisect.insort(self._edge_lanes.setdefault(edge, []), lane)
+        else:
+            vehicles.append(veh_id)
+        self._edge_ids.pop(edge, None)
+        return True
+
+    def remove(self, veh_id):
+        """Remove a vehicle from the index, if it is there."""
+        location = self._location.pop(veh_id, None)
+        if location is not None:
+            self._discard(veh_id, location)
+
+    def clear(self):
+        """Remove all vehicles from the index."""
+        self._location.clear()
+        self._lanes.clear()
+        self._edge_lanes.clear()
+        self._edge_ids.clear()
+
+    def sort(self, position):
+        """Sort the vehicles in every lane whose order changed.
+
+        Parameters
+        ----------
+        position : callable
+            returns the position of a vehicle in its lane given its id
+        """
+        for (edge, _), vehicles in self._lanes.items():
+            if len(vehicles) < 2:
+                continue
+            positions = [position(veh_id) for veh_id in vehicles]
+            if all(x <= y for x, y in zip(positions, positions[1:])):
+                continue
+            order = sorted(range(len(vehicles)), key=positions.__getitem__)
+            vehicles[:] = [vehicles[i] for i in order]
+            self._edge_ids.pop(edge, None)
+
+    def location(self, veh_id):
+        """Return the (edge, lane) pair of a vehicle, or None."""
+        return self._location.get(veh_id)
+
+    def ids_by_lane(self, edge, lane):
+        """Return the vehicles in a lane, sorted by position."""
+        return self._lanes.get((edge, lane), [])
+
+    def ids_by_edge(self, edge):
+        """Return the vehicles in an edge, sorted by lane and position."""
+        vehicles = self._edge_ids.get(edge)
+        if vehicles is None:
+            vehicles = []
+            for lane in self._edge_lanes.get(edge, []):
+                vehicles.extend(self._lanes[edge, lane])
+            self._edge_ids[edge] = vehicles
+        return vehicles
+
+    def ids_by_edges(self, edges):
+        """Return the vehicles in several edges, in the order of the edges."""
+        vehicles = []
+        for edge in edges:
+            vehicles.extend(self.ids_by_edge(edge))
+        return vehicles
+
+    def _discard(self, veh_id, location):
+        """Remove a vehicle from the lane it is currently located in."""
+        edge, lane = location
+        vehicles = self._lanes[location]
+        vehicles.remove(veh_id)
+        if not vehicles:
+            del self._lanes[location]
+            edge_lanes = self._edge_lanes[edge]
+            edge_lanes.remove(lane)
+            if not edge_lanes:
+                del self._edge_lanes[edge]
+        self._edge_ids.pop(edge, None)
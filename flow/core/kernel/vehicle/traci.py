@@ -1,16 +1,29 @@
 """Script containing the TraCI vehicle kernel class."""
 
 from flow.core.kernel.vehicle import KernelVehicle
+from flow.core.kernel.vehicle.columnar import ColumnarVehicleState
+from flow.core.kernel.vehicle.window import StepCountWindow
+from flow.core.kernel.vehicle.edge_index import EdgeIndex
+from flow.core.profiler import profile_phase
+from flow.utils import traci_pipeline
 import traci.constants as tc
 from traci.exceptions import FatalTraCIError, TraCIException
 import numpy as np
+from scipy.spatial import cKDTree
 import collections
 import warnings
+from copy import deepcopy
 from flow.controllers.car_following_models import SimCarFollowingController
 from flow.controllers.rlcontroller import RLController
 from flow.controllers.lane_change_controllers import SimLaneChangeController
-from bisect import bisect_left
-import itertools
+
+# variables every vehicle is subscribed to once it enters the network, in
+# addition to the ones in the subscription profile, see
+# flow.core.params.SubscriptionProfile
+REQUIRED_SUBSCRIPTIONS = ["lane", "position", "edge", "speed"]
+
+# maximum distance at which leaders are looked for, in meters
+LEADER_SUBSCRIPTION_DIST = 2000
 
 # colors for vehicles
 WHITE = (255, 255, 255)
@@ -56,16 +69,69 @@ class TraCIVehicle(KernelVehicle):
         # contain the minGap attribute of each type of vehicle
         self.minGap = {}
 
-        # list of vehicle ids located in each edge in the network
-        self._ids_by_edge = dict()
+        # number of calls to `update`, used to recompute derived attributes of
+        # the vehicles at most once per step
+        self._generation = 0
+        self._leaders_generation = -1
 
-        # number of vehicles that entered the network for every time-step
-        self._num_departed = []
-        self._departed_ids = []
+        # k-d tree of the world positions of the vehicles, see
+        # `_get_spatial_index`
+        self._spatial_index = None
+        self._spatial_index_of = {}
+        self._spatial_index_generation = -1
+
+        # vehicles sorted by lane and position, see `_get_lane_order`
+        self._lane_order = None
+        self._lane_order_generation = -1
+
+        # names of the variables every vehicle is subscribed to
+        self._subscribed = set(
+            REQUIRED_SUBSCRIPTIONS + master_kernel.subscriptions.vehicle)
+
+        # whether leaders are computed by Flow instead of being subscribed
+        # from sumo, see `_flow_leaders`
+        self._use_flow_leaders = \
+            sim_params.flow_leaders or "leader" not in self._subscribed
+        if self._use_flow_leaders:
+            self._subscribed.discard("leader")
+
+        # ids of the variables every vehicle is subscribed to
+        self._subscription_variables = traci_pipeline.subscription_variables(
+            'vehicle', [name for name in REQUIRED_SUBSCRIPTIONS +
+                        master_kernel.subscriptions.vehicle
+                        if name in self._subscribed])
+
+        # subscription results of the simulation in the current step
+        self.__sim_obs = {}
+
+        # ids of the vehicles located in each edge and lane of the network
+        self._edge_index = EdgeIndex()
+
+        # type of the vehicles added via `add` that have not departed yet
+        self._pending_types = {}
 
-        # number of vehicles to exit the network for every time-step
-        self._num_arrived = []
-        self._arrived_ids = []
+        # type of the vehicles of every inflow, see `_get_departed_type`
+        self._inflow_types = None
+
+        # length of every vehicle type, collected once per type
+        self._type_lengths = {}
+
+        # number of vehicles that entered the network for every time-step
+        # (within the last `max_flow_window` seconds)
+        flow_window = max(int(round(
+            sim_params.max_flow_window / sim_params.sim_step)), 1)
+        self._departed = StepCountWindow(flow_window)
+
+        # number of vehicles to exit the network for every time-step (within
+        # the last `max_flow_window` seconds)
+        self._arrived = StepCountWindow(flow_window)
+
+        # array-backed copy of the vehicle states, used by the list getters
+        # (only available if requested by the simulation parameters)
+        if sim_params.columnar_state:
+            self._columns = ColumnarVehicleState()
+        else:
+            self._columns = None
 
     def initialize(self, vehicles):
         """
@@ -77,6 +143,8 @@ class TraCIVehicle(KernelVehicle):
         self.minGap = vehicles.minGap
         self.num_vehicles = 0
         self.num_rl_vehicles = 0
+        self._inflow_types = None
+        self._type_lengths = {}
 
     def update(self, reset):
         """See parent class.
@@ -102,15 +170,25 @@ class TraCIVehicle(KernelVehicle):
         for veh_id in sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]:
             if veh_id not in sim_obs[tc.VAR_TELEPORT_STARTING_VEHICLES_IDS]:
                 self.remove(veh_id)
-            else:
+            elif veh_id in self.__sumo_obs:
                 # this is meant to resolve the KeyError bug when there are
                 # collisions
                 vehicle_obs[veh_id] = self.__sumo_obs[veh_id]
 
+        # vehicles that entered and exited the network during the simulation
+        # steps advanced since the last update (if several steps were
+        # advanced at once, see TraCISimulation.simulation_step)
+        arrived_ids = set(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
+
         # add entering vehicles into the vehicles class
+        departed_ids = []
         for veh_id in sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]:
-            veh_type = self.kernel_api.vehicle.getTypeID(veh_id)
-            if veh_id in self.get_ids():
+            if veh_id in arrived_ids and veh_id not in self.__vehicles:
+                # the vehicle already exited the network
+                self._pending_types.pop(veh_id, None)
+                continue
+            veh_type = self._get_departed_type(veh_id)
+            if veh_id in self.__vehicles:
                 # this occurs when a vehicle is actively being removed and
                 # placed again in the network to ensure a constant number of
                 # total vehicles (e.g. GreenWaveEnv). In this case, the vehicle
@@ -119,6 +197,18 @@ class TraCIVehicle(KernelVehicle):
                 pass
             else:
                 self._add_departed(veh_id, veh_type)
+                departed_ids.append(veh_id)
+
+        # subscribe all new vehicles at once, and collect their initial state
+        # from the subscription results
+        traci_pipeline.subscribe(
+            self.kernel_api, 'vehicle', departed_ids,
+            self._subscription_variables,
+            {tc.VAR_LEADER: LEADER_SUBSCRIPTION_DIST},
+            pipelined=self.master_kernel.simulation.command_buffer.pipelined)
+        for veh_id in departed_ids:
+            vehicle_obs[veh_id] = dict(
+                self.kernel_api.vehicle.getSubscriptionResults(veh_id))
 
         if reset:
             self.time_counter = 0
@@ -128,12 +218,11 @@ class TraCIVehicle(KernelVehicle):
             for veh_id in self.__rl_ids:
                 self.__vehicles[veh_id]["last_lc"] = -float("inf")
                 self.prev_last_lc[veh_id] = -float("inf")
-            self._num_departed.clear()
-            self._num_arrived.clear()
-            self._departed_ids.clear()
-            self._arrived_ids.clear()
+            self._departed.clear()
+            self._arrived.clear()
         else:
-            self.time_counter += 1
+            num_steps = self.master_kernel.simulation.num_substeps
+            self.time_counter += num_steps
             # update the "last_lc" variable
             for veh_id in self.__rl_ids:
                 prev_lane = self.get_lane(veh_id)
@@ -141,51 +230,164 @@ class TraCIVehicle(KernelVehicle):
                         prev_lane and veh_id in self.__rl_ids:
                     self.__vehicles[veh_id]["last_lc"] = self.time_counter
 
-            # updated the list of departed and arrived vehicles
-            self._num_departed.append(
-                len(sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]))
-            self._num_arrived.append(len(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]))
-            self._departed_ids.append(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
-            self._arrived_ids.append(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
-
-        # update the "headway", "leader", and "follower" variables
-        for veh_id in self.__ids:
-            try:
-                _position = vehicle_obs.get(veh_id, {}).get(
-                    tc.VAR_POSITION, -1001)
-                _angle = vehicle_obs.get(veh_id, {}).get(tc.VAR_ANGLE, -1001)
-                _time_step = sim_obs[tc.VAR_TIME_STEP]
-                _time_delta = sim_obs[tc.VAR_DELTA_T]
-                self.__vehicles[veh_id]["orientation"] = \
-                    list(_position) + [_angle]
-                self.__vehicles[veh_id]["timestep"] = _time_step
-                self.__vehicles[veh_id]["timedelta"] = _time_delta
-            except TypeError:
-                pass
-            headway = vehicle_obs.get(veh_id, {}).get(tc.VAR_LEADER, None)
-            # check for a collided vehicle or a vehicle with no leader
-            if headway is None:
-                self.__vehicles[veh_id]["leader"] = None
-                self.__vehicles[veh_id]["follower"] = None
-                self.__vehicles[veh_id]["headway"] = 1e+3
-            else:
-                min_gap = self.minGap[self.get_type(veh_id)]
-                self.__vehicles[veh_id]["headway"] = headway[1] + min_gap
-                self.__vehicles[veh_id]["leader"] = headway[0]
-                try:
-                    self.__vehicles[headway[0]]["follower"] = veh_id
-                except KeyError:
-                    pass
+            # updated the list of departed and arrived vehicles (the vehicles
+            # of all the steps advanced at once are attributed to the last)
+            for _ in range(num_steps - 1):
+                self._departed.append(0)
+                self._arrived.append(0)
+            self._departed.append(
+                len(sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]),
+                sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS])
+            self._arrived.append(
+                len(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]),
+                sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
 
         # update the sumo observations variable
         self.__sumo_obs = vehicle_obs.copy()
 
+        # derived attributes (e.g. headways and orientations) computed in the
+        # previous step are now outdated, and are recomputed when first
+        # accessed, see `_update_leaders` and `get_orientation`
+        self._generation += 1
+        self.__sim_obs = sim_obs
+
+        # move the vehicles that changed edges or lanes in the edge index
+        self._update_edge_index()
+
         # update the lane leaders data for each vehicle
-        self._multi_lane_headways()
+        with profile_phase(self.master_kernel.profiler,
+                           "multi_lane_headways"):
+            self._multi_lane_headways()
 
         # make sure the rl vehicle list is still sorted
         self.__rl_ids.sort()
 
+        # update the columnar copy of the vehicle states
+        if self._columns is not None:
+            self._update_columns()
+
+    def save_state(self):
+        """See parent class.
+
+        All attributes of the kernel are copied, except for the references to
+        the master kernel and the kernel api.
+        """
+        return deepcopy({
+            key: value for key, value in self.__dict__.items()
+            if key not in ("master_kernel", "kernel_api")})
+
+    def load_state(self, state):
+        """See parent class.
+
+        The vehicles loaded from a sumo state are not reported as departed,
+        and are subscribed to again here in case their subscriptions were not
+        kept by sumo when the state was loaded.
+        """
+        self.__dict__.update(deepcopy(state))
+
+        traci_pipeline.subscribe(
+            self.kernel_api, 'vehicle', self.__ids,
+            self._subscription_variables,
+            {tc.VAR_LEADER: LEADER_SUBSCRIPTION_DIST},
+            pipelined=self.master_kernel.simulation.command_buffer.pipelined)
+
+    def _update_leaders(self):
+        """Compute the headway, leader, and follower of all vehicles.
+
+        This is performed at most once per simulation step, when any of these
+        attributes is first accessed after `update`.
+        """
+        if self._leaders_generation == self._generation:
+            return
+        self._leaders_generation = self._generation
+
+        if self._use_flow_leaders:
+            # the follower of every vehicle is the vehicle whose leader it is
+            leaders, headways = self._flow_leaders()
+            for veh_id in self.__ids:
+                self.__vehicles[veh_id]["follower"] = None
+            for veh_id, leader, headway in zip(self.__ids, leaders, headways):
+                vehicle = self.__vehicles[veh_id]
+                vehicle["leader"] = leader
+                vehicle["headway"] = headway
+                if leader is not None:
+                    self.__vehicles[leader]["follower"] = veh_id
+        else:
+            for veh_id in self.__ids:
+                vehicle = self.__vehicles[veh_id]
+                headway = self.__sumo_obs.get(veh_id, {}).get(
+                    tc.VAR_LEADER, None)
+                # check for a collided vehicle or a vehicle with no leader
+                if headway is None:
+                    vehicle["leader"] = None
+                    vehicle["follower"] = None
+                    vehicle["headway"] = 1e+3
+                else:
+                    min_gap = self.minGap[self.get_type(veh_id)]
+                    vehicle["headway"] = headway[1] + min_gap
+                    vehicle["leader"] = headway[0]
+                    try:
+                        self.__vehicles[headway[0]]["follower"] = veh_id
+                    except KeyError:
+                        pass
+
+        if self._columns is not None:
+            columns = self._columns
+            slots = columns.slots_of(self.__ids)
+            vehicles = [self.__vehicles[veh_id] for veh_id in self.__ids]
+            columns.fill('headway', slots,
+                         [veh.get("headway", -1001) for veh in vehicles])
+            columns.fill('leader', slots,
+                         [veh.get("leader", "") for veh in vehicles])
+            columns.fill('follower', slots,
+                         [veh.get("follower", "") for veh in vehicles])
+
+    def _update_edge_index(self):
+        """Update the edge index with the current edges and lanes.
+
+        Only vehicles whose edge or lane differs from the one stored in the
+        index are moved, after which the lanes whose order changed are sorted.
+        """
+        edge_index = self._edge_index
+        for veh_id in self.__ids:
+            obs = self.__sumo_obs.get(veh_id)
+            if obs is None:
+                continue
+            edge_index.update(veh_id,
+                              obs.get(tc.VAR_ROAD_ID, ""),
+                              obs.get(tc.VAR_LANE_INDEX, -1001))
+
+        sumo_obs = self.__sumo_obs
+        edge_index.sort(lambda veh_id: sumo_obs.get(veh_id, {}).get(
+            tc.VAR_LANEPOSITION, -1001))
+
+    def _update_columns(self):
+        """Fill the columnar vehicle state with the current vehicle states.
+
+        This is performed once per simulation step, after which the list
+        getters gather their values directly from the columns.
+        """
+        columns = self._columns
+        slots = columns.slots_of(self.__ids)
+        sumo_obs = [self.__sumo_obs.get(veh_id, {}) for veh_id in self.__ids]
+        vehicles = [self.__vehicles[veh_id] for veh_id in self.__ids]
+
+        columns.fill('speed', slots,
+                     [obs.get(tc.VAR_SPEED, -1001) for obs in sumo_obs])
+        if "default_speed" in self._subscribed:
+            columns.fill('default_speed', slots,
+                         [obs.get(tc.VAR_SPEED_WITHOUT_TRACI, -1001)
+                          for obs in sumo_obs])
+        columns.fill('position', slots,
+                     [obs.get(tc.VAR_LANEPOSITION, -1001) for obs in sumo_obs])
+        columns.fill('lane', slots,
+                     [obs.get(tc.VAR_LANE_INDEX, -1001) for obs in sumo_obs])
+        columns.fill('edge', slots,
+                     [columns.edge_index(obs.get(tc.VAR_ROAD_ID, ""))
+                      for obs in sumo_obs])
+        columns.fill('length', slots,
+                     [veh.get("length", -1001) for veh in vehicles])
+
     def _add_departed(self, veh_id, veh_type):
         """Add a vehicle that entered the network from an inflow or reset.
 
@@ -202,6 +404,8 @@ class TraCIVehicle(KernelVehicle):
         self.num_vehicles += 1
         self.__ids.append(veh_id)
         self.__vehicles[veh_id] = dict()
+        if self._columns is not None:
+            self._columns.add(veh_id)
 
         # specify the type
         self.__vehicles[veh_id]["type"] = veh_type
@@ -242,17 +446,8 @@ class TraCIVehicle(KernelVehicle):
             if lc_controller[0] != SimLaneChangeController:
                 self.__controlled_lc_ids.append(veh_id)
 
-        # subscribe the new vehicle
-        self.kernel_api.vehicle.subscribe(veh_id, [
-            tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION, tc.VAR_ROAD_ID,
-            tc.VAR_SPEED, tc.VAR_EDGES, tc.VAR_POSITION, tc.VAR_ANGLE,
-            tc.VAR_SPEED_WITHOUT_TRACI
-        ])
-        self.kernel_api.vehicle.subscribeLeader(veh_id, 2000)
-
         # some constant vehicle parameters to the vehicles class
-        self.__vehicles[veh_id]["length"] = self.kernel_api.vehicle.getLength(
-            veh_id)
+        self.__vehicles[veh_id]["length"] = self._get_type_length(veh_type)
 
         # set the "last_lc" parameter of the vehicle
         self.__vehicles[veh_id]["last_lc"] = -float("inf")
@@ -261,32 +456,59 @@ class TraCIVehicle(KernelVehicle):
         self.__vehicles[veh_id]["initial_speed"] = \
             self.type_parameters[veh_type]["initial_speed"]
 
-        # set the speed mode for the vehicle
+        # set the speed mode and lane changing mode for the vehicle. These are
+        # sent to sumo together with other buffered commands before the next
+        # simulation step.
+        command_buffer = self.master_kernel.simulation.command_buffer
         speed_mode = self.type_parameters[veh_type][
             "car_following_params"].speed_mode
-        self.kernel_api.vehicle.setSpeedMode(veh_id, speed_mode)
-
-        # set the lane changing mode for the vehicle
+        command_buffer.queue('vehicle', 'setSpeedMode', veh_id, speed_mode)
         lc_mode = self.type_parameters[veh_type][
             "lane_change_params"].lane_change_mode
-        self.kernel_api.vehicle.setLaneChangeMode(veh_id, lc_mode)
-
-        # get initial state info
-        self.__sumo_obs[veh_id] = dict()
-        self.__sumo_obs[veh_id][tc.VAR_ROAD_ID] = \
-            self.kernel_api.vehicle.getRoadID(veh_id)
-        self.__sumo_obs[veh_id][tc.VAR_LANEPOSITION] = \
-            self.kernel_api.vehicle.getLanePosition(veh_id)
-        self.__sumo_obs[veh_id][tc.VAR_LANE_INDEX] = \
-            self.kernel_api.vehicle.getLaneIndex(veh_id)
-        self.__sumo_obs[veh_id][tc.VAR_SPEED] = \
-            self.kernel_api.vehicle.getSpeed(veh_id)
+        command_buffer.queue('vehicle', 'setLaneChangeMode', veh_id, lc_mode)
 
         # make sure that the order of rl_ids is kept sorted
         self.__rl_ids.sort()
 
+    def _get_departed_type(self, veh_id):
+        """Return the type of a vehicle that just entered the network.
+
+        The type is known without querying sumo for vehicles that were added
+        via the `add` method or by an inflow (whose vehicles are named
+        "<inflow name>.<index>" by sumo). sumo is only queried for any other
+        vehicle.
+        """
+        veh_type = self._pending_types.pop(veh_id, None)
+        if veh_type is not None:
+            return veh_type
+
+        if self._inflow_types is None:
+            self._inflow_types = {}
+            inflows = self.master_kernel.scenario.network.net_params.inflows
+            if inflows is not None:
+                for inflow in inflows.get():
+                    self._inflow_types[inflow["name"]] = inflow["vtype"]
+
+        veh_type = self._inflow_types.get(veh_id.rsplit(".", 1)[0])
+        if veh_type is not None:
+            return veh_type
+
+        return self.kernel_api.vehicle.getTypeID(veh_id)
+
+    def _get_type_length(self, veh_type):
+        """Return the length of the vehicles of a specific type."""
+        length = self._type_lengths.get(veh_type)
+        if length is None:
+            length = self.kernel_api.vehicletype.getLength(veh_type)
+            self._type_lengths[veh_type] = length
+        return length
+
     def remove(self, veh_id):
         """See parent class."""
+        # discard any buffered commands for the vehicle
+        self._pending_types.pop(veh_id, None)
+        self.master_kernel.simulation.command_buffer.discard(veh_id)
+
         # remove from sumo
         try:
             self.kernel_api.vehicle.unsubscribe(veh_id)
@@ -294,6 +516,10 @@ class TraCIVehicle(KernelVehicle):
         except (FatalTraCIError, TraCIException):
             pass
 
+        if self._columns is not None:
+            self._columns.remove(veh_id)
+        self._edge_index.remove(veh_id)
+
         try:
             # remove from the vehicles kernel
             del self.__vehicles[veh_id]
@@ -322,30 +548,51 @@ class TraCIVehicle(KernelVehicle):
     def test_set_speed(self, veh_id, speed):
         """Set the speed of the specified vehicle."""
         self.__sumo_obs[veh_id][tc.VAR_SPEED] = speed
+        if self._columns is not None:
+            self._columns.set('speed', veh_id, speed)
 
     def test_set_edge(self, veh_id, edge):
         """Set the speed of the specified vehicle."""
         self.__sumo_obs[veh_id][tc.VAR_ROAD_ID] = edge
+        if self._columns is not None:
+            self._columns.set('edge', veh_id, self._columns.edge_index(edge))
+        self._edge_index.update(veh_id, edge, self.get_lane(veh_id))
 
     def set_follower(self, veh_id, follower):
         """Set the follower of the specified vehicle."""
+        self._update_leaders()
         self.__vehicles[veh_id]["follower"] = follower
+        if self._columns is not None:
+            self._columns.set('follower', veh_id, follower)
 
     def set_headway(self, veh_id, headway):
         """Set the headway of the specified vehicle."""
+        self._update_leaders()
         self.__vehicles[veh_id]["headway"] = headway
+        if self._columns is not None:
+            self._columns.set('headway', veh_id, headway)
 
     def get_orientation(self, veh_id):
         """See parent class."""
-        return self.__vehicles[veh_id]["orientation"]
+        vehicle = self.__vehicles[veh_id]
+        if vehicle.get("orientation_generation") != self._generation:
+            vehicle["orientation_generation"] = self._generation
+            try:
+                vehicle["orientation"] = \
+                    list(self._get_variable(veh_id, "world_position")) + \
+                    [self._get_variable(veh_id, "angle")]
+            except TypeError:
+                # keep the last known orientation of the vehicle
+                pass
+        return vehicle["orientation"]
 
     def get_timestep(self, veh_id):
         """See parent class."""
-        return self.__vehicles[veh_id]["timestep"]
+        return self.__sim_obs[tc.VAR_TIME_STEP]
 
     def get_timedelta(self, veh_id):
         """See parent class."""
-        return self.__vehicles[veh_id]["timedelta"]
+        return self.__sim_obs[tc.VAR_DELTA_T]
 
     def get_type(self, veh_id):
         """Return the type of the vehicle of veh_id."""
@@ -388,72 +635,85 @@ class TraCIVehicle(KernelVehicle):
     def get_ids_by_edge(self, edges):
         """See parent class."""
         if isinstance(edges, (list, np.ndarray)):
-            return sum([self.get_ids_by_edge(edge) for edge in edges], [])
-        return self._ids_by_edge.get(edges, []) or []
+            return self._edge_index.ids_by_edges(edges)
+        return self._edge_index.ids_by_edge(edges)
+
+    def get_ids_by_lane(self, edge, lane):
+        """See parent class."""
+        return self._edge_index.ids_by_lane(edge, lane)
 
     def get_inflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_departed) == 0:
+        num_inflow, num_steps = self._departed.sum(
+            int(time_span / self.sim_step))
+        if num_steps == 0:
             return 0
-        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+        return 3600 * num_inflow / (num_steps * self.sim_step)
 
     def get_outflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_arrived) == 0:
+        num_outflow, num_steps = self._arrived.sum(
+            int(time_span / self.sim_step))
+        if num_steps == 0:
             return 0
-        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+        return 3600 * num_outflow / (num_steps * self.sim_step)
 
     def get_num_arrived(self):
         """See parent class."""
-        if len(self._num_arrived) > 0:
-            return self._num_arrived[-1]
-        else:
-            return 0
+        return self._arrived.last_count
 
     def get_arrived_ids(self):
         """See parent class."""
-        if len(self._arrived_ids) > 0:
-            return self._arrived_ids[-1]
+        if len(self._arrived) > 0:
+            return self._arrived.last_ids
         else:
             return 0
 
     def get_departed_ids(self):
         """See parent class."""
-        if len(self._departed_ids) > 0:
-            return self._departed_ids[-1]
+        if len(self._departed) > 0:
+            return self._departed.last_ids
         else:
             return 0
 
     def get_speed(self, veh_id, error=-1001):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('speed', veh_id, error)
             return [self.get_speed(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_SPEED, error)
 
     def get_default_speed(self, veh_id, error=-1001):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None \
+                    and "default_speed" in self._subscribed:
+                return self._columns.gather('default_speed', veh_id, error)
             return [self.get_default_speed(vehID, error) for vehID in veh_id]
-        return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_SPEED_WITHOUT_TRACI,
-                                                   error)
+        return self._get_variable(veh_id, "default_speed", error)
 
     def get_position(self, veh_id, error=-1001):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('position', veh_id, error)
             return [self.get_position(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_LANEPOSITION, error)
 
     def get_edge(self, veh_id, error=""):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather_edges(veh_id, error)
             return [self.get_edge(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_ROAD_ID, error)
 
     def get_lane(self, veh_id, error=-1001):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('lane', veh_id, error)
             return [self.get_lane(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_LANE_INDEX, error)
 
@@ -461,29 +721,105 @@ class TraCIVehicle(KernelVehicle):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_route(vehID, error) for vehID in veh_id]
-        return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_EDGES, error)
+        return self._get_variable(veh_id, "route", error)
+
+    def get_acceleration(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_acceleration(vehID, error) for vehID in veh_id]
+        return self._get_variable(veh_id, "acceleration", error)
+
+    def get_waiting_time(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_waiting_time(vehID, error) for vehID in veh_id]
+        return self._get_variable(veh_id, "waiting_time", error)
+
+    def get_co2_emission(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_co2_emission(vehID, error) for vehID in veh_id]
+        return self._get_variable(veh_id, "co2_emission", error)
+
+    def get_fuel_consumption(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_fuel_consumption(vehID, error)
+                    for vehID in veh_id]
+        return self._get_variable(veh_id, "fuel_consumption", error)
+
+    def get_distance(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_distance(vehID, error) for vehID in veh_id]
+        return self._get_variable(veh_id, "distance", error)
+
+    def _get_variable(self, veh_id, name, error=-1001):
+        """Return the value of a variable of a vehicle in the current step.
+
+        Variables that are not in the subscription profile are requested from
+        sumo the first time they are accessed in a step, and are stored with
+        the subscription results of the vehicle until the next step.
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle id
+        name : str
+            name of the variable, see
+            flow.utils.traci_pipeline.SUBSCRIPTION_VARIABLES
+        error : any, optional
+            value that is returned if the vehicle is not found
+        """
+        obs = self.__sumo_obs.get(veh_id)
+        if obs is None:
+            return error
+        var_id = traci_pipeline.SUBSCRIPTION_VARIABLES['vehicle'][name][0]
+        if var_id in obs:
+            return obs[var_id]
+        if name in self._subscribed:
+            return error
+
+        try:
+            value = traci_pipeline.get_variable(
+                self.kernel_api, 'vehicle', name, veh_id)
+        except TraCIException:
+            return error
+        obs[var_id] = value
+        return value
 
     def get_length(self, veh_id, error=-1001):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('length', veh_id, error)
             return [self.get_length(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("length", error)
 
     def get_leader(self, veh_id, error=""):
         """See parent class."""
+        self._update_leaders()
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('leader', veh_id, error)
             return [self.get_leader(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("leader", error)
 
     def get_follower(self, veh_id, error=""):
         """See parent class."""
+        self._update_leaders()
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('follower', veh_id, error)
             return [self.get_follower(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("follower", error)
 
     def get_headway(self, veh_id, error=-1001):
         """See parent class."""
+        self._update_leaders()
         if isinstance(veh_id, (list, np.ndarray)):
+            if self._columns is not None:
+                return self._columns.gather('headway', veh_id, error)
             return [self.get_headway(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("headway", error)
 
@@ -497,6 +833,7 @@ class TraCIVehicle(KernelVehicle):
                           ' {}.'.format(veh_id, error))
             return error
         else:
+            self._update_leaders()
             return self.__vehicles.get(veh_id, {}).get("headway", error)
 
     def get_acc_controller(self, veh_id, error=None):
@@ -574,261 +911,223 @@ class TraCIVehicle(KernelVehicle):
             return [self.get_lane_followers(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("lane_followers", error)
 
-    def _multi_lane_headways(self):
-        """Compute multi-lane data for all vehicles.
+    def get_neighbors(self, veh_id, radius=None, error=list()):
+        """See parent class.
 
-        This includes the lane leaders/followers/headways/tailways/
-        leader velocity/follower velocity for all
-        vehicles in the network.
+        The neighbors are found via a k-d tree of the world positions of all
+        vehicles, which is built at most once per simulation step.
         """
-        edge_list = self.master_kernel.scenario.get_edge_list()
-        junction_list = self.master_kernel.scenario.get_junction_list()
-        tot_list = edge_list + junction_list
-        num_edges = (len(self.master_kernel.scenario.get_edge_list()) + len(
-            self.master_kernel.scenario.get_junction_list()))
-
-        # maximum number of lanes in the network
-        max_lanes = max([self.master_kernel.scenario.num_lanes(edge_id)
-                         for edge_id in tot_list])
-
-        # Key = edge id
-        # Element = list, with the ith element containing tuples with the name
-        #           and position of all vehicles in lane i
-        edge_dict = dict.fromkeys(tot_list)
-
-        # add the vehicles to the edge_dict element
-        for veh_id in self.get_ids():
-            edge = self.get_edge(veh_id)
-            lane = self.get_lane(veh_id)
-            pos = self.get_position(veh_id)
-            if edge:
-                if edge_dict[edge] is None:
-                    edge_dict[edge] = [[] for _ in range(max_lanes)]
-                edge_dict[edge][lane].append((veh_id, pos))
-
-        # sort all lanes in each edge by position
-        for edge in tot_list:
-            if edge_dict[edge] is None:
-                del edge_dict[edge]
-            else:
-                for lane in range(max_lanes):
-                    edge_dict[edge][lane].sort(key=lambda x: x[1])
+        if radius is None:
+            radius = self.sight_radius
+        ids, positions, tree = self._get_spatial_index()
 
-        for veh_id in self.get_rl_ids():
-            # collect the lane leaders, followers, headways, and tailways for
-            # each vehicle
-            edge = self.get_edge(veh_id)
-            if edge:
-                headways, tailways, leaders, followers = \
-                    self._multi_lane_headways_util(veh_id, edge_dict,
-                                                   num_edges)
-
-                # add the above values to the vehicles class
-                self.set_lane_headways(veh_id, headways)
-                self.set_lane_tailways(veh_id, tailways)
-                self.set_lane_leaders(veh_id, leaders)
-                self.set_lane_followers(veh_id, followers)
-
-        self._ids_by_edge = dict().fromkeys(edge_list)
-
-        for edge_id in edge_dict:
-            edges = list(itertools.chain.from_iterable(edge_dict[edge_id]))
-            # check for edges with no vehicles
-            if len(edges) > 0:
-                edges, _ = zip(*edges)
-                self._ids_by_edge[edge_id] = list(edges)
-            else:
-                self._ids_by_edge[edge_id] = []
+        if isinstance(veh_id, (list, np.ndarray)):
+            veh_ids = veh_id
+        else:
+            veh_ids = [veh_id]
+
+        # query the neighbors of all vehicles with known positions at once
+        index = self._spatial_index_of
+        rows = [index.get(veh, -1) for veh in veh_ids]
+        found = [row for row in rows if row >= 0]
+        matches = tree.query_ball_point(positions[found], radius) \
+            if len(found) > 0 else []
+
+        neighbors = []
+        matches = iter(matches)
+        for row in rows:
+            if row < 0:
+                neighbors.append(error)
+                continue
+            match = np.array([i for i in next(matches) if i != row],
+                             dtype=np.int64)
+            distances = np.linalg.norm(
+                positions[match] - positions[row], axis=1)
+            order = np.argsort(distances, kind="mergesort")
+            neighbors.append([ids[i] for i in match[order]])
 
-    def _multi_lane_headways_util(self, veh_id, edge_dict, num_edges):
-        """Compute multi-lane data for the specified vehicle.
+        if isinstance(veh_id, (list, np.ndarray)):
+            return neighbors
+        return neighbors[0]
 
-        Parameters
-        ----------
-        veh_id : str
-            name of the vehicle
-        edge_dict : dict < list<tuple> >
-            Key = Edge name
-                Index = lane index
-                Element = list sorted by position of (vehicle id, position)
+    def _get_spatial_index(self):
+        """Return a k-d tree of the world positions of all vehicles.
+
+        The tree is only rebuilt once per simulation step.
 
         Returns
         -------
-        headway : list<float>
-            Index = lane index
-            Element = headway at this lane
-        tailway : list<float>
-            Index = lane index
-            Element = tailway at this lane
-        lead_speed : list<str>
-            Index = lane index
-            Element = speed of leader at this lane
-        follow_speed : list<str>
-            Index = lane index
-            Element = speed of follower at this lane
-        leader : list<str>
-            Index = lane index
-            Element = leader at this lane
-        follower : list<str>
-            Index = lane index
-            Element = follower at this lane
+        list of str
+            ids of the vehicles in the tree
+        np.ndarray
+            world position of every vehicle in the tree
+        scipy.spatial.cKDTree or None
+            tree of the positions, None if no vehicles are in the network
         """
-        this_pos = self.get_position(veh_id)
-        this_edge = self.get_edge(veh_id)
-        this_lane = self.get_lane(veh_id)
-        num_lanes = self.master_kernel.scenario.num_lanes(this_edge)
-
-        # set default values for all output values
-        headway = [1000] * num_lanes
-        tailway = [1000] * num_lanes
-        leader = [""] * num_lanes
-        follower = [""] * num_lanes
-
-        for lane in range(num_lanes):
-            # check the vehicle's current  edge for lane leaders and followers
-            if len(edge_dict[this_edge][lane]) > 0:
-                ids, positions = zip(*edge_dict[this_edge][lane])
-                ids = list(ids)
-                positions = list(positions)
-                index = bisect_left(positions, this_pos)
-
-                # if you are at the end or the front of the edge, the lane
-                # leader is in the edges in front of you
-                if (lane == this_lane and index < len(positions) - 1) \
-                        or (lane != this_lane and index < len(positions)):
-                    # check if the index does not correspond to the current
-                    # vehicle
-                    if ids[index] == veh_id:
-                        leader[lane] = ids[index + 1]
-                        headway[lane] = (positions[index + 1] - this_pos -
-                                         self.get_length(leader[lane]))
-                    else:
-                        leader[lane] = ids[index]
-                        headway[lane] = (positions[index] - this_pos
-                                         - self.get_length(leader[lane]))
-
-                # you are in the back of the queue, the lane follower is in the
-                # edges behind you
-                if index > 0:
-                    follower[lane] = ids[index - 1]
-                    tailway[lane] = (this_pos - positions[index - 1]
-                                     - self.get_length(veh_id))
-
-            # if lane leader not found, check next edges
-            if leader[lane] == "":
-                headway[lane], leader[lane] = self._next_edge_leaders(
-                    veh_id, edge_dict, lane, num_edges)
-
-            # if lane follower not found, check previous edges
-            if follower[lane] == "":
-                tailway[lane], follower[lane] = self._prev_edge_followers(
-                    veh_id, edge_dict, lane, num_edges)
-
-        return headway, tailway, leader, follower
-
-    def _next_edge_leaders(self, veh_id, edge_dict, lane, num_edges):
-        """Search for leaders in the next edge.
-
-        Looks to the edges/junctions in front of the vehicle's current edge
-        for potential leaders. This is currently done by only looking one
-        edge/junction forwards.
+        if self._spatial_index_generation != self._generation:
+            ids, positions = [], []
+            for veh in self.__ids:
+                position = self._get_variable(veh, "world_position", None)
+                if position is not None:
+                    ids.append(veh)
+                    positions.append(position)
+            positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+            tree = cKDTree(positions) if len(ids) > 0 else None
+            self._spatial_index = (ids, positions, tree)
+            self._spatial_index_of = {veh: i for i, veh in enumerate(ids)}
+            self._spatial_index_generation = self._generation
+        return self._spatial_index
+
+    def _get_lane_order(self):
+        """Sort all vehicles by their lane and position in the lane.
+
+        This is performed at most once per simulation step.
 
         Returns
         -------
-        headway : float
-            lane headway for the specified lane
-        leader : str
-            lane leader for the specified lane
+        list of str
+            edge of every vehicle in `get_ids()`
+        np.ndarray
+            lane key of every vehicle, see
+            flow.core.kernel.scenario.lane_graph.LaneGraph.lane_keys
+        np.ndarray
+            length of every vehicle
+        flow.core.kernel.scenario.lane_graph.LaneOrder
+            the vehicles sorted by lane and position
         """
-        pos = self.get_position(veh_id)
-        edge = self.get_edge(veh_id)
-
-        headway = 1000  # env.scenario.length
-        leader = ""
-        add_length = 0  # length increment in headway
-
-        for _ in range(num_edges):
-            # break if there are no edge/lane pairs behind the current one
-            if len(self.master_kernel.scenario.next_edge(edge, lane)) == 0:
-                break
-
-            add_length += self.master_kernel.scenario.edge_length(edge)
-            edge, lane = self.master_kernel.scenario.next_edge(edge, lane)[0]
-
-            try:
-                if len(edge_dict[edge][lane]) > 0:
-                    leader = edge_dict[edge][lane][0][0]
-                    headway = edge_dict[edge][lane][0][1] - pos + add_length \
-                        - self.get_length(leader)
-            except KeyError:
-                # current edge has no vehicles, so move on
-                continue
-
-            # stop if a lane follower is found
-            if leader != "":
-                break
-
-        return headway, leader
-
-    def _prev_edge_followers(self, veh_id, edge_dict, lane, num_edges):
-        """Search for followers in the previous edge.
-
-        Looks to the edges/junctions behind the vehicle's current edge for
-        potential followers. This is currently done by only looking one
-        edge/junction backwards.
+        if self._lane_order_generation != self._generation:
+            lane_graph = self.master_kernel.scenario.get_lane_graph()
+            sumo_obs = [self.__sumo_obs.get(veh_id, {})
+                        for veh_id in self.__ids]
+            edges = [obs.get(tc.VAR_ROAD_ID, "") for obs in sumo_obs]
+            keys = lane_graph.lane_keys(
+                edges,
+                [obs.get(tc.VAR_LANE_INDEX, -1001) for obs in sumo_obs])
+            positions = [obs.get(tc.VAR_LANEPOSITION, -1001)
+                         for obs in sumo_obs]
+            lengths = np.array([self.__vehicles[veh_id].get("length", -1001)
+                                for veh_id in self.__ids], dtype=np.float64)
+            order = lane_graph.sort(keys, positions)
+
+            self._lane_order = (edges, keys, lengths, order)
+            self._lane_order_generation = self._generation
+        return self._lane_order
+
+    def _flow_leaders(self):
+        """Compute the leader and headway of all vehicles in Flow.
+
+        The leader of every vehicle is the first vehicle ahead of it in its
+        lane, or in the lanes in front of it (up to LEADER_SUBSCRIPTION_DIST
+        meters ahead), as computed from the lane-sorted vehicles. This is used
+        instead of the leaders subscribed from sumo if "flow_leaders" is set in
+        the simulation parameters, or if "leader" is not subscribed to.
+
+        The lanes in front of a vehicle are searched regardless of its route,
+        see flow.core.kernel.scenario.lane_graph.LaneGraph, so that the
+        leaders of vehicles approaching a diverging junction may differ from
+        the ones subscribed from sumo.
 
         Returns
         -------
-        tailway : float
-            lane tailway for the specified lane
-        follower : str
-            lane follower for the specified lane
+        list of str or None
+            leader of every vehicle in `get_ids()`, None if none was found
+        list of float
+            headway of every vehicle in `get_ids()`
         """
-        pos = self.get_position(veh_id)
-        edge = self.get_edge(veh_id)
+        lane_graph = self.master_kernel.scenario.get_lane_graph()
+        _, keys, lengths, order = self._get_lane_order()
 
-        tailway = 1000  # env.scenario.length
-        follower = ""
-        add_length = 0  # length increment in headway
+        veh = np.arange(len(self.__ids))
+        leader, headway, _, _ = lane_graph.lane_neighbors(
+            order, lengths, veh, keys, np.ones(len(veh), dtype=bool))
 
-        for _ in range(num_edges):
-            # break if there are no edge/lane pairs behind the current one
-            if len(self.master_kernel.scenario.prev_edge(edge, lane)) == 0:
-                break
+        # leaders further than the distance searched by sumo are ignored
+        missing = (leader < 0) | (headway > LEADER_SUBSCRIPTION_DIST)
+        headway[missing] = 1e+3
+        leader = [None if missing[i] else self.__ids[j]
+                  for i, j in enumerate(leader)]
 
-            edge, lane = self.master_kernel.scenario.prev_edge(edge, lane)[0]
-            add_length += self.master_kernel.scenario.edge_length(edge)
+        return leader, headway.tolist()
 
-            try:
-                if len(edge_dict[edge][lane]) > 0:
-                    tailway = pos - edge_dict[edge][lane][-1][1] + add_length \
-                              - self.get_length(veh_id)
-                    follower = edge_dict[edge][lane][-1][0]
-            except KeyError:
-                # current edge has no vehicles, so move on
-                continue
+    def _multi_lane_headways(self):
+        """Compute multi-lane data for all vehicles.
+
+        This includes the lane leaders/followers/headways/tailways/
+        leader velocity/follower velocity for all
+        vehicles in the network.
+
+        All vehicles are sorted once by their (lane, position) pair, after
+        which the lane leaders and followers of all rl vehicles in all lanes
+        of their edges are computed at once, see
+        flow.core.kernel.scenario.lane_graph.LaneGraph.
+        """
+        scenario = self.master_kernel.scenario
+        lane_graph = scenario.get_lane_graph()
 
-            # stop if a lane follower is found
-            if follower != "":
-                break
+        ids = self.__ids
+        sumo_obs = [self.__sumo_obs.get(veh_id, {}) for veh_id in ids]
+        edges, _, lengths, order = self._get_lane_order()
 
-        return tailway, follower
+        # collect the lanes that should be checked for every rl vehicle,
+        # which consist of all the lanes in the vehicle's current edge
+        index = {veh_id: i for i, veh_id in enumerate(ids)}
+        rl_ids, query_veh, query_lanes, query_own = [], [], [], []
+        for veh_id in self.get_rl_ids():
+            i = index[veh_id]
+            if edges[i]:
+                num_lanes = scenario.num_lanes(edges[i])
+                this_lane = sumo_obs[i].get(tc.VAR_LANE_INDEX, -1001)
+                rl_ids.append((veh_id, num_lanes))
+                query_veh.extend([i] * num_lanes)
+                query_lanes.extend(range(num_lanes))
+                query_own.extend([lane == this_lane
+                                  for lane in range(num_lanes)])
+
+        query_keys = lane_graph.lane_keys(
+            [edges[i] for i in query_veh], query_lanes)
+        leader, headway, follower, tailway = lane_graph.lane_neighbors(
+            order, lengths, query_veh, query_keys, query_own)
+
+        leader = [ids[i] if i >= 0 else "" for i in leader]
+        follower = [ids[i] if i >= 0 else "" for i in follower]
+        headway = headway.tolist()
+        tailway = tailway.tolist()
+
+        # add the above values to the vehicles class
+        start = 0
+        for veh_id, num_lanes in rl_ids:
+            end = start + num_lanes
+            self.set_lane_headways(veh_id, headway[start:end])
+            self.set_lane_tailways(veh_id, tailway[start:end])
+            self.set_lane_leaders(veh_id, leader[start:end])
+            self.set_lane_followers(veh_id, follower[start:end])
+            start = end
 
     def apply_acceleration(self, veh_ids, acc):
-        """See parent class."""
+        """See parent class.
+
+        The commands are sent to sumo together with other buffered commands
+        before the next simulation step.
+        """
+        command_buffer = self.master_kernel.simulation.command_buffer
         for i, vid in enumerate(veh_ids):
-            if acc[i] is not None and vid in self.get_ids():
+            if acc[i] is not None and vid in self.__vehicles:
                 this_vel = self.get_speed(vid)
                 next_vel = max([this_vel + acc[i] * self.sim_step, 0])
-                self.kernel_api.vehicle.slowDown(vid, next_vel, 1)
+                command_buffer.queue('vehicle', 'slowDown', vid, next_vel, 1)
 
     def apply_lane_change(self, veh_ids, direction):
-        """See parent class."""
+        """See parent class.
+
+        The commands are sent to sumo together with other buffered commands
+        before the next simulation step.
+        """
         # if any of the directions are not -1, 0, or 1, raise a ValueError
         if any(d not in [-1, 0, 1] for d in direction):
             raise ValueError(
                 "Direction values for lane changes may only be: -1, 0, or 1.")
 
+        command_buffer = self.master_kernel.simulation.command_buffer
         for i, veh_id in enumerate(veh_ids):
             # check for no lane change
             if direction[i] == 0:
@@ -844,22 +1143,34 @@ class TraCIVehicle(KernelVehicle):
 
             # perform the requested lane action action in TraCI
             if target_lane != this_lane:
-                self.kernel_api.vehicle.changeLane(
-                    veh_id, int(target_lane), 100000)
+                command_buffer.queue(
+                    'vehicle', 'changeLane', veh_id, int(target_lane), 100000)
 
                 if veh_id in self.get_rl_ids():
                     self.prev_last_lc[veh_id] = \
                         self.__vehicles[veh_id]["last_lc"]
 
     def choose_routes(self, veh_ids, route_choices):
-        """See parent class."""
+        """See parent class.
+
+        The commands are sent to sumo together with other buffered commands
+        before the next simulation step.
+        """
+        command_buffer = self.master_kernel.simulation.command_buffer
         for i, veh_id in enumerate(veh_ids):
             if route_choices[i] is not None:
-                self.kernel_api.vehicle.setRoute(
-                    vehID=veh_id, edgeList=route_choices[i])
+                command_buffer.queue(
+                    'vehicle', 'setRoute', veh_id, route_choices[i])
 
     def get_x_by_id(self, veh_id):
         """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            edges = self.get_edge(veh_id)
+            x = self.master_kernel.scenario.get_x(
+                edges, self.get_position(veh_id))
+            # vehicles that crashed or were teleported have no edge
+            x[[i for i, edge in enumerate(edges) if edge == '']] = 0.
+            return x.tolist()
         if self.get_edge(veh_id) == '':
             # occurs when a vehicle crashes is teleported for some other reason
             return 0.
@@ -874,20 +1185,15 @@ class TraCIVehicle(KernelVehicle):
         - white: unobserved human-driven vehicles
         - cyan: observed human-driven vehicles
         """
+        # color rl vehicles red
         for veh_id in self.get_rl_ids():
-            try:
-                # color rl vehicles red
-                self.set_color(veh_id=veh_id, color=RED)
-            except (FatalTraCIError, TraCIException):
-                pass
+            self.set_color(veh_id=veh_id, color=RED)
 
         # color vehicles white if not observed and cyan if observed
+        observed_ids = set(self.get_observed_ids())
         for veh_id in self.get_human_ids():
-            try:
-                color = CYAN if veh_id in self.get_observed_ids() else WHITE
-                self.set_color(veh_id=veh_id, color=color)
-            except (FatalTraCIError, TraCIException):
-                pass
+            color = CYAN if veh_id in observed_ids else WHITE
+            self.set_color(veh_id=veh_id, color=color)
 
         # clear the list of observed vehicles
         for veh_id in self.get_observed_ids():
@@ -896,21 +1202,29 @@ class TraCIVehicle(KernelVehicle):
     def get_color(self, veh_id):
         """See parent class.
 
-        This does not pass the last term (i.e. transparency).
+        This does not pass the last term (i.e. transparency). Any buffered
+        commands are first sent to sumo, so that colors set via `set_color`
+        are accounted for.
         """
+        self.master_kernel.simulation.command_buffer.flush()
         r, g, b, t = self.kernel_api.vehicle.getColor(veh_id)
         return r, g, b
 
     def set_color(self, veh_id, color):
         """See parent class.
 
-        The last term for sumo (transparency) is set to 255.
+        The last term for sumo (transparency) is set to 255. The command is
+        sent to sumo together with other buffered commands before the next
+        simulation step (or the next call to `get_color`), and errors returned
+        by sumo for it are ignored.
         """
         r, g, b = color
-        self.kernel_api.vehicle.setColor(vehID=veh_id, color=(r, g, b, 255))
+        self.master_kernel.simulation.command_buffer.queue(
+            'vehicle', 'setColor', veh_id, (r, g, b, 255), ignore_errors=True)
 
     def add(self, veh_id, type_id, edge, pos, lane, speed):
         """See parent class."""
+        self._pending_types[veh_id] = str(type_id)
         self.kernel_api.vehicle.addFull(
             veh_id,
             'route{}'.format(edge),
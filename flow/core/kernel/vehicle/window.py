@@ -0,0 +1,105 @@
+"""Script containing a bounded, windowed counter of per-step events."""
+
+
+class StepCountWindow(object):
+    """Fixed-capacity record of the number of events at every time step.
+
+    This is used by the vehicle kernels to keep track of the number of
+    vehicles that enter and exit the network at every time step. Instead of
+    storing the count of every step since the last reset, the running total of
+    the counts is stored in a ring buffer covering the last `capacity` steps.
+    The sum of the counts over any window of recent steps is then the
+    difference between two running totals, and is computed in constant time
+    regardless of the size of the window, while the memory used by the counter
+    remains bounded throughout arbitrarily long simulations.
+
+    Only the ids of the vehicles in the most recent step are kept.
+
+    Usage
+    -----
+        >>> window = StepCountWindow(capacity=100)
+        >>> window.append(2, ['human_0', 'human_1'])
+        >>> window.append(1, ['human_2'])
+        >>> window.sum(2)
+        (3, 2)
+        >>> window.last_ids
+        ['human_2']
+
+    Attributes
+    ----------
+    capacity : int
+        maximum number of steps that can be summed over
+    last_count : int
+        count in the most recent step, 0 if no steps were recorded
+    last_ids : list of str
+        ids recorded in the most recent step, empty if no steps were recorded
+    """
+
+    def __init__(self, capacity):
+        """Instantiate the counter.
+
+        Parameters
+        ----------
+        capacity : int
+            maximum number of steps that can be summed over
+
+        Raises
+        ------
+        ValueError
+            if the capacity is not a positive integer
+        """
+        if capacity < 1:
+            raise ValueError('The capacity of the window must be positive, '
+                             'got {}'.format(capacity))
+        self.capacity = int(capacity)
+        self.last_count = 0
+        self.last_ids = []
+        # running total after every step, indexed by step modulo the length of
+        # the buffer. The extra element holds the total before the oldest step
+        # in the window.
+        self._totals = [0] * (self.capacity + 1)
+        self._num_steps = 0
+        self._total = 0
+
+    def __len__(self):
+        """Return the number of steps currently covered by the window."""
+        return min(self._num_steps, self.capacity)
+
+    def append(self, count, ids=None):
+        """Record the count (and optionally the ids) of a new time step."""
+        self._num_steps += 1
+        self._total += count
+        self._totals[self._num_steps % (self.capacity + 1)] = self._total
+        self.last_count = count
+        self.last_ids = ids if ids is not None else []
+
+    def clear(self):
+        """Remove all recorded steps."""
+        self._num_steps = 0
+        self._total = 0
+        self._totals[0] = 0
+        self.last_count = 0
+        self.last_ids = []
+
+    def sum(self, num_steps):
+        """Return the sum of the counts over the most recent steps.
+
+        Parameters
+        ----------
+        num_steps : int
+            number of steps to sum over. If this is not positive, or exceeds
+            the number of steps currently covered by the window, all steps in
+            the window are summed over.
+
+        Returns
+        -------
+        int
+            sum of the counts
+        int
+            number of steps that were summed over
+        """
+        available = len(self)
+        if num_steps <= 0 or num_steps > available:
+            num_steps = available
+        start = (self._num_steps - num_steps) % (self.capacity + 1)
+        return self._total - self._totals[start], num_steps
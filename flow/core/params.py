@@ -19,6 +19,11 @@ SPEED_MODES = {
 
 LC_MODES = {"aggressive": 0, "no_lat_collide": 512, "strategic": 1621}
 
+# vehicle variables subscribed to by default, see SubscriptionProfile
+DEFAULT_VEHICLE_SUBSCRIPTIONS = [
+    "route", "world_position", "angle", "default_speed", "leader"
+]
+
 # Traffic light defaults
 PROGRAM_ID = 1
 MAX_GAP = 3.0
@@ -353,6 +358,57 @@ class VehicleParams:
         return self.__vehicles[veh_id]["initial_speed"]
 
 
+class SubscriptionProfile(object):
+    """Variables the kernel subscribes to in the simulator.
+
+    The values of subscribed variables are sent by the simulator after every
+    simulation step for all objects at once, and are then read by the kernel
+    without any further communication with the simulator. Variables that are
+    not subscribed to are instead requested from the simulator the first time
+    they are accessed in a step, one object at a time. An environment should
+    accordingly subscribe to the variables it reads for most objects every
+    step, and to nothing else.
+
+    Each set of variables is in addition to the variables the kernel always
+    needs, which are the speed, edge, lane and position of vehicles, the
+    state of traffic lights, and the departed, arrived and teleporting
+    vehicles of the simulation.
+
+    Parameters
+    ----------
+    vehicle : list of str, optional
+        variables of every vehicle, any of: "route", "world_position",
+        "angle", "default_speed", "leader", "acceleration", "waiting_time",
+        "co2_emission", "fuel_consumption", and "distance". If "leader" is
+        not subscribed to, the leaders of vehicles are computed by Flow (see
+        the "flow_leaders" attribute of SumoParams). Defaults to
+        DEFAULT_VEHICLE_SUBSCRIPTIONS
+    traffic_light : list of str, optional
+        variables of every traffic light, any of: "phase", "program", and
+        "next_switch". Defaults to none
+    edge : list of str, optional
+        variables of every (non-internal) edge, any of: "mean_speed",
+        "vehicle_number", "halting_number", "occupancy", "waiting_time", and
+        "travel_time". Defaults to none
+    simulation : list of str, optional
+        variables of the simulation, any of: "colliding_ids" and
+        "min_expected_number". Defaults to none
+    """
+
+    def __init__(self,
+                 vehicle=None,
+                 traffic_light=None,
+                 edge=None,
+                 simulation=None):
+        """Instantiate SubscriptionProfile."""
+        if vehicle is None:
+            vehicle = DEFAULT_VEHICLE_SUBSCRIPTIONS
+        self.vehicle = list(vehicle)
+        self.traffic_light = list(traffic_light or [])
+        self.edge = list(edge or [])
+        self.simulation = list(simulation or [])
+
+
 class SimParams(object):
     """Simulation-specific parameters.
 
@@ -388,6 +444,15 @@ class SimParams(object):
         specifies whether to render the radius of RL observation
     pxpm : int, optional
         specifies rendering resolution (pixel / meter)
+    max_flow_window : float, optional
+        largest time span (in seconds) over which the inflow and outflow rates
+        of vehicles can be computed. Only the number of vehicles that entered
+        and exited the network during this time span is stored. Defaults to
+        10000
+    subscriptions : flow.core.params.SubscriptionProfile, optional
+        variables the kernel subscribes to in the simulator. If not
+        specified, the profile of the environment is used, or else the
+        default profile (see SubscriptionProfile)
     """
 
     def __init__(self,
@@ -398,7 +463,9 @@ class SimParams(object):
                  save_render=False,
                  sight_radius=25,
                  show_radius=False,
-                 pxpm=2):
+                 pxpm=2,
+                 max_flow_window=10000,
+                 subscriptions=None):
         """Instantiate SimParams."""
         self.sim_step = sim_step
         self.render = render
@@ -408,6 +475,8 @@ class SimParams(object):
         self.sight_radius = sight_radius
         self.pxpm = pxpm
         self.show_radius = show_radius
+        self.max_flow_window = max_flow_window
+        self.subscriptions = subscriptions
 
 
 class AimsunParams(SimParams):
@@ -445,6 +514,15 @@ class AimsunParams(SimParams):
         specifies whether to render the radius of RL observation
     pxpm : int, optional
         specifies rendering resolution (pixel / meter)
+    max_flow_window : float, optional
+        largest time span (in seconds) over which the inflow and outflow rates
+        of vehicles can be computed. Only the number of vehicles that entered
+        and exited the network during this time span is stored. Defaults to
+        10000
+    subscriptions : flow.core.params.SubscriptionProfile, optional
+        variables the kernel subscribes to in the simulator. If not
+        specified, the profile of the environment is used, or else the
+        default profile (see SubscriptionProfile)
     """
     def __init__(self,
                  sim_step=0.1,
@@ -454,11 +532,13 @@ class AimsunParams(SimParams):
                  save_render=False,
                  sight_radius=25,
                  show_radius=False,
-                 pxpm=2):
+                 pxpm=2,
+                 max_flow_window=10000,
+                 subscriptions=None):
         """Instantiate AimsunParams."""
         super(AimsunParams, self).__init__(
             sim_step, render, restart_instance, emission_path, save_render,
-            sight_radius, show_radius, pxpm)
+            sight_radius, show_radius, pxpm, max_flow_window, subscriptions)
 
 
 class SumoParams(SimParams):
@@ -522,6 +602,82 @@ class SumoParams(SimParams):
         they teleport after teleport_time seconds
     num_clients : int, optional
         Number of clients that will connect to Traci
+    columnar_state : bool, optional
+        specifies whether the vehicle kernel should additionally store the
+        states of all vehicles in NumPy arrays that are filled once per
+        simulation step. If set to True, the state getters return NumPy
+        arrays (instead of lists) when they are called with a list of
+        vehicle ids, and are considerably faster for large numbers of
+        vehicles. Defaults to False
+    flow_leaders : bool, optional
+        specifies whether the leaders, followers, and headways of vehicles
+        should be computed by Flow from the vehicles sorted by lane and
+        position, instead of being subscribed from sumo. This avoids the
+        search for the leader of every vehicle that sumo performs every
+        simulation step. Unlike sumo, Flow does not follow the routes of
+        vehicles: where a lane continues into several lanes, only the first
+        of them is searched (see flow.core.kernel.scenario.lane_graph), so
+        that the leaders of vehicles approaching a diverging junction may
+        differ from the ones of sumo. Defaults to False
+    max_flow_window : float, optional
+        largest time span (in seconds) over which the inflow and outflow rates
+        of vehicles can be computed. Only the number of vehicles that entered
+        and exited the network during this time span is stored. Defaults to
+        10000
+    subscriptions : flow.core.params.SubscriptionProfile, optional
+        variables the kernel subscribes to in the simulator. If not
+        specified, the profile of the environment is used, or else the
+        default profile (see SubscriptionProfile)
+    net_cache_dir : str, optional
+        directory of the cache of networks generated by netconvert, which is
+        shared by all scenarios and processes using the same directory, and
+        must only be writable by the current user. Defaults to
+        flow.config.NET_CACHE_DIR
+    net_cache_size : float, optional
+        maximum size of the network cache (in MB), beyond which the least
+        recently used networks are removed. If set to 0, networks are not
+        cached. Defaults to 0
+    sumo_pool_size : int, optional
+        number of sumo instances that are launched in advance with the same
+        configuration, and are waiting to replace the current instance when
+        the simulation is restarted (e.g. when restart_instance is set to
+        True). A replacement is launched in the background every time one of
+        these instances is used. Instances are not pooled if sumo-gui is used
+        or emissions are recorded. Defaults to 0 (no pool)
+    use_libsumo : bool, optional
+        whether to run sumo within the python process through libsumo, in
+        which case the kernel calls sumo functions directly instead of
+        sending TraCI messages through a socket. Only a single simulation can
+        use libsumo per process; the simulation falls back to TraCI if
+        libsumo is not installed, is already in use, or if sumo-gui or
+        several clients are requested. Defaults to False
+    snapshot_reset : bool, optional
+        whether to reset the environment by loading the state of sumo (and of
+        the kernel) saved at the end of the first reset, instead of removing
+        and re-adding every vehicle. The saved state also replaces the restart
+        of sumo when restart_instance is set to True. This is not used if the
+        initial positions of the vehicles are shuffled. Defaults to False
+    snapshot_warmup : bool, optional
+        whether to also save the state at the end of the warm-up steps, and
+        load it instead of performing the warm-up steps in later resets. This
+        requires snapshot_reset, and should only be used if the warm-up steps
+        are deterministic and the environment does not store any information
+        collected during the warm-up. Defaults to False
+    warmup_cache : bool, optional
+        whether to store the state of sumo and of the kernel at the end of the
+        warm-up steps in a cache on disk, which is shared by all environments
+        with the same configuration (scenario, vehicles, initial config, and
+        environment and simulation parameters), including environments in
+        other processes. Resets then load a cached state instead of
+        performing the warm-up steps, under the same conditions as
+        snapshot_warmup. Defaults to False
+    warmup_cache_dir : str, optional
+        directory of the warm-up cache, which must only be writable by the
+        current user. Defaults to flow.config.WARMUP_CACHE_DIR
+    warmup_pool_size : int, optional
+        number of different warm states cached per configuration. Every reset
+        starts from one of them at random, and resets performing the warm-up
+        steps fill the pool until it is full. Defaults to 1
     """
 
     def __init__(self,
@@ -541,11 +697,24 @@ class SumoParams(SimParams):
                  print_warnings=True,
                  teleport_time=-1,
                  num_clients=1,
-                 sumo_binary=None):
+                 sumo_binary=None,
+                 columnar_state=False,
+                 flow_leaders=False,
+                 max_flow_window=10000,
+                 subscriptions=None,
+                 net_cache_dir=None,
+                 net_cache_size=0,
+                 sumo_pool_size=0,
+                 use_libsumo=False,
+                 snapshot_reset=False,
+                 snapshot_warmup=False,
+                 warmup_cache=False,
+                 warmup_cache_dir=None,
+                 warmup_pool_size=1):
         """Instantiate SumoParams."""
         super(SumoParams, self).__init__(
             sim_step, render, restart_instance, emission_path, save_render,
-            sight_radius, show_radius, pxpm)
+            sight_radius, show_radius, pxpm, max_flow_window, subscriptions)
         self.port = port
         self.lateral_resolution = lateral_resolution
         self.no_step_log = no_step_log
@@ -554,6 +723,17 @@ class SumoParams(SimParams):
         self.print_warnings = print_warnings
         self.teleport_time = teleport_time
         self.num_clients = num_clients
+        self.columnar_state = columnar_state
+        self.flow_leaders = flow_leaders
+        self.net_cache_dir = net_cache_dir
+        self.net_cache_size = net_cache_size
+        self.sumo_pool_size = sumo_pool_size
+        self.use_libsumo = use_libsumo
+        self.snapshot_reset = snapshot_reset
+        self.snapshot_warmup = snapshot_warmup
+        self.warmup_cache = warmup_cache
+        self.warmup_cache_dir = warmup_cache_dir
+        self.warmup_pool_size = warmup_pool_size
 
 
 class EnvParams:
@@ -583,6 +763,23 @@ class EnvParams:
         flag indicating that the evaluation reward should be used
         so the evaluation reward should be used rather than the
         normal reward
+    batch_substeps : bool, optional
+        whether to advance sumo by all the simulation steps of a rollout step
+        at once, in which case the controllers, rl actions, and additional
+        commands are applied only once per rollout step, and the kernel is
+        only updated after the last simulation step. The vehicles that entered
+        or exited the network and the collisions during the skipped steps are
+        still accounted for. This is only used with sumo, and if the
+        controllers of all vehicle types allow it (see the batch_substeps
+        attribute of the controller classes, which is set for the sumo
+        controllers). Defaults to False
+    profile : bool, optional
+        whether to time the phases of the steps and resets of the environment
+        (e.g. the controllers, the simulation steps, the kernel updates, and
+        the computation of the observations and rewards), see
+        flow.core.profiler.StepProfiler. The statistics of the phases are
+        added to the info dict of the last step of every rollout, and logged
+        when the environment is terminated. Defaults to False
     """
 
     def __init__(self,
@@ -590,7 +787,9 @@ class EnvParams:
                  horizon=float('inf'),
                  warmup_steps=0,
                  sims_per_step=1,
-                 evaluate=False):
+                 evaluate=False,
+                 batch_substeps=False,
+                 profile=False):
         """Instantiate EnvParams."""
         self.additional_params = \
             additional_params if additional_params is not None else {}
@@ -598,6 +797,8 @@ class EnvParams:
         self.warmup_steps = warmup_steps
         self.sims_per_step = sims_per_step
         self.evaluate = evaluate
+        self.batch_substeps = batch_substeps
+        self.profile = profile
 
     def get_additional_param(self, key):
         """Return a variable from additional_params."""
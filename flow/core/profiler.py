@@ -0,0 +1,187 @@
+"""Script containing a profiler of the phases of environment steps."""
+
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _NoPhase(object):
+    """Context doing nothing, used when profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+# shared context returned by `profile_phase` when profiling is disabled
+NO_PHASE = _NoPhase()
+
+
+def profile_phase(profiler, name):
+    """Return a context timing a phase of a step.
+
+    Parameters
+    ----------
+    profiler : StepProfiler or None
+        the profiler the duration of the phase is recorded by. If None, the
+        phase is not timed.
+    name : str
+        name of the phase
+
+    Returns
+    -------
+    context
+        the context within which the phase is performed
+    """
+    if profiler is None:
+        return NO_PHASE
+    return _Phase(profiler, name)
+
+
+class _Phase(object):
+    """Context recording the duration of a phase to a profiler."""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start)
+        return False
+
+
+class StepProfiler(object):
+    """Profiler of the duration of the phases of environment steps.
+
+    The duration of every phase (e.g. computing the actions of the
+    controllers, advancing the simulator, or computing the reward) is
+    recorded every time it is performed. The most recent durations of every
+    phase are kept to report their percentiles (see `summary`), and the
+    most recent phases are kept as a trace that can be exported to the
+    Chrome trace event format (see `export_trace`), which can be visualized
+    as a flame chart, e.g. with chrome://tracing or speedscope.
+
+    Usage
+    -----
+        >>> profiler = StepProfiler()
+        >>> with profile_phase(profiler, "compute_reward"):
+        >>>     reward = env.compute_reward(rl_actions)
+        >>> print(profiler.report())
+        >>> profiler.export_trace("trace.json")
+
+    Attributes
+    ----------
+    window : int
+        number of recent durations of every phase the percentiles are
+        computed from
+    trace_length : int
+        number of recent phases kept in the trace
+    """
+
+    def __init__(self, window=1000, trace_length=100000):
+        """Instantiate the profiler.
+
+        Parameters
+        ----------
+        window : int, optional
+            number of recent durations of every phase the percentiles are
+            computed from
+        trace_length : int, optional
+            number of recent phases kept in the trace
+        """
+        self.window = window
+        self.trace_length = trace_length
+        # time the profiler was created at, which is the origin of the trace
+        self._origin = time.perf_counter()
+        # Key = name of the phase
+        # Element = recent durations of the phase, in seconds
+        self._durations = collections.OrderedDict()
+        # Key = name of the phase
+        # Element = number of times the phase was performed
+        self._counts = collections.Counter()
+        # recent phases, as (name, start, duration, thread id) tuples
+        self._trace = collections.deque(maxlen=trace_length)
+
+    def record(self, name, start):
+        """Record a phase that ends now.
+
+        Parameters
+        ----------
+        name : str
+            name of the phase
+        start : float
+            time the phase started at, as returned by time.perf_counter
+        """
+        duration = time.perf_counter() - start
+        durations = self._durations.get(name)
+        if durations is None:
+            durations = collections.deque(maxlen=self.window)
+            self._durations[name] = durations
+        durations.append(duration)
+        self._counts[name] += 1
+        self._trace.append((name, start, duration, threading.get_ident()))
+
+    def summary(self):
+        """Return statistics of the duration of every phase.
+
+        Returns
+        -------
+        dict < str, dict >
+            for every phase, the number of times it was performed ("count"),
+            and the median ("p50") and 99th percentile ("p99") of its recent
+            durations, in milliseconds
+        """
+        summary = collections.OrderedDict()
+        for name, durations in self._durations.items():
+            p50, p99 = np.percentile(durations, [50, 99]) * 1000
+            summary[name] = {"count": self._counts[name],
+                             "p50": float(p50),
+                             "p99": float(p99)}
+        return summary
+
+    def report(self):
+        """Return a table of the statistics of every phase, see `summary`."""
+        lines = ["{:<24}{:>10}{:>12}{:>12}".format(
+            "phase", "count", "p50 (ms)", "p99 (ms)")]
+        for name, stats in self.summary().items():
+            lines.append("{:<24}{:>10}{:>12.3f}{:>12.3f}".format(
+                name, stats["count"], stats["p50"], stats["p99"]))
+        return "\n".join(lines)
+
+    def export_trace(self, path):
+        """Export the recent phases to a file in the Chrome trace format.
+
+        Parameters
+        ----------
+        path : str
+            path of the JSON file
+        """
+        pid = os.getpid()
+        events = [{"name": name,
+                   "ph": "X",
+                   "ts": (start - self._origin) * 1e6,
+                   "dur": duration * 1e6,
+                   "pid": pid,
+                   "tid": tid}
+                  for name, start, duration, tid in self._trace]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def clear(self):
+        """Forget all recorded phases."""
+        self._durations.clear()
+        self._counts.clear()
+        self._trace.clear()
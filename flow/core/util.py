@@ -4,6 +4,7 @@ A collection of utility functions for Flow.
 import csv
 import errno
 import os
+import stat
 from lxml import etree
 from xml.etree import ElementTree
 
@@ -33,6 +34,41 @@ def ensure_dir(path):
     return path
 
 
+def ensure_private_dir(path):
+    """Ensure that a directory only writable by the current user exists.
+
+    The directory is created (with access restricted to the current user) if
+    it does not exist. This is used for directories from which files are
+    unpickled, which would otherwise allow other users to run code in the
+    current process.
+
+    Parameters
+    ----------
+    path : str
+        path of the directory
+
+    Returns
+    -------
+    str
+        path of the directory
+
+    Raises
+    ------
+    PermissionError
+        if the directory is owned by another user, or is writable by the
+        group or other users
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid():
+        raise PermissionError(
+            "Directory {} is owned by another user".format(path))
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(
+            "Directory {} is writable by other users".format(path))
+    return path
+
+
 def emission_to_csv(emission_path, output_path=None):
     """Convert an emission file generated by sumo into a csv file.
 
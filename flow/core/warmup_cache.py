@@ -0,0 +1,196 @@
+"""Script containing a cache of the states of environments after warm-up."""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from flow.core.util import ensure_private_dir
+
+# version of the format of the cache entries, included in every key so that
+# entries written by previous versions of Flow are never read
+CACHE_VERSION = 1
+
+# file extension of the cache entries
+ENTRY_EXTENSION = '.warm.pkl'
+
+
+def _encode(obj):
+    """Return a JSON-serializable description of an object, see key."""
+    if hasattr(obj, "__qualname__"):
+        # classes and functions
+        return "{}.{}".format(getattr(obj, "__module__", ""), obj.__qualname__)
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return str(obj)
+
+
+class WarmupCache(object):
+    """Cache of the states of environments at the end of their warm-up steps.
+
+    Every entry contains the state of sumo (as saved by TraCI's saveState)
+    and of the Flow kernel at the end of the warm-up steps of a reset (see
+    flow.core.kernel.Kernel.save_state), together with the time counter of the
+    environment. Entries are stored under a key describing the configuration
+    of the environment (see `key`), and in one of several slots per key, so
+    that a pool of different warm states may be kept for every configuration.
+
+    The cache is safe to share between concurrent processes (e.g. the workers
+    of a training algorithm): entries are first written to a temporary file
+    which is then atomically renamed, so that other processes only ever read
+    complete entries.
+
+    The entries are unpickled when they are read, so the directory of the
+    cache must only be writable by the current user (see
+    flow.core.util.ensure_private_dir).
+
+    Usage
+    -----
+        >>> cache = WarmupCache('~/.cache/flow/warmup')
+        >>> key = cache.key(scenario_params, env_params)
+        >>> cache.put(key, 0, kernel_state, time_counter)
+        >>> kernel_state, time_counter = cache.get(key, 0)
+        >>> cache.close()
+
+    Attributes
+    ----------
+    directory : str
+        directory the entries are stored in
+    """
+
+    def __init__(self, directory):
+        """Instantiate the cache.
+
+        Parameters
+        ----------
+        directory : str
+            directory the entries are stored in, created if needed
+
+        Raises
+        ------
+        PermissionError
+            if the directory is owned by another user, or is writable by the
+            group or other users
+        """
+        self.directory = ensure_private_dir(directory)
+        # directory of the sumo states of the entries read by this process,
+        # which are loaded by sumo from there
+        self._local_dir = None
+
+    @staticmethod
+    def key(*inputs):
+        """Return the key of the configuration of an environment.
+
+        Parameters
+        ----------
+        inputs : list
+            parameters of the environment. Classes and functions are described
+            by their name, and other objects by their attributes.
+
+        Returns
+        -------
+        str
+            hexadecimal digest of the inputs
+        """
+        # the key also depends on the sumo binary, so that states are
+        # generated again once sumo is updated
+        binary = shutil.which('sumo')
+        try:
+            binary = (binary, os.path.getmtime(binary))
+        except (TypeError, OSError):
+            pass
+
+        content = json.dumps([CACHE_VERSION, binary, inputs],
+                             sort_keys=True, default=_encode)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key, slot):
+        """Return the state stored in a slot of a key.
+
+        Returns
+        -------
+        dict
+            the state of the kernel, see flow.core.kernel.Kernel.save_state.
+            The sumo state is read from a file that remains available until
+            the cache is closed.
+        int
+            time counter of the environment
+
+        or None if no state is stored in the slot
+        """
+        path = self._path(key, slot)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if self._local_dir is None:
+            self._local_dir = tempfile.mkdtemp(prefix="flow_warmup_")
+        state_path = os.path.join(
+            self._local_dir, "{}-{}.xml".format(key, slot))
+        with open(state_path, 'wb') as f:
+            f.write(entry['sumo_state'])
+
+        kernel_state = entry['kernel_state']
+        kernel_state['simulation'] = \
+            (state_path,) + tuple(kernel_state['simulation'][1:])
+
+        return kernel_state, entry['time_counter']
+
+    def put(self, key, slot, kernel_state, time_counter):
+        """Store a state in a slot of a key.
+
+        Parameters
+        ----------
+        key : str
+            key of the configuration of the environment, see `key`
+        slot : int
+            index of the state in the pool of states of the key
+        kernel_state : dict
+            the state of the kernel, see flow.core.kernel.Kernel.save_state
+        time_counter : int
+            time counter of the environment
+        """
+        with open(kernel_state['simulation'][0], 'rb') as f:
+            sumo_state = f.read()
+        kernel_state = dict(kernel_state)
+        kernel_state['simulation'] = \
+            (None,) + tuple(kernel_state['simulation'][1:])
+
+        entry = {'sumo_state': sumo_state,
+                 'kernel_state': kernel_state,
+                 'time_counter': time_counter}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key, slot))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_EXTENSION):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def close(self):
+        """Remove the sumo states read by this process."""
+        if self._local_dir is not None:
+            shutil.rmtree(self._local_dir, ignore_errors=True)
+            self._local_dir = None
+
+    def _path(self, key, slot):
+        """Return the path of the file of an entry."""
+        return os.path.join(
+            self.directory, "{}-{}{}".format(key, slot, ENTRY_EXTENSION))
@@ -1,10 +1,13 @@
 """Base environment class. This is the parent of all other environments."""
 
 from copy import deepcopy
+import asyncio
 import os
 import atexit
 import time
 import traceback
+import logging
+import warnings
 import numpy as np
 import random
 from flow.renderer.pyglet_renderer import PygletRenderer as Renderer
@@ -25,7 +28,19 @@ except ImportError:
 
 from flow.core.util import ensure_dir
 from flow.core.kernel import Kernel
+from flow.core.checkpoint import CheckpointStore
+from flow.core.warmup_cache import WarmupCache
+from flow.core.profiler import StepProfiler, profile_phase
 from flow.utils.exceptions import FatalFlowError
+import flow.config as config
+
+# simulation parameters that the states in the warm-up cache depend on, in
+# addition to the scenario and environment parameters
+WARMUP_CACHE_SIM_PARAMS = [
+    "sim_step", "seed", "lateral_resolution", "overtake_right",
+    "teleport_time", "columnar_state", "flow_leaders", "max_flow_window",
+    "subscriptions"
+]
 
 # pick out the correct class definition
 if serializable_flag:
@@ -64,9 +79,18 @@ class Env(*classdef):
     scenario : flow.scenarios.Scenario
         see flow/scenarios/base_scenario.py
     simulator : str
-        the simulator used, one of {'traci', 'aimsun'}. Defaults to 'traci'
+        the simulator used, one of {'traci', 'libsumo', 'aimsun'}. 'libsumo'
+        is equivalent to 'traci' with SumoParams.use_libsumo set to True.
+        Defaults to 'traci'
+    subscriptions : flow.core.params.SubscriptionProfile or None
+        variables the kernel subscribes to in the simulator, unless others are
+        specified in the simulation parameters. Child classes may overload
+        this to subscribe to the variables they read every step. If None, the
+        default profile is used.
     """
 
+    subscriptions = None
+
     def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         """Initialize the environment class.
 
@@ -79,7 +103,8 @@ class Env(*classdef):
         scenario : flow.scenarios.Scenario
             see flow/scenarios/base_scenario.py
         simulator : str
-            the simulator used, one of {'traci', 'aimsun'}. Defaults to 'traci'
+            the simulator used, one of {'traci', 'libsumo', 'aimsun'}.
+            Defaults to 'traci'
 
         Raises
         ------
@@ -103,6 +128,25 @@ class Env(*classdef):
         self.time_counter = 0
         # step_counter: number of total steps taken
         self.step_counter = 0
+        # states of the simulation saved at the end of the initialization and
+        # of the warm-up steps of a reset, as (kernel state, time_counter)
+        # tuples, see SumoParams.snapshot_reset
+        self._reset_snapshots = {}
+        # checkpoints saved with `checkpoint`
+        self._checkpoints = CheckpointStore()
+        # whether all the simulation steps of a rollout step can be advanced
+        # at once, computed when first needed, see `_substep_batch_size`
+        self._substeps_batchable = None
+        # actions of the step started by `step_async`, whether the simulator
+        # is computing its last simulation step(s), and whether a collision
+        # occurred in the previous ones
+        self._step_actions = None
+        self._step_pending = False
+        self._step_crash = False
+        # profiler of the phases of the steps and resets, see
+        # EnvParams.profile
+        self.profiler = StepProfiler() \
+            if getattr(env_params, "profile", False) else None
         # initial_state:
         #   Key = Vehicle ID,
         #   Entry = (type_id, route_id, lane_index, lane_pos, speed, pos)
@@ -113,12 +157,24 @@ class Env(*classdef):
         # simulation step size
         self.sim_step = sim_params.sim_step
 
+        # libsumo is run with the sumo kernel, see SumoParams.use_libsumo
+        if simulator == 'libsumo':
+            self.sim_params.use_libsumo = True
+            simulator = 'traci'
+
         # the simulator used by this environment
         self.simulator = simulator
 
+        # the variables subscribed to by the kernel may be requested by the
+        # environment if they are not set in the simulation parameters
+        subscriptions = getattr(self.sim_params, "subscriptions", None) \
+            or self.subscriptions
+
         # create the Flow kernel
         self.k = Kernel(simulator=self.simulator,
-                        sim_params=sim_params)
+                        sim_params=sim_params,
+                        subscriptions=subscriptions)
+        self.k.profiler = self.profiler
 
         # use the scenario class's network parameters to generate the necessary
         # scenario components within the scenario kernel
@@ -154,6 +210,24 @@ class Env(*classdef):
 
         self.setup_initial_state()
 
+        # cache of the states at the end of the warm-up steps, shared with
+        # other environments with the same configuration, and the states of
+        # the cache used by this environment, see SumoParams.warmup_cache
+        self._warmup_cache = None
+        self._warm_states = {}
+        if self._warmup_cache_enabled():
+            self._warmup_cache = WarmupCache(
+                self.sim_params.warmup_cache_dir or config.WARMUP_CACHE_DIR)
+            self._warmup_key = WarmupCache.key(
+                type(self.scenario), self.scenario.net_params,
+                self.scenario.vehicles, self.scenario.initial_config,
+                self.scenario.traffic_lights, type(self), self.env_params,
+                dict({name: getattr(self.sim_params, name, None)
+                      for name in WARMUP_CACHE_SIM_PARAMS},
+                     subscriptions=self.k.subscriptions))
+            # slot of the pool of states used by the current rollout
+            self._warmup_slot = 0
+
         # use pyglet to render the simulation
         if self.sim_params.render in ['gray', 'dgray', 'rgb', 'drgb']:
             save_render = self.sim_params.save_render
@@ -205,8 +279,13 @@ class Env(*classdef):
         """
         self.k.close()
 
+        # the saved states are only valid for the closed simulation
+        self._reset_snapshots = {}
+        self._checkpoints.clear()
+
         # killed the sumo process if using sumo/TraCI
-        if self.simulator == 'traci':
+        if self.simulator == 'traci' and \
+                self.k.simulation.sumo_proc is not None:
             self.k.simulation.sumo_proc.kill()
 
         if render is not None:
@@ -280,11 +359,95 @@ class Env(*classdef):
         info : dict
             contains other diagnostic information from the previous action
         """
-        for _ in range(self.env_params.sims_per_step):
-            self.time_counter += 1
-            self.step_counter += 1
+        with profile_phase(self.profiler, "step"):
+            self.step_async(rl_actions)
+            return self.step_wait()
+
+    def step_async(self, rl_actions):
+        """Start advancing the environment by one step.
+
+        The actions are applied as in `step`, but the simulator is only
+        requested to compute the last simulation step(s) of the environment
+        step, without waiting for it to finish. The step is completed by
+        `step_wait`, and the caller may perform other work (e.g. compute the
+        actions of another environment) while the simulator computes it. No
+        other method of the environment may be called in between.
+
+        Parameters
+        ----------
+        rl_actions : array_like
+            an list of actions provided by the rl algorithm
+        """
+        self._step_actions = rl_actions
+        self._step_crash = False
+
+        # number of simulation steps advanced at once
+        batch = self._substep_batch_size()
+        num_batches = self.env_params.sims_per_step // batch
+        for i in range(num_batches):
+            self.time_counter += batch
+            self.step_counter += batch
+
+            self._apply_substep_actions(rl_actions)
+
+            if i == num_batches - 1:
+                # the last simulation step(s) are completed by step_wait
+                with profile_phase(self.profiler, "simulation_step"):
+                    self.k.simulation.simulation_step_async(batch)
+                self._step_pending = True
+                break
+
+            # advance the simulation in the simulator by one step (or by all
+            # the simulation steps of the batch)
+            with profile_phase(self.profiler, "simulation_step"):
+                self.k.simulation.simulation_step(batch)
+
+            # stop collecting new simulation steps if there is a collision
+            self._step_crash = self._complete_substep()
+            if self._step_crash:
+                break
+
+    def step_wait(self):
+        """Wait for the step started by `step_async` to finish.
+
+        Returns
+        -------
+        tuple
+            the observation, reward, done and info of the step, see `step`
+        """
+        if self._step_pending:
+            with profile_phase(self.profiler, "simulation_wait"):
+                self.k.simulation.simulation_step_wait()
+            self._step_pending = False
+            self._step_crash = self._complete_substep()
+
+        return self._step_results(self._step_actions, self._step_crash)
+
+    async def astep(self, rl_actions):
+        """Advance the environment by one step within an asyncio event loop.
+
+        Other tasks of the event loop keep running while the simulator
+        computes the step.
+
+        Parameters
+        ----------
+        rl_actions : array_like
+            an list of actions provided by the rl algorithm
 
-            # perform acceleration actions for controlled human-driven vehicles
+        Returns
+        -------
+        tuple
+            the observation, reward, done and info of the step, see `step`
+        """
+        self.step_async(rl_actions)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.step_wait)
+
+    def _apply_substep_actions(self, rl_actions):
+        """Apply the actions of all agents before a simulation step."""
+        with profile_phase(self.profiler, "controllers"):
+            # perform acceleration actions for controlled human-driven
+            # vehicles
             if len(self.k.vehicle.get_controlled_ids()) > 0:
                 accel = []
                 for veh_id in self.k.vehicle.get_controlled_ids():
@@ -294,7 +457,8 @@ class Env(*classdef):
                 self.k.vehicle.apply_acceleration(
                     self.k.vehicle.get_controlled_ids(), accel)
 
-            # perform lane change actions for controlled human-driven vehicles
+            # perform lane change actions for controlled human-driven
+            # vehicles
             if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
                 direction = []
                 for veh_id in self.k.vehicle.get_controlled_lc_ids():
@@ -305,45 +469,66 @@ class Env(*classdef):
                     self.k.vehicle.get_controlled_lc_ids(),
                     direction=direction)
 
+        with profile_phase(self.profiler, "routing"):
             # perform (optionally) routing actions for all vehicles in the
             # network, including RL and SUMO-controlled vehicles
             routing_ids = []
             routing_actions = []
-            for veh_id in self.k.vehicle.get_ids():
-                if self.k.vehicle.get_routing_controller(veh_id) \
-                        is not None:
-                    routing_ids.append(veh_id)
-                    route_contr = self.k.vehicle.get_routing_controller(
-                        veh_id)
-                    routing_actions.append(route_contr.choose_route(self))
+            for router_type, routers in self._routers_by_type().items():
+                routing_ids.extend(router.veh_id for router in routers)
+                routing_actions.extend(
+                    router_type.choose_routes(routers, self))
 
             self.k.vehicle.choose_routes(routing_ids, routing_actions)
 
+        with profile_phase(self.profiler, "rl_actions"):
             self.apply_rl_actions(rl_actions)
 
             self.additional_command()
 
-            # advance the simulation in the simulator by one step
-            self.k.simulation.simulation_step()
+    def _complete_substep(self):
+        """Process the results of a simulation step.
 
-            # store new observations in the vehicles and traffic lights class
+        Returns
+        -------
+        bool
+            whether the simulator experienced a collision
+        """
+        # store new observations in the vehicles and traffic lights class
+        with profile_phase(self.profiler, "kernel_update"):
             self.k.update(reset=False)
 
+        # crash encodes whether the simulator experienced a collision
+        crash = self.k.simulation.check_collision()
+
+        with profile_phase(self.profiler, "render"):
             # update the colors of vehicles
             if self.sim_params.render:
                 self.k.vehicle.update_vehicle_colors()
 
-            # crash encodes whether the simulator experienced a collision
-            crash = self.k.simulation.check_collision()
+            # render a frame
+            if not crash:
+                self.render()
 
-            # stop collecting new simulation steps if there is a collision
-            if crash:
-                break
+        return crash
 
-            # render a frame
-            self.render()
+    def _step_results(self, rl_actions, crash):
+        """Return the observation, reward, done and info of a step.
 
-        states = self.get_state()
+        Parameters
+        ----------
+        rl_actions : array_like
+            an list of actions provided by the rl algorithm
+        crash : bool
+            whether the simulator experienced a collision during the step
+
+        Returns
+        -------
+        tuple
+            the observation, reward, done and info of the step, see `step`
+        """
+        with profile_phase(self.profiler, "get_state"):
+            states = self.get_state()
 
         # collect information of the state of the network based on the
         # environment class used
@@ -359,10 +544,13 @@ class Env(*classdef):
 
         # compute the info for each agent
         infos = {}
+        if done and self.profiler is not None:
+            infos["profile"] = self.profiler.summary()
 
         # compute the reward
-        rl_clipped = self.clip_actions(rl_actions)
-        reward = self.compute_reward(rl_clipped, fail=crash)
+        with profile_phase(self.profiler, "compute_reward"):
+            rl_clipped = self.clip_actions(rl_actions)
+            reward = self.compute_reward(rl_clipped, fail=crash)
 
         return next_observation, reward, done, infos
 
@@ -382,12 +570,17 @@ class Env(*classdef):
             the initial observation of the space. The initial reward is assumed
             to be zero.
         """
+        # time the reset started at, see EnvParams.profile
+        reset_start = time.perf_counter()
+
         # reset the time counter
         self.time_counter = 0
 
-        # warn about not using restart_instance when using inflows
+        # warn about not using restart_instance when using inflows (loading a
+        # saved state also removes the vehicles that entered the network)
         if len(self.scenario.net_params.inflows.get()) > 0 and \
-                not self.sim_params.restart_instance:
+                not self.sim_params.restart_instance and \
+                not self._snapshot_reset_enabled():
             print(
                 "**********************************************************\n"
                 "**********************************************************\n"
@@ -400,8 +593,16 @@ class Env(*classdef):
                 "**********************************************************"
             )
 
-        if self.sim_params.restart_instance or \
+        # the state saved by a previous reset or the warm-up cache (if any),
+        # which replaces the restart of the simulation and the reintroduction
+        # of the vehicles
+        if self._warmup_cache is not None:
+            self._select_warm_state()
+        snapshot_name = self._reset_snapshot_name()
+
+        if (self.sim_params.restart_instance and snapshot_name is None) or \
                 (self.step_counter > 2e6 and self.simulator != 'aimsun'):
+            snapshot_name = None
             self.step_counter = 0
             # issue a random seed to induce randomness into the next rollout
             self.sim_params.seed = random.randint(0, 1e5)
@@ -409,64 +610,77 @@ class Env(*classdef):
             self.k.vehicle = deepcopy(self.initial_vehicles)
             self.k.vehicle.master_kernel = self.k
             # restart the sumo instance
-            self.restart_simulation(self.sim_params)
+            with profile_phase(self.profiler, "restart_simulation"):
+                self.restart_simulation(self.sim_params)
 
         # perform shuffling (if requested)
         elif self.scenario.initial_config.shuffle:
             self.setup_initial_state()
 
-        # clear all vehicles from the network and the vehicles class
-        if self.simulator == 'traci':
-            for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
+        if snapshot_name is not None:
+            # restore the simulation and the kernel to the saved state
+            kernel_state, self.time_counter = \
+                self._reset_snapshots[snapshot_name]
+            with profile_phase(self.profiler, "load_state"):
+                self.k.load_state(kernel_state)
+            self.step_counter += self.time_counter
+        else:
+            # clear all vehicles from the network and the vehicles class
+            if self.simulator == 'traci':
+                # FIXME: hack
+                for veh_id in self.k.kernel_api.vehicle.getIDList():
+                    try:
+                        self.k.vehicle.remove(veh_id)
+                    except (FatalTraCIError, TraCIException):
+                        pass
+
+            # clear all vehicles from the network and the vehicles class
+            # FIXME (ev, ak) this is weird and shouldn't be necessary
+            for veh_id in list(self.k.vehicle.get_ids()):
+                # do not try to remove the vehicles from the network in the
+                # first step after initializing the network, as there will be
+                # no vehicles
+                if self.step_counter == 0:
+                    continue
                 try:
                     self.k.vehicle.remove(veh_id)
                 except (FatalTraCIError, TraCIException):
-                    pass
-
-        # clear all vehicles from the network and the vehicles class
-        # FIXME (ev, ak) this is weird and shouldn't be necessary
-        for veh_id in list(self.k.vehicle.get_ids()):
-            # do not try to remove the vehicles from the network in the first
-            # step after initializing the network, as there will be no vehicles
-            if self.step_counter == 0:
-                continue
-            try:
-                self.k.vehicle.remove(veh_id)
-            except (FatalTraCIError, TraCIException):
-                print("Error during start: {}".format(traceback.format_exc()))
-
-        # reintroduce the initial vehicles to the network
-        for veh_id in self.initial_ids:
-            type_id, edge, lane_index, pos, speed = \
-                self.initial_state[veh_id]
-
-            try:
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-            except (FatalTraCIError, TraCIException):
-                # if a vehicle was not removed in the first attempt, remove it
-                # now and then reintroduce it
-                self.k.vehicle.remove(veh_id)
-                if self.simulator == 'traci':
-                    self.k.kernel_api.vehicle.remove(veh_id)  # FIXME: hack
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-
-        # advance the simulation in the simulator by one step
-        self.k.simulation.simulation_step()
-
-        # update the information in each kernel to match the current state
-        self.k.update(reset=True)
+                    print("Error during start: {}".format(
+                        traceback.format_exc()))
+
+            # reintroduce the initial vehicles to the network
+            for veh_id in self.initial_ids:
+                type_id, edge, lane_index, pos, speed = \
+                    self.initial_state[veh_id]
+
+                try:
+                    self.k.vehicle.add(
+                        veh_id=veh_id,
+                        type_id=type_id,
+                        edge=edge,
+                        lane=lane_index,
+                        pos=pos,
+                        speed=speed)
+                except (FatalTraCIError, TraCIException):
+                    # if a vehicle was not removed in the first attempt,
+                    # remove it now and then reintroduce it
+                    self.k.vehicle.remove(veh_id)
+                    if self.simulator == 'traci':
+                        # FIXME: hack
+                        self.k.kernel_api.vehicle.remove(veh_id)
+                    self.k.vehicle.add(
+                        veh_id=veh_id,
+                        type_id=type_id,
+                        edge=edge,
+                        lane=lane_index,
+                        pos=pos,
+                        speed=speed)
+
+            # advance the simulation in the simulator by one step
+            self.k.simulation.simulation_step()
+
+            # update the information in each kernel to match the current state
+            self.k.update(reset=True)
 
         # update the colors of vehicles
         if self.sim_params.render:
@@ -482,6 +696,10 @@ class Env(*classdef):
                 msg += '- {}: {}\n'.format(veh_id, self.initial_state[veh_id])
             raise FatalFlowError(msg=msg)
 
+        if snapshot_name is None and self._snapshot_reset_enabled():
+            self._reset_snapshots["initial"] = \
+                (self.k.save_state(), self.time_counter)
+
         states = self.get_state()
 
         # collect information of the state of the network based on the
@@ -491,19 +709,221 @@ class Env(*classdef):
         # observation associated with the reset (no warm-up steps)
         observation = np.copy(states)
 
-        # perform (optional) warm-up steps before training
-        for _ in range(self.env_params.warmup_steps):
-            observation, _, _, _ = self.step(rl_actions=None)
+        # perform (optional) warm-up steps before training, unless the state
+        # at the end of the warm-up steps was loaded
+        if snapshot_name != "warmup" and self.env_params.warmup_steps > 0:
+            with profile_phase(self.profiler, "warmup"):
+                for _ in range(self.env_params.warmup_steps):
+                    observation, _, _, _ = self.step(rl_actions=None)
+
+            if self._warmup_cache is not None:
+                self._cache_warm_state()
+            elif self._snapshot_reset_enabled() and \
+                    self.sim_params.snapshot_warmup:
+                self._reset_snapshots["warmup"] = \
+                    (self.k.save_state(), self.time_counter)
 
         # render a frame
         self.render(reset=True)
 
+        if self.profiler is not None:
+            self.profiler.record("reset", reset_start)
+
         return observation
 
+    def checkpoint(self):
+        """Save the current state of the environment.
+
+        The state of the simulation and of the kernel (including the state of
+        the vehicle controllers and routers), as well as the counters of the
+        environment, are saved so that the environment can be restored to the
+        current step with `restore` at any later point of the rollout, or of
+        another rollout, without restarting the simulation. Environments that
+        store additional information during a rollout should extend this
+        method and `restore` accordingly.
+
+        The checkpoints (including the state of the simulator) are stored on
+        disk, and only the most recently used ones are kept in memory. They
+        are removed when the simulation is restarted (see
+        SumoParams.restart_instance) or the environment is terminated.
+
+        Returns
+        -------
+        int
+            the token used to restore the checkpoint
+        """
+        return self._checkpoints.save({
+            "kernel": self.k.save_state(in_memory=True),
+            "time_counter": self.time_counter,
+            "step_counter": self.step_counter,
+            "state": self.state,
+        })
+
+    def restore(self, token):
+        """Restore the environment to a state saved with `checkpoint`.
+
+        Parameters
+        ----------
+        token : int
+            the token returned by `checkpoint`
+
+        Returns
+        -------
+        observation : array_like
+            the observation of the restored state
+
+        Raises
+        ------
+        KeyError
+            if the checkpoint does not exist (anymore)
+        """
+        checkpoint = self._checkpoints.load(token)
+
+        self.k.load_state(checkpoint["kernel"])
+        self.time_counter = checkpoint["time_counter"]
+        self.step_counter = checkpoint["step_counter"]
+        self.state = deepcopy(checkpoint["state"])
+
+        # update the colors of vehicles
+        if self.sim_params.render:
+            self.k.vehicle.update_vehicle_colors()
+
+        return self.get_state()
+
+    def _snapshot_reset_enabled(self):
+        """Return whether resets start from saved states of the simulation.
+
+        See SumoParams.snapshot_reset. States are not saved if the initial
+        positions of the vehicles differ from one reset to the next.
+        """
+        return self.simulator == 'traci' \
+            and getattr(self.sim_params, "snapshot_reset", False) \
+            and not self.scenario.initial_config.shuffle
+
+    def _reset_snapshot_name(self):
+        """Return the name of the saved state the next reset starts from.
+
+        Returns
+        -------
+        str or None
+            "warmup" if the state at the end of the warm-up steps was saved,
+            "initial" if only the state at the end of the initialization was
+            saved, and None if no state was saved or saved states are not used
+        """
+        if self._warmup_cache is not None \
+                and "warmup" in self._reset_snapshots:
+            # a state of the warm-up cache was selected, see
+            # `_select_warm_state`
+            return "warmup"
+        if not self._snapshot_reset_enabled():
+            return None
+        for name in ["warmup", "initial"]:
+            if name in self._reset_snapshots:
+                return name
+        return None
+
     def additional_command(self):
         """Additional commands that may be performed by the step method."""
         pass
 
+    def _warmup_cache_enabled(self):
+        """Return whether the states after warm-up are cached.
+
+        See SumoParams.warmup_cache. As is the case for saved states, states
+        are not cached if the initial positions of the vehicles differ from
+        one reset to the next.
+        """
+        return self.simulator == 'traci' \
+            and getattr(self.sim_params, "warmup_cache", False) \
+            and self.env_params.warmup_steps > 0 \
+            and not self.scenario.initial_config.shuffle
+
+    def _select_warm_state(self):
+        """Pick the state of the warm-up cache the next rollout starts from.
+
+        A slot of the pool of states is picked at random. If no state is
+        cached in this slot yet, the warm-up steps are performed, and their
+        final state is cached in the slot (see `_cache_warm_state`).
+        """
+        pool_size = max(getattr(self.sim_params, "warmup_pool_size", 1), 1)
+        self._warmup_slot = random.randrange(pool_size)
+
+        state = self._warm_states.get(self._warmup_slot)
+        if state is None:
+            state = self._warmup_cache.get(
+                self._warmup_key, self._warmup_slot)
+            if state is not None:
+                self._warm_states[self._warmup_slot] = state
+
+        if state is not None:
+            self._reset_snapshots["warmup"] = state
+        else:
+            self._reset_snapshots.pop("warmup", None)
+
+    def _cache_warm_state(self):
+        """Store the current state in the selected slot of the warm-up cache.
+
+        The state is used by later resets of this environment, and of any
+        other environment with the same configuration.
+        """
+        kernel_state = self.k.save_state()
+        try:
+            self._warmup_cache.put(self._warmup_key, self._warmup_slot,
+                                   kernel_state, self.time_counter)
+        except OSError as e:
+            warnings.warn(
+                "Error while caching the state after warm-up: {}".format(e))
+            return
+
+        # the cached copy of the state remains valid after the simulation is
+        # closed, unlike the state saved by the simulation kernel
+        self._warm_states[self._warmup_slot] = self._warmup_cache.get(
+            self._warmup_key, self._warmup_slot)
+
+    def _substep_batch_size(self):
+        """Return the number of simulation steps to advance at once.
+
+        All the simulation steps of a rollout step are advanced at once if
+        requested (see EnvParams.batch_substeps), and if the controllers of
+        every vehicle type support it. Otherwise, the simulation steps are
+        advanced one at a time.
+        """
+        if self._substeps_batchable is None:
+            controllers = []
+            for params in self.k.vehicle.type_parameters.values():
+                for key in ["acceleration_controller",
+                            "lane_change_controller", "routing_controller"]:
+                    if params.get(key) is not None:
+                        controllers.append(params[key][0])
+
+            self._substeps_batchable = \
+                getattr(self.env_params, "batch_substeps", False) \
+                and self.simulator == 'traci' \
+                and all(controller.batch_substeps
+                        for controller in controllers)
+
+        if self._substeps_batchable:
+            return self.env_params.sims_per_step
+        return 1
+
+    def _routers_by_type(self):
+        """Group the routing controllers of all vehicles by their class.
+
+        This allows every class of routing controllers to choose the routes
+        of all its vehicles at once, see BaseRouter.choose_routes.
+
+        Returns
+        -------
+        dict < type, list of flow.controllers.BaseRouter >
+            routing controllers of every class, in the order of the vehicles
+        """
+        routers = {}
+        for veh_id in self.k.vehicle.get_ids():
+            router = self.k.vehicle.get_routing_controller(veh_id)
+            if router is not None:
+                routers.setdefault(type(router), []).append(router)
+        return routers
+
     def clip_actions(self, rl_actions=None):
         """Clip the actions passed from the RL agent.
 
@@ -616,6 +1036,20 @@ class Env(*classdef):
         Should be done at end of every experiment. Must be in Env because the
         environment opens the TraCI connection.
         """
+        # terminate the sumo instances that were launched in advance
+        if self.simulator == 'traci':
+            self.k.simulation.drain_pool()
+
+        self._checkpoints.clear()
+        if self._warmup_cache is not None:
+            self._warmup_cache.close()
+
+        # the statistics remain available from the profiler, and are printed
+        # by the caller if needed
+        if self.profiler is not None:
+            logging.info(" Profile of the environment:\n" +
+                         self.profiler.report())
+
         try:
             # close everything within the kernel
             self.k.close()
@@ -107,8 +107,8 @@ class AccelEnv(Env):
         """See class definition."""
         speed = [self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
                  for veh_id in self.sorted_ids]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / self.k.scenario.length()
-               for veh_id in self.sorted_ids]
+        pos = [x / self.k.scenario.length()
+               for x in self.k.vehicle.get_x_by_id(self.sorted_ids)]
 
         return np.array(speed + pos)
 
@@ -124,9 +124,9 @@ class AccelEnv(Env):
                 self.k.vehicle.set_observed(veh_id)
 
         # update the "absolute_position" variable
-        for veh_id in self.k.vehicle.get_ids():
-            this_pos = self.k.vehicle.get_x_by_id(veh_id)
-
+        veh_ids = self.k.vehicle.get_ids()
+        for veh_id, this_pos in zip(veh_ids,
+                                    self.k.vehicle.get_x_by_id(veh_ids)):
             if this_pos == -1001:
                 # in case the vehicle isn't in the network
                 self.absolute_position[veh_id] = -1001
@@ -166,8 +166,9 @@ class AccelEnv(Env):
         """
         obs = super().reset()
 
-        for veh_id in self.k.vehicle.get_ids():
-            self.absolute_position[veh_id] = self.k.vehicle.get_x_by_id(veh_id)
-            self.prev_pos[veh_id] = self.k.vehicle.get_x_by_id(veh_id)
+        veh_ids = self.k.vehicle.get_ids()
+        for veh_id, pos in zip(veh_ids, self.k.vehicle.get_x_by_id(veh_ids)):
+            self.absolute_position[veh_id] = pos
+            self.prev_pos[veh_id] = pos
 
         return obs
@@ -174,7 +174,7 @@ class TwoLoopsMergePOEnv(Env):
         vel[:self.n_obs_vehicles - self.n_merging_in] = np.array(
             self.k.vehicle.get_speed(vehicles))
         pos[:self.n_obs_vehicles - self.n_merging_in] = np.array(
-            [self.k.vehicle.get_x_by_id(veh_id) for veh_id in vehicles])
+            self.k.vehicle.get_x_by_id(vehicles))
 
         # normalize the speed
         # FIXME(cathywu) can divide by self.max_speed
@@ -206,8 +206,7 @@ class TwoLoopsMergePOEnv(Env):
         environment are sorted with regards to which ring this currently
         reside on.
         """
-        pos = [self.k.vehicle.get_x_by_id(veh_id)
-               for veh_id in self.k.vehicle.get_ids()]
+        pos = self.k.vehicle.get_x_by_id(self.k.vehicle.get_ids())
         sorted_indx = np.argsort(pos)
         sorted_ids = np.array(self.k.vehicle.get_ids())[sorted_indx]
 
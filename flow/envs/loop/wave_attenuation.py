@@ -141,8 +141,8 @@ class WaveAttenuationEnv(Env):
         """See class definition."""
         speed = [self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
                  for veh_id in self.k.vehicle.get_ids()]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / self.k.scenario.length()
-               for veh_id in self.k.vehicle.get_ids()]
+        pos = [x / self.k.scenario.length()
+               for x in self.k.vehicle.get_x_by_id(self.k.vehicle.get_ids())]
 
         return np.array(speed + pos)
 
@@ -0,0 +1,495 @@
+"""Contains vectorized environments stepping several environments at once."""
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+import multiprocessing
+import os
+import tempfile
+import traceback
+
+import numpy as np
+from gym.spaces import Box
+
+from flow.utils.exceptions import FatalFlowError
+from flow.utils.registry import make_env
+
+try:
+    from ray.rllib.env.vector_env import VectorEnv
+except ImportError:
+    VectorEnv = object
+
+# directory of the buffers shared with the worker processes of
+# FlowSubprocVectorEnv, which is kept in memory if possible
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _make_env(flow_params, index, render):
+    """Create the environment with a given index.
+
+    Every environment is created from its own copy of the flow parameters
+    (see flow.utils.registry.make_env). Unlike the environments created by
+    flow.utils.registry.make_create_env, they are not created through the
+    gym registry, which would create all of them from the parameters of the
+    first environment registered under the same name.
+
+    The simulations of the environments would be identical if they all used
+    the same seed, so that the seed of every environment is offset by its
+    index.
+    """
+    params = deepcopy(flow_params)
+    sim_params = params['sim']
+    if getattr(sim_params, 'seed', None) is not None:
+        sim_params.seed += index
+
+    return make_env(params, render)
+
+
+def _split_actions(actions, num_envs):
+    """Return the actions of every environment."""
+    if actions is None:
+        return [None] * num_envs
+    return list(actions)
+
+
+class FlowVectorEnv(VectorEnv):
+    """Vectorized environment stepping several Flow environments concurrently.
+
+    The environments are created from their own copies of the same flow
+    parameters (see flow.utils.registry.make_env), and are reset and
+    advanced concurrently on a pool of threads. Most of the duration of a step
+    is spent waiting for the simulator to compute the simulation steps, during
+    which the threads do not hold the GIL, so that the simulation steps of the
+    different environments are computed in parallel.
+
+    Two interfaces are provided:
+
+    * `reset` and `step`, which return the observations, rewards and dones of
+      all environments as stacked arrays, and reset the environments whose
+      rollouts are done automatically (the last observation of the rollout is
+      then available in the "terminal_observation" entry of the info dict).
+    * `vector_reset`, `reset_at` and `vector_step`, the interface of RLlib's
+      VectorEnv, which return lists and leave the environments whose rollouts
+      are done to be reset by the caller.
+
+    Only single-agent environments are supported.
+
+    Usage
+    -----
+        >>> from flow.benchmarks.merge0 import flow_params
+        >>> env = FlowVectorEnv(flow_params, num_envs=4)
+        >>> obs = env.reset()
+        >>> obs, rewards, dones, infos = env.step(actions)
+        >>> env.close()
+
+    Attributes
+    ----------
+    num_envs : int
+        number of environments
+    envs : list of flow.envs.Env
+        the environments
+    observation_space : gym.spaces.*
+        observation space of each environment
+    action_space : gym.spaces.*
+        action space of each environment
+    """
+
+    def __init__(self, flow_params, num_envs, render=None, num_threads=None):
+        """Instantiate the vectorized environment.
+
+        Parameters
+        ----------
+        flow_params : dict
+            flow-related parameters of the environments, see
+            flow.utils.registry.make_create_env
+        num_envs : int
+            number of environments
+        render : bool, optional
+            specifies whether to use the gui during execution. This overrides
+            the render attribute in SumoParams
+        num_threads : int, optional
+            number of threads the environments are advanced on. Defaults to
+            one thread per environment.
+        """
+        self.num_envs = num_envs
+        self.envs = [_make_env(flow_params, i, render)
+                     for i in range(num_envs)]
+
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_threads or num_envs)
+
+    def reset(self):
+        """Reset all environments.
+
+        Returns
+        -------
+        np.ndarray
+            stacked initial observations of the environments
+        """
+        return np.stack(self.vector_reset())
+
+    def step(self, actions):
+        """Advance all environments by one step.
+
+        The environments whose rollouts are done are reset, and the returned
+        observation of such an environment is its initial observation.
+
+        Parameters
+        ----------
+        actions : array_like or None
+            actions of the environments, in the order of the environments
+
+        Returns
+        -------
+        np.ndarray
+            stacked observations of the environments
+        np.ndarray
+            rewards of the environments
+        np.ndarray
+            dones of the environments
+        list of dict
+            infos of the environments
+        """
+        results = self._map(self._step_env, range(self.num_envs),
+                            _split_actions(actions, self.num_envs),
+                            [True] * self.num_envs)
+        obs, rewards, dones, infos = zip(*results)
+
+        return np.stack(obs), np.array(rewards), np.array(dones), list(infos)
+
+    def vector_reset(self):
+        """Reset all environments, see RLlib's VectorEnv.
+
+        Returns
+        -------
+        list
+            initial observations of the environments
+        """
+        return self._map(lambda env: env.reset(), self.envs)
+
+    def reset_at(self, index):
+        """Reset one environment, see RLlib's VectorEnv.
+
+        Parameters
+        ----------
+        index : int
+            index of the environment
+
+        Returns
+        -------
+        array_like
+            initial observation of the environment
+        """
+        return self.envs[index].reset()
+
+    def vector_step(self, actions):
+        """Advance all environments by one step, see RLlib's VectorEnv.
+
+        Unlike `step`, the environments whose rollouts are done are not reset.
+
+        Parameters
+        ----------
+        actions : list
+            actions of the environments, in the order of the environments
+
+        Returns
+        -------
+        list
+            observations of the environments
+        list of float
+            rewards of the environments
+        list of bool
+            dones of the environments
+        list of dict
+            infos of the environments
+        """
+        results = self._map(self._step_env, range(self.num_envs),
+                            _split_actions(actions, self.num_envs),
+                            [False] * self.num_envs)
+
+        return tuple(list(r) for r in zip(*results))
+
+    def get_unwrapped(self):
+        """Return the environments, see RLlib's VectorEnv."""
+        return [env.unwrapped for env in self.envs]
+
+    def close(self):
+        """Terminate all environments and stop the threads."""
+        self._map(lambda env: env.unwrapped.terminate(), self.envs)
+        self._executor.shutdown()
+
+    def _map(self, fn, *iterables):
+        """Apply a method concurrently on the threads, and wait for it."""
+        return list(self._executor.map(fn, *iterables))
+
+    def _step_env(self, index, action, auto_reset):
+        """Advance one environment by one step, and reset it if requested."""
+        env = self.envs[index]
+        obs, reward, done, info = env.step(action)
+        if done and auto_reset:
+            info = dict(info)
+            info["terminal_observation"] = obs
+            obs = env.reset()
+
+        return obs, reward, done, info
+
+
+def _all_done(done):
+    """Return whether a rollout is done (for all agents, if multi-agent)."""
+    if isinstance(done, dict):
+        return done.get('__all__', False)
+    return bool(done)
+
+
+def _stack(values):
+    """Stack the results of the environments, unless they are dicts."""
+    if isinstance(values[0], dict):
+        return list(values)
+    return np.array(values)
+
+
+def _subproc_worker(remote, parent_remote, flow_params, index, render):
+    """Run an environment in a worker process of FlowSubprocVectorEnv.
+
+    Commands are received as (command, data) tuples, and every command is
+    answered with an (error, result) tuple, where error is the traceback of
+    the exception raised while performing the command, if any.
+
+    Observations, rewards and dones are written to the row of the environment
+    in the shared buffer once it is attached (and None is returned in their
+    place), unless the observations are not arrays (e.g. the observations of
+    multi-agent environments), in which case they are returned.
+    """
+    parent_remote.close()
+    env = None
+    row = None
+
+    def write(obs, reward=0, done=False):
+        if row is None or isinstance(obs, dict):
+            return obs, reward, done
+        row[:-2] = np.ravel(obs)
+        row[-2] = reward
+        row[-1] = done
+        return None
+
+    while True:
+        command, data = remote.recv()
+        try:
+            if command == 'make':
+                env = _make_env(flow_params, index, render)
+                result = (env.observation_space, env.action_space)
+            elif command == 'attach':
+                path, shape, index = data
+                row = np.memmap(path, dtype=np.float64, mode='r+',
+                                shape=shape)[index]
+                result = None
+            elif command == 'reset':
+                result = write(env.reset())
+            elif command == 'step':
+                action, auto_reset = data
+                obs, reward, done, info = env.step(action)
+                if auto_reset and _all_done(done):
+                    info = dict(info)
+                    info['terminal_observation'] = obs
+                    obs = env.reset()
+                result = (write(obs, reward, done), info)
+            elif command == 'close':
+                if env is not None:
+                    env.unwrapped.terminate()
+                remote.send((None, None))
+                break
+            else:
+                raise ValueError('Unknown command: {}'.format(command))
+        except Exception:
+            remote.send((traceback.format_exc(), None))
+            continue
+        remote.send((None, result))
+
+    remote.close()
+
+
+class FlowSubprocVectorEnv(VectorEnv):
+    """Vectorized environment running every environment in its own process.
+
+    Unlike FlowVectorEnv, the computations performed in Python by the
+    environments (e.g. building their observations) are not limited by the
+    GIL. Observations, rewards and dones are written by the worker processes
+    to a buffer shared with the main process, so that only the actions and
+    infos are pickled at every step.
+
+    The shared buffer is sized from the observation space, and is only used
+    if it is a Box. The observations of other environments (including
+    multi-agent environments, whose observations are dicts) are instead sent
+    back by the worker processes.
+
+    The same interfaces as FlowVectorEnv are provided, with the exception of
+    `get_unwrapped`, as the environments live in the worker processes.
+
+    Usage
+    -----
+        >>> from flow.benchmarks.bottleneck0 import flow_params
+        >>> env = FlowSubprocVectorEnv(flow_params, num_envs=4)
+        >>> obs = env.reset()
+        >>> obs, rewards, dones, infos = env.step(actions)
+        >>> env.close()
+
+    Attributes
+    ----------
+    num_envs : int
+        number of environments
+    observation_space : gym.spaces.*
+        observation space of each environment
+    action_space : gym.spaces.*
+        action space of each environment
+    """
+
+    def __init__(self, flow_params, num_envs, render=None):
+        """Instantiate the vectorized environment.
+
+        Parameters
+        ----------
+        flow_params : dict
+            flow-related parameters of the environments, see
+            flow.utils.registry.make_create_env
+        num_envs : int
+            number of environments
+        render : bool, optional
+            specifies whether to use the gui during execution. This overrides
+            the render attribute in SumoParams
+        """
+        self.num_envs = num_envs
+        self._remotes = []
+        self._processes = []
+        self._buffer = None
+        self._buffer_path = None
+
+        for i in range(num_envs):
+            remote, worker_remote = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_subproc_worker,
+                args=(worker_remote, remote, flow_params, i, render))
+            process.daemon = True
+            process.start()
+            worker_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+
+        # the environments are created one at a time, so that their sumo
+        # instances are not assigned the same free port
+        for remote in self._remotes:
+            remote.send(('make', None))
+            self.observation_space, self.action_space = self._recv(remote)
+
+        if isinstance(self.observation_space, Box):
+            # every row contains the observation, reward and done of an
+            # environment
+            shape = (num_envs,
+                     int(np.prod(self.observation_space.shape)) + 2)
+            fd, self._buffer_path = tempfile.mkstemp(
+                prefix='flow_vector_env_', dir=SHARED_MEMORY_DIR)
+            os.close(fd)
+            self._buffer = np.memmap(self._buffer_path, dtype=np.float64,
+                                     mode='w+', shape=shape)
+            self._call([('attach', (self._buffer_path, shape, i))
+                        for i in range(num_envs)])
+
+    def reset(self):
+        """Reset all environments, see FlowVectorEnv."""
+        return _stack(self.vector_reset())
+
+    def step(self, actions):
+        """Advance all environments by one step, see FlowVectorEnv."""
+        results = self._call(
+            [('step', (action, True))
+             for action in _split_actions(actions, self.num_envs)])
+        obs, rewards, dones, infos = self._step_results(results)
+
+        return _stack(obs), _stack(rewards), _stack(dones), infos
+
+    def vector_reset(self):
+        """Reset all environments, see RLlib's VectorEnv."""
+        results = self._call([('reset', None)] * self.num_envs)
+        return [self._read(i, result)[0] for i, result in enumerate(results)]
+
+    def reset_at(self, index):
+        """Reset one environment, see RLlib's VectorEnv."""
+        self._remotes[index].send(('reset', None))
+        return self._read(index, self._recv(self._remotes[index]))[0]
+
+    def vector_step(self, actions):
+        """Advance all environments by one step, see RLlib's VectorEnv."""
+        results = self._call(
+            [('step', (action, False))
+             for action in _split_actions(actions, self.num_envs)])
+        return self._step_results(results)
+
+    def get_unwrapped(self):
+        """See RLlib's VectorEnv.
+
+        The environments live in the worker processes, and are therefore not
+        returned.
+        """
+        return []
+
+    def close(self):
+        """Terminate all environments and their worker processes."""
+        self._call([('close', None)] * self.num_envs)
+        for process in self._processes:
+            process.join()
+
+        if self._buffer_path is not None:
+            self._buffer = None
+            os.remove(self._buffer_path)
+            self._buffer_path = None
+
+    def _recv(self, remote):
+        """Return the result of a command sent to a worker process."""
+        return self._check(remote.recv())
+
+    def _call(self, commands):
+        """Send a command to every worker process, and return the results.
+
+        The commands are all sent before waiting for any of the results, so
+        that they are performed concurrently. The replies of all worker
+        processes are received before an error is raised, so that no reply is
+        left in the pipes to be mistaken for the result of the next command.
+        """
+        for remote, command in zip(self._remotes, commands):
+            remote.send(command)
+        replies = [remote.recv() for remote in self._remotes]
+        return [self._check(reply) for reply in replies]
+
+    @staticmethod
+    def _check(reply):
+        """Return the result of a reply, or raise the error it contains."""
+        error, result = reply
+        if error is not None:
+            raise FatalFlowError(
+                'Error in a worker of the vector environment:\n' + error)
+        return result
+
+    def _read(self, index, result):
+        """Return the observation, reward and done of an environment.
+
+        They are read from the shared buffer, unless they were returned by
+        the worker process.
+        """
+        if result is not None:
+            return result
+        row = self._buffer[index]
+        return (np.array(row[:-2]).reshape(self.observation_space.shape),
+                float(row[-2]), bool(row[-1]))
+
+    def _step_results(self, results):
+        """Return the lists of observations, rewards, dones, and infos."""
+        obs, rewards, dones, infos = [], [], [], []
+        for i, (result, info) in enumerate(results):
+            obs_i, reward_i, done_i = self._read(i, result)
+            obs.append(obs_i)
+            rewards.append(reward_i)
+            dones.append(done_i)
+            infos.append(info)
+
+        return obs, rewards, dones, infos
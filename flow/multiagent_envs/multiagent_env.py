@@ -1,6 +1,7 @@
 from copy import deepcopy
 import numpy as np
 import random
+import time
 import traceback
 from gym.spaces import Box
 
@@ -9,6 +10,7 @@ from traci.exceptions import TraCIException
 
 from ray.rllib.env import MultiAgentEnv
 
+from flow.core.profiler import profile_phase
 from flow.envs.base_env import Env
 from flow.utils.exceptions import FatalFlowError
 
@@ -16,24 +18,8 @@ from flow.utils.exceptions import FatalFlowError
 class MultiEnv(MultiAgentEnv, Env):
     """Multi-agent version of base env. See parent class for info"""
 
-    def step(self, rl_actions):
-        """Advance the environment by one step.
-
-        Assigns actions to autonomous and human-driven agents (i.e. vehicles,
-        traffic lights, etc...). Actions that are not assigned are left to the
-        control of the simulator. The actions are then used to advance the
-        simulator by the number of time steps requested per environment step.
-
-        Results from the simulations are processed through various classes,
-        such as the Vehicle and TrafficLight kernels, to produce standardized
-        methods for identifying specific network state features. Finally,
-        results from the simulator are used to generate appropriate
-        observations.
-
-        Parameters
-        ----------
-        rl_actions : array_like
-            an list of actions provided by the rl algorithm
+    def _step_results(self, rl_actions, crash):
+        """See parent class.
 
         Returns
         -------
@@ -46,64 +32,8 @@ class MultiEnv(MultiAgentEnv, Env):
         info : dict
             contains other diagnostic information from the previous action
         """
-        for _ in range(self.env_params.sims_per_step):
-            self.time_counter += 1
-            self.step_counter += 1
-
-            # perform acceleration actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_ids()) > 0:
-                accel = []
-                for veh_id in self.k.vehicle.get_controlled_ids():
-                    accel_contr = self.k.vehicle.get_acc_controller(veh_id)
-                    action = accel_contr.get_action(self)
-                    accel.append(action)
-                self.k.vehicle.apply_acceleration(
-                    self.k.vehicle.get_controlled_ids(), accel)
-
-            # perform lane change actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
-                direction = []
-                for veh_id in self.k.vehicle.get_controlled_lc_ids():
-                    target_lane = self.k.vehicle.get_lane_changing_controller(
-                        veh_id).get_action(self)
-                    direction.append(target_lane)
-                self.k.vehicle.apply_lane_change(
-                    self.k.vehicle.get_controlled_lc_ids(),
-                    direction=direction)
-
-            # perform (optionally) routing actions for all vehicle in the
-            # network, including rl and sumo-controlled vehicles
-            routing_ids = []
-            routing_actions = []
-            for veh_id in self.k.vehicle.get_ids():
-                if self.k.vehicle.get_routing_controller(veh_id) is not None:
-                    routing_ids.append(veh_id)
-                    route_contr = self.k.vehicle.get_routing_controller(veh_id)
-                    routing_actions.append(route_contr.choose_route(self))
-            self.k.vehicle.choose_routes(routing_ids, routing_actions)
-
-            self.apply_rl_actions(rl_actions)
-
-            self.additional_command()
-
-            # advance the simulation in the simulator by one step
-            self.k.simulation.simulation_step()
-
-            # store new observations in the vehicles and traffic lights class
-            self.k.update(reset=False)
-
-            # update the colors of vehicles
-            if self.sim_params.render:
-                self.k.vehicle.update_vehicle_colors()
-
-            # crash encodes whether the simulator experienced a collision
-            crash = self.k.simulation.check_collision()
-
-            # stop collecting new simulation steps if there is a collision
-            if crash:
-                break
-
-        states = self.get_state()
+        with profile_phase(self.profiler, "get_state"):
+            states = self.get_state()
         done = {key: key in self.k.vehicle.get_arrived_ids()
                 for key in states.keys()}
         if crash:
@@ -111,9 +41,14 @@ class MultiEnv(MultiAgentEnv, Env):
         else:
             done['__all__'] = False
         infos = {key: {} for key in states.keys()}
+        if done['__all__'] and self.profiler is not None:
+            summary = self.profiler.summary()
+            for info in infos.values():
+                info["profile"] = summary
 
-        clipped_actions = self.clip_actions(rl_actions)
-        reward = self.compute_reward(clipped_actions, fail=crash)
+        with profile_phase(self.profiler, "compute_reward"):
+            clipped_actions = self.clip_actions(rl_actions)
+            reward = self.compute_reward(clipped_actions, fail=crash)
 
         return states, reward, done, infos
 
@@ -133,12 +68,17 @@ class MultiEnv(MultiAgentEnv, Env):
             the initial observation of the space. The initial reward is assumed
             to be zero.
         """
+        # time the reset started at, see EnvParams.profile
+        reset_start = time.perf_counter()
+
         # reset the time counter
         self.time_counter = 0
 
-        # warn about not using restart_instance when using inflows
+        # warn about not using restart_instance when using inflows (loading a
+        # saved state also removes the vehicles that entered the network)
         if len(self.scenario.net_params.inflows.get()) > 0 and \
-                not self.sim_params.restart_instance:
+                not self.sim_params.restart_instance and \
+                not self._snapshot_reset_enabled():
             print(
                 "**********************************************************\n"
                 "**********************************************************\n"
@@ -151,8 +91,16 @@ class MultiEnv(MultiAgentEnv, Env):
                 "**********************************************************"
             )
 
-        if self.sim_params.restart_instance or \
+        # the state saved by a previous reset or the warm-up cache (if any),
+        # which replaces the restart of the simulation and the reintroduction
+        # of the vehicles
+        if self._warmup_cache is not None:
+            self._select_warm_state()
+        snapshot_name = self._reset_snapshot_name()
+
+        if (self.sim_params.restart_instance and snapshot_name is None) or \
                 (self.step_counter > 2e6 and self.simulator != 'aimsun'):
+            snapshot_name = None
             self.step_counter = 0
             # issue a random seed to induce randomness into the next rollout
             self.sim_params.seed = random.randint(0, 1e5)
@@ -160,64 +108,77 @@ class MultiEnv(MultiAgentEnv, Env):
             self.k.vehicle = deepcopy(self.initial_vehicles)
             self.k.vehicle.master_kernel = self.k
             # restart the sumo instance
-            self.restart_simulation(self.sim_params)
+            with profile_phase(self.profiler, "restart_simulation"):
+                self.restart_simulation(self.sim_params)
 
         # perform shuffling (if requested)
         elif self.scenario.initial_config.shuffle:
             self.setup_initial_state()
 
-        # clear all vehicles from the network and the vehicles class
-        if self.simulator == 'traci':
-            for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
+        if snapshot_name is not None:
+            # restore the simulation and the kernel to the saved state
+            kernel_state, self.time_counter = \
+                self._reset_snapshots[snapshot_name]
+            with profile_phase(self.profiler, "load_state"):
+                self.k.load_state(kernel_state)
+            self.step_counter += self.time_counter
+        else:
+            # clear all vehicles from the network and the vehicles class
+            if self.simulator == 'traci':
+                # FIXME: hack
+                for veh_id in self.k.kernel_api.vehicle.getIDList():
+                    try:
+                        self.k.vehicle.remove(veh_id)
+                    except (FatalTraCIError, TraCIException):
+                        pass
+
+            # clear all vehicles from the network and the vehicles class
+            # FIXME (ev, ak) this is weird and shouldn't be necessary
+            for veh_id in list(self.k.vehicle.get_ids()):
+                # do not try to remove the vehicles from the network in the
+                # first step after initializing the network, as there will be
+                # no vehicles
+                if self.step_counter == 0:
+                    continue
                 try:
                     self.k.vehicle.remove(veh_id)
                 except (FatalTraCIError, TraCIException):
-                    pass
-
-        # clear all vehicles from the network and the vehicles class
-        # FIXME (ev, ak) this is weird and shouldn't be necessary
-        for veh_id in list(self.k.vehicle.get_ids()):
-            # do not try to remove the vehicles from the network in the first
-            # step after initializing the network, as there will be no vehicles
-            if self.step_counter == 0:
-                continue
-            try:
-                self.k.vehicle.remove(veh_id)
-            except (FatalTraCIError, TraCIException):
-                print("Error during start: {}".format(traceback.format_exc()))
-
-        # reintroduce the initial vehicles to the network
-        for veh_id in self.initial_ids:
-            type_id, edge, lane_index, pos, speed = \
-                self.initial_state[veh_id]
-
-            try:
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-            except (FatalTraCIError, TraCIException):
-                # if a vehicle was not removed in the first attempt, remove it
-                # now and then reintroduce it
-                self.k.vehicle.remove(veh_id)
-                if self.simulator == 'traci':
-                    self.k.kernel_api.vehicle.remove(veh_id)  # FIXME: hack
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-
-        # advance the simulation in the simulator by one step
-        self.k.simulation.simulation_step()
-
-        # update the information in each kernel to match the current state
-        self.k.update(reset=True)
+                    print("Error during start: {}".format(
+                        traceback.format_exc()))
+
+            # reintroduce the initial vehicles to the network
+            for veh_id in self.initial_ids:
+                type_id, edge, lane_index, pos, speed = \
+                    self.initial_state[veh_id]
+
+                try:
+                    self.k.vehicle.add(
+                        veh_id=veh_id,
+                        type_id=type_id,
+                        edge=edge,
+                        lane=lane_index,
+                        pos=pos,
+                        speed=speed)
+                except (FatalTraCIError, TraCIException):
+                    # if a vehicle was not removed in the first attempt,
+                    # remove it now and then reintroduce it
+                    self.k.vehicle.remove(veh_id)
+                    if self.simulator == 'traci':
+                        # FIXME: hack
+                        self.k.kernel_api.vehicle.remove(veh_id)
+                    self.k.vehicle.add(
+                        veh_id=veh_id,
+                        type_id=type_id,
+                        edge=edge,
+                        lane=lane_index,
+                        pos=pos,
+                        speed=speed)
+
+            # advance the simulation in the simulator by one step
+            self.k.simulation.simulation_step()
+
+            # update the information in each kernel to match the current state
+            self.k.update(reset=True)
 
         # update the colors of vehicles
         if self.sim_params.render:
@@ -233,13 +194,30 @@ class MultiEnv(MultiAgentEnv, Env):
                 msg += '- {}: {}\n'.format(veh_id, self.initial_state[veh_id])
             raise FatalFlowError(msg=msg)
 
-        # perform (optional) warm-up steps before training
-        for _ in range(self.env_params.warmup_steps):
-            observation, _, _, _ = self.step(rl_actions=None)
+        if snapshot_name is None and self._snapshot_reset_enabled():
+            self._reset_snapshots["initial"] = \
+                (self.k.save_state(), self.time_counter)
+
+        # perform (optional) warm-up steps before training, unless the state
+        # at the end of the warm-up steps was loaded
+        if snapshot_name != "warmup" and self.env_params.warmup_steps > 0:
+            with profile_phase(self.profiler, "warmup"):
+                for _ in range(self.env_params.warmup_steps):
+                    observation, _, _, _ = self.step(rl_actions=None)
+
+            if self._warmup_cache is not None:
+                self._cache_warm_state()
+            elif self._snapshot_reset_enabled() and \
+                    self.sim_params.snapshot_warmup:
+                self._reset_snapshots["warmup"] = \
+                    (self.k.save_state(), self.time_counter)
 
         # render a frame
         self.render(reset=True)
 
+        if self.profiler is not None:
+            self.profiler.record("reset", reset_start)
+
         return self.get_state()
 
     def clip_actions(self, rl_actions=None):
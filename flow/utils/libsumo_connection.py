@@ -0,0 +1,178 @@
+"""Connection to a sumo simulation run in-process through libsumo.
+
+libsumo exposes the same API as TraCI, but runs sumo within the python process
+instead of communicating with a separate sumo process through a socket, so
+that every call to the API is a function call rather than a socket round
+trip. The ``LibsumoConnection`` class wraps the libsumo module so that it can
+be used by the kernel classes in place of a ``traci.connection.Connection``:
+
+- the subscription results of all objects of a domain are returned when
+  ``getSubscriptionResults`` is called without an object id (as is the case
+  in TraCI),
+- exceptions raised by libsumo are converted to the TraCI exceptions, and
+- methods that only apply to socket connections (e.g. ``setOrder``) are
+  ignored.
+
+libsumo can only run a single simulation per process. ``LibsumoConnection``
+accordingly keeps track of whether libsumo is in use, see ``available``.
+
+libsumo is only imported once a simulation is started with it (see
+``installed``), as importing it replaces the exception classes of the
+``traci.exceptions`` module with its own, which would otherwise prevent the
+errors of socket connections from being caught.
+"""
+
+import traci.exceptions
+
+# the libsumo module, imported when first needed, see installed
+libsumo = None
+# whether importing libsumo was already attempted
+_imported = False
+
+# domains of the API whose subscription results are retrieved per object
+DOMAINS = [
+    "edge", "inductionloop", "junction", "lane", "lanearea",
+    "multientryexit", "person", "poi", "polygon", "route", "trafficlight",
+    "vehicle", "vehicletype"
+]
+
+# the connection currently using libsumo in this process, if any
+_active_connection = None
+
+
+def installed():
+    """Import libsumo if needed, and return whether it is installed.
+
+    The exception classes of the traci.exceptions module, which are replaced
+    when libsumo is imported, are restored.
+
+    Returns
+    -------
+    bool
+        True if libsumo could be imported
+    """
+    global libsumo, _imported
+    if not _imported:
+        _imported = True
+        exceptions = dict(vars(traci.exceptions))
+        try:
+            import libsumo as module
+            libsumo = module
+        except ImportError:
+            pass
+        finally:
+            for name, value in exceptions.items():
+                setattr(traci.exceptions, name, value)
+    return libsumo is not None
+
+
+def available():
+    """Return whether a simulation can be started with libsumo.
+
+    Returns
+    -------
+    bool
+        False if libsumo is not installed, or is already used by another
+        simulation in this process
+    """
+    return _active_connection is None and installed()
+
+
+def _convert_errors(method):
+    """Wrap a libsumo method to raise TraCI exceptions instead."""
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except libsumo.TraCIException as e:
+            raise traci.exceptions.TraCIException(str(e))
+    return wrapper
+
+
+class _LibsumoDomain(object):
+    """Domain of the libsumo API (e.g. vehicle), see LibsumoConnection."""
+
+    def __init__(self, domain, object_id=None):
+        """Instantiate the domain.
+
+        Parameters
+        ----------
+        domain : module
+            the libsumo module of the domain
+        object_id : str, optional
+            id of the only object of the domain. If specified, the results of
+            this object are returned by getSubscriptionResults when no object
+            id is given (used by the simulation domain).
+        """
+        self._domain = domain
+        self._object_id = object_id
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is None:
+            method = _convert_errors(getattr(self._domain, name))
+            self._methods[name] = method
+        return method
+
+    def getSubscriptionResults(self, objectID=None):
+        """Return the subscription results of one or all objects."""
+        if objectID is not None:
+            return self._domain.getSubscriptionResults(objectID)
+        if self._object_id is not None:
+            return self._domain.getSubscriptionResults(self._object_id)
+        return self._domain.getAllSubscriptionResults()
+
+
+class LibsumoConnection(object):
+    """In-process replacement of traci.connection.Connection.
+
+    Usage
+    -----
+        >>> from flow.utils import libsumo_connection
+        >>> if libsumo_connection.available():
+        >>>     connection = libsumo_connection.LibsumoConnection(
+        >>>         ["sumo", "-c", "ring.sumo.cfg"])
+        >>>     connection.simulationStep()
+        >>>     connection.close()
+    """
+
+    def __init__(self, sumo_call):
+        """Start a simulation with libsumo.
+
+        Parameters
+        ----------
+        sumo_call : list of str
+            command used to start sumo (without the remote port)
+
+        Raises
+        ------
+        RuntimeError
+            if libsumo is not installed or already in use, see available
+        """
+        global _active_connection
+        if not available():
+            raise RuntimeError("libsumo is not installed or already in use")
+
+        libsumo.start(sumo_call)
+        _active_connection = self
+
+        for domain in DOMAINS:
+            if hasattr(libsumo, domain):
+                setattr(self, domain,
+                        _LibsumoDomain(getattr(libsumo, domain)))
+        self.simulation = _LibsumoDomain(libsumo.simulation, object_id="")
+
+    def simulationStep(self, step=0.):
+        """Perform a simulation step."""
+        libsumo.simulationStep(step)
+
+    def setOrder(self, order):
+        """Do nothing, as no other client can connect to libsumo."""
+        pass
+
+    def close(self, wait=True):
+        """Close the simulation, allowing libsumo to be used again."""
+        global _active_connection
+        if _active_connection is self:
+            _active_connection = None
+            libsumo.close()
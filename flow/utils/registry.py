@@ -56,55 +56,84 @@ def make_create_env(params, version=0, render=None):
     str
         name of the created gym environment
     """
-    exp_tag = params["exp_tag"]
-
     env_name = params["env_name"] + '-v{}'.format(version)
 
-    module = __import__("flow.scenarios", fromlist=[params["scenario"]])
-    scenario_class = getattr(module, params["scenario"])
-
-    env_params = params['env']
-    net_params = params['net']
-    initial_config = params.get('initial', InitialConfig())
-    traffic_lights = params.get("tls", TrafficLightParams())
-
     def create_env(*_):
-        sim_params = deepcopy(params['sim'])
-        vehicles = deepcopy(params['veh'])
-
-        scenario = scenario_class(
-            name=exp_tag,
-            vehicles=vehicles,
-            net_params=net_params,
-            initial_config=initial_config,
-            traffic_lights=traffic_lights,
-        )
-
-        if render is not None:
-            sim_params.render = render
-
-        # check if the environment is a single or multiagent environment, and
-        # get the right address accordingly
-        single_agent_envs = [env for env in dir(flow.envs)
-                             if not env.startswith('__')]
-
-        if params['env_name'] in single_agent_envs:
-            env_loc = 'flow.envs'
-        else:
-            env_loc = 'flow.multiagent_envs'
-
-        try:
-            register(
-                id=env_name,
-                entry_point=env_loc + ':{}'.format(params["env_name"]),
-                kwargs={
-                    "env_params": env_params,
-                    "sim_params": sim_params,
-                    "scenario": scenario,
-                    "simulator": params['simulator']
-                })
-        except Exception:
-            pass
-        return gym.envs.make(env_name)
+        # the simulation parameters and vehicles are modified by the
+        # environment, and are accordingly copied for every environment
+        copied_params = dict(params,
+                             sim=deepcopy(params['sim']),
+                             veh=deepcopy(params['veh']))
+        return make_env(copied_params, render, env_id=env_name)
 
     return create_env, env_name
+
+
+def make_env(params, render=None, env_id=None):
+    """Create a flow environment from flow-related parameters.
+
+    Parameters
+    ----------
+    params : dict
+        flow-related parameters, see make_create_env. The environment uses
+        (and may modify) the objects in params, which should accordingly be
+        copies if params are used to create other environments.
+    render : bool, optional
+        specifies whether to use the gui during execution. This overrides
+        the render attribute in SumoParams
+    env_id : str, optional
+        id the environment is registered under in the gym registry, and
+        created from. If an environment is already registered under this id,
+        the parameters it was registered with are used instead of params. If
+        not specified, the environment is created directly, without going
+        through the gym registry.
+
+    Returns
+    -------
+    flow.envs.Env or flow.multiagent_envs.MultiEnv
+        the environment
+    """
+    module = __import__("flow.scenarios", fromlist=[params["scenario"]])
+    scenario_class = getattr(module, params["scenario"])
+
+    sim_params = params['sim']
+    if render is not None:
+        sim_params.render = render
+
+    scenario = scenario_class(
+        name=params["exp_tag"],
+        vehicles=params['veh'],
+        net_params=params['net'],
+        initial_config=params.get('initial', InitialConfig()),
+        traffic_lights=params.get("tls", TrafficLightParams()),
+    )
+
+    # check if the environment is a single or multiagent environment, and
+    # get the right address accordingly
+    single_agent_envs = [env for env in dir(flow.envs)
+                         if not env.startswith('__')]
+
+    if params['env_name'] in single_agent_envs:
+        env_loc = 'flow.envs'
+    else:
+        env_loc = 'flow.multiagent_envs'
+
+    kwargs = {
+        "env_params": params['env'],
+        "sim_params": sim_params,
+        "scenario": scenario,
+        "simulator": params['simulator']
+    }
+
+    if env_id is None:
+        module = __import__(env_loc, fromlist=[params["env_name"]])
+        return getattr(module, params["env_name"])(**kwargs)
+
+    try:
+        register(
+            id=env_id,
+            entry_point=env_loc + ':{}'.format(params["env_name"]),
+            kwargs=kwargs)
+    except Exception:
+        pass
+    return gym.envs.make(env_id)
@@ -110,7 +110,8 @@ def get_flow_params(config):
 
     # convert all parameters from dict to their object form
     sim = SumoParams()  # TODO: add check for simulation type
-    sim.__dict__ = flow_params["sim"].copy()
+    # parameters missing from older configuration files keep their defaults
+    sim.__dict__.update(flow_params["sim"])
 
     net = NetParams()
     net.__dict__ = flow_params["net"].copy()
@@ -0,0 +1,514 @@
+"""Utilities for pipelining several TraCI commands into a single message.
+
+The TraCI protocol allows a client to send several commands in one message,
+to which the server replies with the status (and potential response) of every
+command in a single message as well. The python TraCI client, however, sends
+every command as a separate message and waits for its reply, which results in
+one socket round trip per command.
+
+The methods in this file build the messages for several commands at once and
+send them to the server with a single round trip, and allow requesting a
+simulation step without waiting for the reply. They rely on a few internal
+attributes of ``traci.connection.Connection`` (the socket and the methods used
+to read replies); if these are not available (e.g. when using libsumo), all
+commands are instead issued one by one via the regular API.
+"""
+
+import struct
+
+import traci.constants as tc
+from traci.exceptions import FatalTraCIError, TraCIException
+
+# end time of subscriptions, in seconds (i.e. until the end of the simulation)
+SUBSCRIPTION_END = 2 ** 31 - 1
+
+
+def _typed_int(value):
+    return struct.pack('!Bi', tc.TYPE_INTEGER, int(value))
+
+
+def _typed_double(value):
+    return struct.pack('!Bd', tc.TYPE_DOUBLE, float(value))
+
+
+def _typed_string_list(values):
+    if isinstance(values, str):
+        values = [values]
+    encoded = struct.pack('!Bi', tc.TYPE_STRINGLIST, len(values))
+    for value in values:
+        value = value.encode('latin1')
+        encoded += struct.pack('!i', len(value)) + value
+    return encoded
+
+
+def _typed_color(color):
+    if len(color) == 3:
+        color = tuple(color) + (255,)
+    return struct.pack('!BBBBB', tc.TYPE_COLOR, *[int(c) for c in color])
+
+
+def _compound(*items):
+    return struct.pack('!Bi', tc.TYPE_COMPOUND, len(items)) + b''.join(items)
+
+
+#: Key = (domain, method) of the TraCI API
+#: Element = (command id, variable id, function encoding the arguments)
+SET_COMMANDS = {
+    ('vehicle', 'setSpeedMode'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.VAR_SPEEDSETMODE,
+        lambda mode: _typed_int(mode)),
+    ('vehicle', 'setLaneChangeMode'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.VAR_LANECHANGE_MODE,
+        lambda mode: _typed_int(mode)),
+    ('vehicle', 'slowDown'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.CMD_SLOWDOWN,
+        lambda speed, duration: _compound(
+            _typed_double(speed), _typed_double(duration))),
+    ('vehicle', 'changeLane'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.CMD_CHANGELANE,
+        lambda lane, duration: _compound(
+            struct.pack('!Bb', tc.TYPE_BYTE, int(lane)),
+            _typed_double(duration))),
+    ('vehicle', 'setRoute'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.VAR_ROUTE,
+        lambda edges: _typed_string_list(edges)),
+    ('vehicle', 'setColor'): (
+        tc.CMD_SET_VEHICLE_VARIABLE, tc.VAR_COLOR,
+        lambda color: _typed_color(color)),
+}
+
+#: Key = domain of the TraCI API
+#: Element = command id used to subscribe to variables of objects of the
+#:           domain
+SUBSCRIBE_COMMANDS = {
+    'vehicle': tc.CMD_SUBSCRIBE_VEHICLE_VARIABLE,
+    'trafficlight': tc.CMD_SUBSCRIBE_TL_VARIABLE,
+    'edge': tc.CMD_SUBSCRIBE_EDGE_VARIABLE,
+}
+
+#: Key = domain of the TraCI API
+#: Element = dict with, for every variable that can be named in a
+#:           flow.core.params.SubscriptionProfile, the variable id and the
+#:           name of the TraCI method returning its value
+SUBSCRIPTION_VARIABLES = {
+    'vehicle': {
+        'speed': (tc.VAR_SPEED, 'getSpeed'),
+        'position': (tc.VAR_LANEPOSITION, 'getLanePosition'),
+        'edge': (tc.VAR_ROAD_ID, 'getRoadID'),
+        'lane': (tc.VAR_LANE_INDEX, 'getLaneIndex'),
+        'route': (tc.VAR_EDGES, 'getRoute'),
+        'world_position': (tc.VAR_POSITION, 'getPosition'),
+        'angle': (tc.VAR_ANGLE, 'getAngle'),
+        'default_speed': (tc.VAR_SPEED_WITHOUT_TRACI, 'getSpeedWithoutTraCI'),
+        'leader': (tc.VAR_LEADER, 'getLeader'),
+        'acceleration': (tc.VAR_ACCELERATION, 'getAcceleration'),
+        'waiting_time': (tc.VAR_WAITING_TIME, 'getWaitingTime'),
+        'co2_emission': (tc.VAR_CO2EMISSION, 'getCO2Emission'),
+        'fuel_consumption': (tc.VAR_FUELCONSUMPTION, 'getFuelConsumption'),
+        'distance': (tc.VAR_DISTANCE, 'getDistance'),
+    },
+    'trafficlight': {
+        'state': (tc.TL_RED_YELLOW_GREEN_STATE, 'getRedYellowGreenState'),
+        'phase': (tc.TL_CURRENT_PHASE, 'getPhase'),
+        'program': (tc.TL_CURRENT_PROGRAM, 'getProgram'),
+        'next_switch': (tc.TL_NEXT_SWITCH, 'getNextSwitch'),
+    },
+    'edge': {
+        'mean_speed': (tc.LAST_STEP_MEAN_SPEED, 'getLastStepMeanSpeed'),
+        'vehicle_number': (tc.LAST_STEP_VEHICLE_NUMBER,
+                           'getLastStepVehicleNumber'),
+        'halting_number': (tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+                           'getLastStepHaltingNumber'),
+        'occupancy': (tc.LAST_STEP_OCCUPANCY, 'getLastStepOccupancy'),
+        'waiting_time': (tc.VAR_WAITING_TIME, 'getWaitingTime'),
+        'travel_time': (tc.VAR_CURRENT_TRAVELTIME, 'getTraveltime'),
+    },
+    'simulation': {
+        'departed_ids': (tc.VAR_DEPARTED_VEHICLES_IDS, 'getDepartedIDList'),
+        'arrived_ids': (tc.VAR_ARRIVED_VEHICLES_IDS, 'getArrivedIDList'),
+        'teleport_starting_ids': (tc.VAR_TELEPORT_STARTING_VEHICLES_IDS,
+                                  'getStartingTeleportIDList'),
+        'time_step': (tc.VAR_TIME_STEP, 'getCurrentTime'),
+        'delta_t': (tc.VAR_DELTA_T, 'getDeltaT'),
+        'colliding_ids': (tc.VAR_COLLIDING_VEHICLES_IDS,
+                          'getCollidingVehiclesIDList'),
+        'min_expected_number': (tc.VAR_MIN_EXPECTED_VEHICLES,
+                                'getMinExpectedNumber'),
+    },
+}
+
+
+def subscription_variables(domain, names):
+    """Return the ids of named variables that can be subscribed to.
+
+    Parameters
+    ----------
+    domain : str
+        TraCI domain of the variables, e.g. "vehicle"
+    names : list of str
+        names of the variables, see SUBSCRIPTION_VARIABLES. Duplicates are
+        only returned once.
+
+    Returns
+    -------
+    list of int
+        variable ids, in the order of their names
+
+    Raises
+    ------
+    ValueError
+        if any of the names is not a known variable of the domain
+    """
+    variables = SUBSCRIPTION_VARIABLES[domain]
+    var_ids = []
+    for name in names:
+        if name not in variables:
+            raise ValueError(
+                'Cannot subscribe to the {} variable "{}", must be one of: {}'
+                .format(domain, name, ', '.join(sorted(variables))))
+        var_id = variables[name][0]
+        if var_id not in var_ids:
+            var_ids.append(var_id)
+    return var_ids
+
+
+def get_variable(connection, domain, name, obj_id=None):
+    """Request the value of a named variable of an object from the server.
+
+    This is used for variables that are not subscribed to.
+
+    Parameters
+    ----------
+    connection : traci.connection.Connection or module
+        the TraCI connection (or libsumo module)
+    domain : str
+        TraCI domain of the object, e.g. "vehicle"
+    name : str
+        name of the variable, see SUBSCRIPTION_VARIABLES
+    obj_id : str, optional
+        id of the object, not needed for variables of the simulation
+
+    Returns
+    -------
+    any
+        value of the variable
+    """
+    method = getattr(getattr(connection, domain),
+                     SUBSCRIPTION_VARIABLES[domain][name][1])
+    if obj_id is None:
+        return method()
+    return method(obj_id)
+
+
+def supports_pipelining(connection):
+    """Return whether several commands can be sent to the connection at once.
+
+    Parameters
+    ----------
+    connection : traci.connection.Connection or module
+        the TraCI connection (or libsumo module)
+
+    Returns
+    -------
+    bool
+        True if the connection is a socket-based TraCI connection
+    """
+    return all(hasattr(connection, attr) for attr in
+               ('_socket', '_recvExact', '_readSubscription'))
+
+
+def _message(cmd_id, body):
+    """Prepend the length and command id to the body of a command."""
+    length = 1 + 1 + len(body)
+    if length <= 255:
+        return struct.pack('!BB', length, cmd_id) + body
+    return struct.pack('!BiB', 0, length + 4, cmd_id) + body
+
+
+def _object_id(obj_id):
+    obj_id = obj_id.encode('latin1')
+    return struct.pack('!i', len(obj_id)) + obj_id
+
+
+def _send(connection, message):
+    """Send a message to the TraCI server, without reading its reply."""
+    if connection._socket is None:
+        raise FatalTraCIError('Connection already closed.')
+    connection._socket.send(struct.pack('!i', len(message) + 4) + message)
+
+
+def _receive(connection):
+    """Read the reply of the TraCI server to the last message."""
+    result = connection._recvExact()
+    if not result:
+        raise FatalTraCIError('Connection closed by SUMO.')
+    return result
+
+
+def _exchange(connection, message):
+    """Send a message to the TraCI server and return its reply."""
+    _send(connection, message)
+    return _receive(connection)
+
+
+def _read_status(result):
+    """Read the status of a command from a reply.
+
+    Returns
+    -------
+    str or None
+        the error message if the command failed, None otherwise
+    """
+    _, _, status = result.read('!BBB')
+    description = result.readString()
+    if status or description:
+        return description or 'TraCI command failed with status {}'.format(
+            status)
+    return None
+
+
+def subscribe(connection, domain, obj_ids, var_ids, parameters=None,
+              pipelined=None):
+    """Subscribe to the same variables of several objects at once.
+
+    The subscription results (which include the current values of the
+    variables) are stored by the connection, and are accordingly available
+    through ``getSubscriptionResults`` after this method returns.
+
+    Parameters
+    ----------
+    connection : traci.connection.Connection or module
+        the TraCI connection (or libsumo module)
+    domain : str
+        TraCI domain of the objects, e.g. "vehicle"
+    obj_ids : list of str
+        ids of the objects
+    var_ids : list of int
+        variables to subscribe to
+    parameters : dict < int, float >, optional
+        additional parameter of some variables, for example the maximum
+        distance when subscribing to tc.VAR_LEADER
+    pipelined : bool, optional
+        whether the subscriptions should be sent in a single message. Defaults
+        to True if the connection supports it.
+
+    Raises
+    ------
+    traci.exceptions.TraCIException
+        if the server rejected any of the subscriptions. The remaining
+        subscriptions are still performed.
+    """
+    parameters = parameters or {}
+    if len(obj_ids) == 0:
+        return
+
+    if pipelined is None:
+        pipelined = supports_pipelining(connection)
+
+    if not pipelined:
+        api = getattr(connection, domain)
+        plain_var_ids = [var for var in var_ids if var not in parameters]
+        for obj_id in obj_ids:
+            api.subscribe(obj_id, plain_var_ids)
+            if tc.VAR_LEADER in var_ids:
+                api.subscribeLeader(obj_id, parameters[tc.VAR_LEADER])
+        return
+
+    # all subscriptions share the same list of variables
+    variables = struct.pack('!B', len(var_ids))
+    for var in var_ids:
+        variables += struct.pack('!B', var)
+        if var in parameters:
+            variables += _typed_double(parameters[var])
+
+    cmd_id = SUBSCRIBE_COMMANDS[domain]
+    begin_end = struct.pack('!dd', 0, SUBSCRIPTION_END)
+    message = b''.join(
+        _message(cmd_id, begin_end + _object_id(obj_id) + variables)
+        for obj_id in obj_ids)
+
+    result = _exchange(connection, message)
+    error = None
+    for _ in obj_ids:
+        description = _read_status(result)
+        if description is not None:
+            error = error or TraCIException(description)
+            continue
+        connection._readSubscription(result)
+
+    if error is not None:
+        raise error
+
+
+def send_simulation_step(connection, step=0.):
+    """Request a simulation step from the server, without waiting for it.
+
+    The server computes the step while the caller continues. The reply must
+    then be read with `receive_simulation_step` before any other command is
+    sent to the server.
+
+    Parameters
+    ----------
+    connection : traci.connection.Connection or module
+        the TraCI connection (or libsumo module)
+    step : float, optional
+        simulation time to advance to, in seconds. If 0, exactly one step is
+        performed (see traci.simulationStep)
+
+    Returns
+    -------
+    bool
+        True if the reply is pending. If the connection does not support
+        deferred replies (e.g. when using libsumo), the step is performed
+        before this method returns, and False is returned.
+    """
+    if not supports_pipelining(connection):
+        connection.simulationStep(step)
+        return False
+
+    _send(connection, _message(tc.CMD_SIMSTEP, struct.pack('!d', step)))
+    return True
+
+
+def receive_simulation_step(connection, step=0.):
+    """Wait for the reply to a step requested with `send_simulation_step`.
+
+    The subscription results included in the reply are stored by the
+    connection, as is done by traci.simulationStep.
+
+    Parameters
+    ----------
+    connection : traci.connection.Connection
+        the TraCI connection
+    step : float, optional
+        the simulation time passed to `send_simulation_step`
+
+    Raises
+    ------
+    traci.exceptions.TraCIException
+        if the server failed to perform the step
+    """
+    result = _receive(connection)
+    description = _read_status(result)
+    if description is not None:
+        raise TraCIException(description)
+
+    for subscription_results in connection._subscriptionMapping.values():
+        subscription_results.reset()
+    for _ in range(result.readInt()):
+        connection._readSubscription(result)
+    connection._manageStepListeners(step)
+
+
+class TraCICommandBuffer(object):
+    """Buffer of TraCI commands sent together in a single message.
+
+    Commands that do not return any values (e.g. setting the speed mode of a
+    vehicle) are queued via the `queue` method, and are only sent to the
+    server once `flush` is called, all in a single message.
+
+    Usage
+    -----
+        >>> buffer = TraCICommandBuffer(connection)
+        >>> buffer.queue('vehicle', 'setSpeedMode', 'human_0', 31)
+        >>> buffer.queue('vehicle', 'setLaneChangeMode', 'human_0', 512)
+        >>> buffer.flush()  # one round trip
+
+    Attributes
+    ----------
+    connection : traci.connection.Connection or module
+        the TraCI connection (or libsumo module) the commands are sent to
+    pipelined : bool
+        whether commands are sent in a single message. If set to False, the
+        commands are issued one by one through the TraCI API during `flush`.
+    """
+
+    def __init__(self, connection, pipelined=None):
+        """Instantiate the command buffer.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection or module
+            the TraCI connection (or libsumo module)
+        pipelined : bool, optional
+            whether commands should be sent in a single message. Defaults to
+            True if the connection supports it.
+        """
+        self.connection = connection
+        if pipelined is None:
+            pipelined = supports_pipelining(connection)
+        self.pipelined = pipelined
+        self._commands = []
+
+    def __len__(self):
+        """Return the number of queued commands."""
+        return len(self._commands)
+
+    def queue(self, domain, method, obj_id, *args, ignore_errors=False):
+        """Queue a command.
+
+        Parameters
+        ----------
+        domain : str
+            TraCI domain of the command, e.g. "vehicle"
+        method : str
+            name of the method in the TraCI domain, e.g. "setSpeedMode"
+        obj_id : str
+            id of the object the command is applied to
+        args : list
+            remaining arguments of the TraCI method
+        ignore_errors : bool, optional
+            whether errors returned by the server for this command should be
+            ignored (e.g. for purely visual commands)
+        """
+        if (domain, method) not in SET_COMMANDS:
+            raise ValueError('Cannot buffer the TraCI command {}.{}'.format(
+                domain, method))
+        self._commands.append((domain, method, obj_id, args, ignore_errors))
+
+    def discard(self, obj_id):
+        """Remove all queued commands applied to a specific object."""
+        self._commands = [command for command in self._commands
+                          if command[2] != obj_id]
+
+    def clear(self):
+        """Remove all queued commands."""
+        self._commands = []
+
+    def flush(self):
+        """Send all queued commands to the server.
+
+        Raises
+        ------
+        traci.exceptions.TraCIException
+            if the server returned an error for any command whose errors are
+            not ignored. All other queued commands are still performed.
+        """
+        if len(self._commands) == 0:
+            return
+        commands, self._commands = self._commands, []
+
+        error = None
+        if self.pipelined:
+            message = b''
+            for domain, method, obj_id, args, _ in commands:
+                cmd_id, var_id, encode = SET_COMMANDS[domain, method]
+                message += _message(cmd_id, struct.pack('!B', var_id)
+                                    + _object_id(obj_id) + encode(*args))
+
+            result = _exchange(self.connection, message)
+            for command in commands:
+                description = _read_status(result)
+                if description is not None and not command[4]:
+                    error = error or TraCIException(description)
+        else:
+            for domain, method, obj_id, args, ignore_errors in commands:
+                try:
+                    getattr(getattr(self.connection, domain), method)(
+                        obj_id, *args)
+                except TraCIException as e:
+                    if not ignore_errors:
+                        error = error or e
+
+        if error is not None:
+            raise error
@@ -1,8 +1,9 @@
 import unittest
 
 from flow.core.params import SumoParams, EnvParams, InitialConfig, \
-    NetParams, SumoCarFollowingParams
+    NetParams, SumoCarFollowingParams, InFlows
 from flow.core.params import VehicleParams
+from flow.scenarios.highway import ADDITIONAL_NET_PARAMS as HIGHWAY_PARAMS
 
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import IDMController
@@ -10,6 +11,23 @@ from flow.controllers import RLController
 from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
 from flow.utils.exceptions import FatalFlowError
 from flow.envs import Env, TestEnv
+from flow.envs.vector_env import FlowVectorEnv, FlowSubprocVectorEnv
+from flow.benchmarks import figureeight0
+from flow.core.kernel import Kernel
+from flow.core.kernel.simulation.traci import connect_when_ready, \
+    TraCISimulation
+from flow.utils import libsumo_connection
+from traci.exceptions import FatalTraCIError, TraCIException
+import traci.exceptions
+import sumolib
+import asyncio
+import shutil
+from copy import deepcopy
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
 
 from tests.setup_scripts import ring_road_exp_setup, highway_exp_setup
 import os
@@ -300,6 +318,481 @@ class TestSimsPerStep(unittest.TestCase):
         self.assertEqual(t2 - t1, sims_per_step)
 
 
+class TestBatchSubsteps(unittest.TestCase):
+    """Ensures that the simulation steps of a rollout step are advanced at once
+    when using flow.core.params.EnvParams.batch_substeps"""
+
+    def setUp(self):
+        # vehicles entering a highway that are fully controlled by sumo
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="human", num_vehicles=0)
+        inflows = InFlows()
+        inflows.add(veh_type="human", edge="highway_0", vehs_per_hour=7200,
+                    departLane="free", departSpeed="max")
+        net_params = NetParams(
+            inflows=inflows, additional_params=HIGHWAY_PARAMS.copy())
+        env_params = EnvParams(sims_per_step=10, batch_substeps=True,
+                               additional_params=ADDITIONAL_ENV_PARAMS)
+        self.env, _ = highway_exp_setup(
+            vehicles=vehicles, env_params=env_params, net_params=net_params)
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_batch(self):
+        env = self.env
+        env.reset()
+        self.assertEqual(env._substep_batch_size(), 10)
+
+        num_departed = 0
+        num_arrived = 0
+        for i in range(30):
+            env.step(rl_actions=[])
+            self.assertEqual(env.time_counter, 10 * (i + 1))
+            num_departed += len(env.k.vehicle.get_departed_ids())
+            num_arrived += len(env.k.vehicle.get_arrived_ids())
+
+            # the kernel matches the vehicles in the network
+            self.assertListEqual(
+                sorted(env.k.vehicle.get_ids()),
+                sorted(env.k.kernel_api.vehicle.getIDList()))
+
+        # the vehicles that entered and exited in every simulation step are
+        # accounted for
+        self.assertGreater(num_departed, 30)
+        self.assertEqual(num_departed - num_arrived,
+                         len(env.k.kernel_api.vehicle.getIDList()))
+
+    def test_not_batchable(self):
+        # flow-controlled vehicles act at every simulation step
+        env_params = EnvParams(sims_per_step=10, batch_substeps=True,
+                               additional_params=ADDITIONAL_ENV_PARAMS)
+        env, _ = ring_road_exp_setup(env_params=env_params)
+        self.assertEqual(env._substep_batch_size(), 1)
+        env.terminate()
+
+
+class TestStepAsync(unittest.TestCase):
+    """Tests advancing the environment without waiting for the simulator with
+    step_async, step_wait, and astep."""
+
+    def setUp(self):
+        # two identical environments, advanced synchronously and not
+        env_params = EnvParams(
+            sims_per_step=2, additional_params=ADDITIONAL_ENV_PARAMS)
+        self.env1, _ = ring_road_exp_setup(env_params=env_params)
+        self.env2, _ = ring_road_exp_setup(env_params=env_params)
+
+    def tearDown(self):
+        self.env1.terminate()
+        self.env2.terminate()
+
+    def test_step_async(self):
+        self.env1.reset()
+        self.env2.reset()
+        for _ in range(10):
+            obs1, reward1, done1, _ = self.env1.step(rl_actions=None)
+            self.env2.step_async(rl_actions=None)
+            obs2, reward2, done2, _ = self.env2.step_wait()
+
+            np.testing.assert_array_almost_equal(obs1, obs2)
+            self.assertAlmostEqual(reward1, reward2)
+            self.assertEqual(done1, done2)
+        self.assertEqual(self.env2.time_counter, 20)
+
+    def test_astep(self):
+        self.env1.reset()
+        self.env2.reset()
+
+        async def rollout():
+            # both environments are advanced concurrently
+            for _ in range(10):
+                results = await asyncio.gather(
+                    self.env1.astep(rl_actions=None),
+                    self.env2.astep(rl_actions=None))
+                np.testing.assert_array_almost_equal(
+                    results[0][0], results[1][0])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(rollout())
+        finally:
+            loop.close()
+        self.assertEqual(self.env1.time_counter, 20)
+        self.assertEqual(self.env2.time_counter, 20)
+
+
+class TestProfiling(unittest.TestCase):
+    """Tests timing the phases of steps and resets when using
+    flow.core.params.EnvParams.profile"""
+
+    def test_profile(self):
+        env_params = EnvParams(
+            horizon=5, warmup_steps=2, profile=True,
+            additional_params=ADDITIONAL_ENV_PARAMS)
+        env, _ = ring_road_exp_setup(env_params=env_params)
+        env.reset()
+        for _ in range(5):
+            _, _, done, info = env.step(rl_actions=None)
+        self.assertTrue(done)
+
+        # the statistics of the phases are reported at the end of the rollout
+        profile = info["profile"]
+        for phase in ["reset", "warmup", "step", "controllers", "routing",
+                      "simulation_step", "simulation_wait", "kernel_update",
+                      "multi_lane_headways", "get_state", "compute_reward"]:
+            self.assertIn(phase, profile)
+        self.assertEqual(profile["step"]["count"], 7)
+        self.assertEqual(profile["reset"]["count"], 1)
+
+        # the statistics are logged rather than printed on termination
+        with self.assertLogs(level="INFO") as logs:
+            env.terminate()
+        self.assertIn("compute_reward", "\n".join(logs.output))
+
+    def test_disabled(self):
+        env, _ = ring_road_exp_setup()
+        self.assertIsNone(env.profiler)
+        env.reset()
+        _, _, _, info = env.step(rl_actions=None)
+        self.assertNotIn("profile", info)
+        env.terminate()
+
+
+class TestSnapshotReset(unittest.TestCase):
+    """Tests resetting from the states saved when using
+    flow.core.params.SumoParams.snapshot_reset"""
+
+    def setUp(self):
+        env_params = EnvParams(
+            warmup_steps=5, additional_params=ADDITIONAL_ENV_PARAMS)
+        sim_params = SumoParams(snapshot_reset=True, snapshot_warmup=True)
+        self.env, _ = ring_road_exp_setup(
+            sim_params=sim_params, env_params=env_params)
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_reset(self):
+        env = self.env
+
+        # the first reset saves the states of the simulation
+        obs1 = env.reset()
+        self.assertEqual(sorted(env._reset_snapshots), ["initial", "warmup"])
+        ids = env.k.vehicle.get_ids()
+        pos1 = env.k.vehicle.get_x_by_id(ids)
+        vel1 = env.k.vehicle.get_speed(ids)
+
+        for _ in range(20):
+            env.step(rl_actions=None)
+
+        # later resets restore the state at the end of the warm-up steps
+        obs2 = env.reset()
+        self.assertEqual(env.time_counter, 5)
+        np.testing.assert_array_almost_equal(obs1, obs2)
+        self.assertListEqual(sorted(env.k.vehicle.get_ids()), sorted(ids))
+        np.testing.assert_array_almost_equal(
+            env.k.vehicle.get_x_by_id(ids), pos1)
+        np.testing.assert_array_almost_equal(
+            env.k.vehicle.get_speed(ids), vel1)
+
+        # the vehicles are subscribed to again after the state is loaded
+        env.step(rl_actions=None)
+        self.assertEqual(env.k.vehicle.num_vehicles, len(ids))
+
+
+class TestWarmupCache(unittest.TestCase):
+    """Tests sharing the states after warm-up between environments when using
+    flow.core.params.SumoParams.warmup_cache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _env(self):
+        env_params = EnvParams(
+            warmup_steps=20, additional_params=ADDITIONAL_ENV_PARAMS)
+        sim_params = SumoParams(warmup_cache=True,
+                                warmup_cache_dir=self.cache_dir)
+        env, _ = ring_road_exp_setup(
+            sim_params=sim_params, env_params=env_params)
+        return env
+
+    def test_shared(self):
+        # the first environment performs the warm-up steps
+        env1 = self._env()
+        obs1 = env1.reset()
+        self.assertEqual(env1.time_counter, 20)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        env1.terminate()
+
+        # the second environment loads their final state
+        env2 = self._env()
+        env2.step = None  # steps may not be performed during the reset
+        obs2 = env2.reset()
+        self.assertEqual(env2.time_counter, 20)
+        np.testing.assert_array_almost_equal(obs1, obs2)
+        env2.terminate()
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Tests restoring the environment to a checkpoint mid-rollout."""
+
+    def setUp(self):
+        self.env, _ = ring_road_exp_setup()
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_branching(self):
+        env = self.env
+        env.reset()
+        for _ in range(10):
+            env.step(rl_actions=None)
+
+        token = env.checkpoint()
+        ids = env.k.vehicle.get_ids()
+        pos = env.k.vehicle.get_x_by_id(ids)
+
+        # two branches starting from the checkpoint follow the same
+        # trajectory, since the vehicles are deterministic
+        trajectories = []
+        for _ in range(2):
+            obs = env.restore(token)
+            self.assertEqual(env.time_counter, 10)
+            np.testing.assert_array_almost_equal(
+                env.k.vehicle.get_x_by_id(ids), pos)
+            np.testing.assert_array_almost_equal(obs, env.get_state())
+
+            for _ in range(10):
+                env.step(rl_actions=None)
+            trajectories.append(env.k.vehicle.get_x_by_id(ids))
+
+        np.testing.assert_array_almost_equal(*trajectories)
+        self.assertEqual(env.time_counter, 20)
+
+        # the states of sumo are held by the checkpoints rather than left in
+        # files until the simulation is closed
+        self.assertListEqual(os.listdir(env.k.simulation._state_dir), [])
+
+    def test_unknown_token(self):
+        self.env.reset()
+        self.assertRaises(KeyError, self.env.restore, 1234)
+
+
+class TestFlowVectorEnv(unittest.TestCase):
+    """Tests stepping several environments concurrently with
+    flow.envs.vector_env.FlowVectorEnv."""
+
+    def setUp(self):
+        flow_params = deepcopy(figureeight0.flow_params)
+        flow_params["env"].horizon = 5
+        self.env = FlowVectorEnv(flow_params, num_envs=2)
+
+    def tearDown(self):
+        self.env.close()
+        self.env = None
+
+    def test_step(self):
+        env = self.env
+        obs = env.reset()
+        self.assertEqual(obs.shape, (2,) + env.observation_space.shape)
+
+        actions = [env.action_space.sample() for _ in range(env.num_envs)]
+        for _ in range(4):
+            obs, rewards, dones, infos = env.step(actions)
+            self.assertEqual(obs.shape, (2,) + env.observation_space.shape)
+            self.assertEqual(rewards.shape, (2,))
+            self.assertFalse(any(dones))
+
+        # the environments are reset once their rollouts are done
+        obs, rewards, dones, infos = env.step(actions)
+        self.assertTrue(all(dones))
+        for i, sub_env in enumerate(env.get_unwrapped()):
+            self.assertEqual(sub_env.time_counter, 0)
+            np.testing.assert_array_almost_equal(
+                obs[i], sub_env.get_state())
+            self.assertIn("terminal_observation", infos[i])
+
+    def test_params(self):
+        # every environment is created from its own copy of the parameters,
+        # with its own seed
+        flow_params = deepcopy(figureeight0.flow_params)
+        flow_params["env"].horizon = 7
+        flow_params["sim"].seed = 10
+        env = FlowVectorEnv(flow_params, num_envs=2)
+        try:
+            env1, env2 = env.get_unwrapped()
+            self.assertEqual(env1.sim_params.seed, 10)
+            self.assertEqual(env2.sim_params.seed, 11)
+            self.assertIsNot(env1.sim_params, env2.sim_params)
+            self.assertIsNot(env1.env_params, env2.env_params)
+            self.assertIsNot(env1.scenario, env2.scenario)
+            self.assertEqual(env1.env_params.horizon, 7)
+            self.assertEqual(env2.env_params.horizon, 7)
+        finally:
+            env.close()
+
+        # the parameters of the other vectorized environment are not reused
+        for sub_env in self.env.get_unwrapped():
+            self.assertEqual(sub_env.env_params.horizon, 5)
+            self.assertIsNone(sub_env.sim_params.seed)
+
+    def test_vector_step(self):
+        env = self.env
+        env.vector_reset()
+
+        actions = [env.action_space.sample() for _ in range(env.num_envs)]
+        for _ in range(5):
+            obs, rewards, dones, infos = env.vector_step(actions)
+        self.assertEqual(len(obs), 2)
+
+        # the environments are left to be reset by the caller
+        self.assertTrue(all(dones))
+        for sub_env in env.get_unwrapped():
+            self.assertEqual(sub_env.time_counter, 5)
+        env.reset_at(0)
+        self.assertEqual(env.get_unwrapped()[0].time_counter, 0)
+        self.assertEqual(env.get_unwrapped()[1].time_counter, 5)
+
+
+class TestFlowSubprocVectorEnv(unittest.TestCase):
+    """Tests stepping environments in worker processes with
+    flow.envs.vector_env.FlowSubprocVectorEnv."""
+
+    def setUp(self):
+        flow_params = deepcopy(figureeight0.flow_params)
+        flow_params["env"].horizon = 5
+        self.env = FlowSubprocVectorEnv(flow_params, num_envs=2)
+
+    def tearDown(self):
+        self.env.close()
+        self.env = None
+
+    def test_step(self):
+        env = self.env
+        obs = env.reset()
+        self.assertEqual(obs.shape, (2,) + env.observation_space.shape)
+
+        actions = [env.action_space.sample() for _ in range(env.num_envs)]
+        for _ in range(4):
+            obs, rewards, dones, infos = env.step(actions)
+            self.assertEqual(obs.shape, (2,) + env.observation_space.shape)
+            self.assertEqual(rewards.shape, (2,))
+            self.assertFalse(any(dones))
+
+        # the environments are reset once their rollouts are done
+        obs, rewards, dones, infos = env.step(actions)
+        self.assertTrue(all(dones))
+        for i in range(env.num_envs):
+            self.assertEqual(infos[i]["terminal_observation"].shape,
+                             env.observation_space.shape)
+
+        self.assertEqual(env.reset_at(0).shape, env.observation_space.shape)
+
+    def test_errors(self):
+        # errors in the worker processes are raised in the main process
+        env = self.env
+        env.reset()
+        self.assertRaises(FatalFlowError, env.step, [["a"], ["a"]])
+
+        # the replies of the workers that did not fail are not mistaken for
+        # the results of the next command
+        self.assertRaises(FatalFlowError, env.step,
+                          [env.action_space.sample(), ["a"]])
+        for obs in env.vector_reset():
+            self.assertEqual(obs.shape, env.observation_space.shape)
+
+
+class TestSumoPool(unittest.TestCase):
+    """Tests starting simulations from the pool of sumo instances launched in
+    advance, see flow.core.params.SumoParams.sumo_pool_size. The sumo
+    processes and the connections to them are mocked."""
+
+    def setUp(self):
+        self.simulation = Kernel("traci", SumoParams()).simulation
+        self.sim_params = SumoParams(sumo_pool_size=1)
+        self.scenario = mock.Mock(cfg="test.sumo.cfg")
+        self.sumo_call = tuple(
+            self.simulation._sumo_call(self.scenario, self.sim_params))
+
+        # the launched processes, the connections, and the killed processes
+        self.procs = []
+        self.connect = mock.Mock()
+        self.kill = mock.Mock()
+        patch = mock.patch.object(TraCISimulation, "_kill", self.kill)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _start_simulation(self):
+        """Start the simulation with mocked sumo processes."""
+        def popen(*args, **kwargs):
+            proc = mock.Mock()
+            self.procs.append(proc)
+            return proc
+
+        module = "flow.core.kernel.simulation.traci"
+        with mock.patch(module + ".subprocess.Popen", side_effect=popen), \
+                mock.patch(module + ".connect_when_ready", self.connect):
+            self.simulation.start_simulation(self.scenario, self.sim_params)
+
+    def test_pooled(self):
+        pooled = mock.Mock()
+        self.simulation._pool.append((self.sumo_call, pooled, 1234))
+        self._start_simulation()
+
+        # the pooled instance is used, and replaced in the pool
+        self.assertIs(self.simulation.sumo_proc, pooled)
+        self.assertEqual(self.sim_params.port, 1234)
+        self.assertEqual(len(self.procs), 1)
+        self.assertListEqual(list(self.simulation._pool),
+                             [(self.sumo_call, self.procs[0], mock.ANY)])
+        self.kill.assert_not_called()
+
+    def test_command_mismatch(self):
+        # instances launched with another configuration are killed, and a new
+        # instance is started instead
+        other = mock.Mock()
+        self.simulation._pool.append((("sumo", "-c", "other.cfg"), other, 1))
+        self._start_simulation()
+
+        self.kill.assert_called_once_with(other)
+        self.assertEqual(len(self.procs), 2)
+        self.assertIs(self.simulation.sumo_proc, self.procs[0])
+        self.assertListEqual(list(self.simulation._pool),
+                             [(self.sumo_call, self.procs[1], mock.ANY)])
+
+    def test_dead_instance(self):
+        # instances that cannot be connected to are killed, and a new
+        # instance is started instead
+        dead = mock.Mock()
+        self.simulation._pool.append((self.sumo_call, dead, 1234))
+        self.connect.side_effect = [FatalTraCIError("dead"), mock.Mock()]
+        with self.assertLogs(level="WARNING"):
+            self._start_simulation()
+
+        self.kill.assert_called_once_with(dead)
+        self.assertIs(self.simulation.sumo_proc, self.procs[0])
+        self.assertEqual(len(self.simulation._pool), 1)
+
+    def test_drain_on_terminate(self):
+        # the pooled instances are killed when the environment is terminated
+        env, _ = ring_road_exp_setup()
+        procs = [mock.Mock(), mock.Mock()]
+        for proc in procs:
+            env.k.simulation._pool.append((self.sumo_call, proc, 1234))
+        env.terminate()
+
+        self.assertListEqual(self.kill.call_args_list,
+                             [mock.call(proc) for proc in procs])
+        self.assertEqual(len(env.k.simulation._pool), 0)
+
+
 class TestAbstractMethods(unittest.TestCase):
     """
     These series of tests are meant to ensure that the environment abstractions
@@ -409,3 +902,94 @@ class TestNotEnoughVehicles(unittest.TestCase):
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class TestConnectWhenReady(unittest.TestCase):
+    """Tests the readiness handshake used to connect to sumo instances."""
+
+    def test_connect(self):
+        # a port that starts listening shortly after the first attempt
+        port = sumolib.miscutils.getFreeSocketPort()
+        server = subprocess.Popen([sys.executable, "-c", (
+            "import socket, time; time.sleep(0.2); s = socket.socket(); "
+            "s.bind(('localhost', {})); s.listen(1); s.accept(); "
+            "time.sleep(1)").format(port)])
+        try:
+            connection = connect_when_ready(port, server, timeout=10)
+            connection._socket.close()
+        finally:
+            server.kill()
+            server.wait()
+
+    def test_process_exited(self):
+        # the handshake stops as soon as the process exits
+        port = sumolib.miscutils.getFreeSocketPort()
+        proc = subprocess.Popen([sys.executable, "-c", "exit(1)"])
+        proc.wait()
+        t = time.time()
+        self.assertRaises(FatalTraCIError, connect_when_ready, port, proc, 10)
+        self.assertLess(time.time() - t, 1)
+
+    def test_timeout(self):
+        port = sumolib.miscutils.getFreeSocketPort()
+        self.assertRaises(
+            FatalTraCIError, connect_when_ready, port, None, 0.1)
+
+
+class TestLibsumoFallback(unittest.TestCase):
+    """Tests that simulations fall back to TraCI if libsumo cannot be used."""
+
+    def setUp(self):
+        self.simulation = Kernel("traci", SumoParams()).simulation
+
+    def test_render(self):
+        sim_params = SumoParams(render=True, use_libsumo=True)
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(
+                self.simulation._start_libsumo(None, sim_params))
+
+    def test_num_clients(self):
+        sim_params = SumoParams(num_clients=2, use_libsumo=True)
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(
+                self.simulation._start_libsumo(None, sim_params))
+
+    def test_unavailable(self):
+        # libsumo is either not installed or used by another simulation
+        sim_params = SumoParams(use_libsumo=True)
+        active = libsumo_connection._active_connection
+        libsumo_connection._active_connection = object()
+        try:
+            self.assertFalse(libsumo_connection.available())
+            with self.assertWarns(UserWarning):
+                self.assertIsNone(
+                    self.simulation._start_libsumo(None, sim_params))
+        finally:
+            libsumo_connection._active_connection = active
+
+    def test_lazy_import(self):
+        # libsumo replaces the exception classes of TraCI when imported, which
+        # are restored so that the errors of socket connections are caught
+        directory = tempfile.mkdtemp()
+        with open(os.path.join(directory, "libsumo.py"), "w") as f:
+            f.write("import traci.exceptions\n"
+                    "class TraCIException(Exception):\n"
+                    "    pass\n"
+                    "traci.exceptions.TraCIException = TraCIException\n")
+        state = (libsumo_connection.libsumo, libsumo_connection._imported)
+        libsumo_connection.libsumo = None
+        libsumo_connection._imported = False
+        sys.path.insert(0, directory)
+        try:
+            self.assertTrue(libsumo_connection.installed())
+            self.assertIs(traci.exceptions.TraCIException, TraCIException)
+        finally:
+            sys.path.remove(directory)
+            sys.modules.pop("libsumo", None)
+            libsumo_connection.libsumo, libsumo_connection._imported = state
+            shutil.rmtree(directory)
+
+    def test_teardown(self):
+        # there is no sumo process to kill when libsumo is used
+        self.simulation.sumo_proc = None
+        self.simulation.teardown_sumo()
@@ -1,5 +1,8 @@
 import unittest
 import os
+import shutil
+import tempfile
+from unittest import mock
 import numpy as np
 
 from flow.core.params import InitialConfig
@@ -9,6 +12,12 @@ from flow.core.params import EnvParams
 from flow.core.params import SumoParams
 from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
 from flow.envs import TestEnv
+from flow.core.kernel.scenario import KernelScenario
+from flow.core.kernel.scenario.lane_graph import LaneGraph
+from flow.core.kernel import Kernel
+from flow.core.kernel.scenario.net_cache import NetworkCache
+from flow.core.kernel.scenario.routing import RoutingEngine
+from flow.core.kernel.scenario.net_file import read_net, SIDECAR_EXTENSION
 
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import IDMController
@@ -61,6 +70,12 @@ class TestGetX(unittest.TestCase):
         pos = 4.72
         self.assertAlmostEqual(self.env.k.scenario.get_x(edge, pos), -1001)
 
+    def test_getx_batch(self):
+        edges = ["bottom", ":bottom", ""]
+        pos = [4.72, 0.1, 4.72]
+        np.testing.assert_array_almost_equal(
+            self.env.k.scenario.get_x(edges, pos), [5, 0.1, -1001])
+
 
 class TestGetEdge(unittest.TestCase):
     """
@@ -90,6 +105,39 @@ class TestGetEdge(unittest.TestCase):
             self.env.k.scenario.get_edge(x2), (":bottom", 0.1))
 
 
+class TestEdgeStartsIndex(unittest.TestCase):
+    """Tests the index of the edge starting positions used by get_edge and
+    get_x, independently of any simulation."""
+
+    def setUp(self):
+        self.scenario = Kernel('traci', SumoParams()).scenario
+        self.scenario.total_edgestarts = [
+            ("bottom", 0), (":bottom_0", 10), ("right", 12), ("top", 22)]
+        self.scenario.total_edgestarts_dict = dict(
+            self.scenario.total_edgestarts)
+        self.scenario.internal_edgestarts_dict = {":bottom_0": 10}
+        self.scenario._index_edgestarts()
+
+    def test_get_edge(self):
+        self.assertEqual(self.scenario.get_edge(0), ("bottom", 0))
+        self.assertEqual(self.scenario.get_edge(11), (":bottom_0", 1))
+        self.assertEqual(self.scenario.get_edge(12), ("right", 0))
+        self.assertEqual(self.scenario.get_edge(30), ("top", 8))
+        self.assertIsNone(self.scenario.get_edge(-1))
+
+    def test_get_x(self):
+        edges = ["top", ":bottom_0", "", ":bottom_0_1", "right"]
+        pos = [1, 1, 5, 5, 2.5]
+        expected = [self.scenario.get_x(e, p) for e, p in zip(edges, pos)]
+        np.testing.assert_array_almost_equal(
+            expected, [23, 11, -1001, 10, 14.5])
+        np.testing.assert_array_almost_equal(
+            self.scenario.get_x(edges, pos), expected)
+        np.testing.assert_array_almost_equal(
+            self.scenario.get_x(np.array(edges), np.array(pos)), expected)
+        self.assertEqual(len(self.scenario.get_x([], [])), 0)
+
+
 class TestEvenStartPos(unittest.TestCase):
     """
     Tests the function gen_even_start_pos in base_scenario.py. This function
@@ -917,5 +965,328 @@ class TestDefaultRoutes(unittest.TestCase):
         )
 
 
+class TwoEdgeLoopKernel(KernelScenario):
+    """A two-edge, two-lane loop, without any simulator-specific features."""
+
+    def __init__(self):
+        super(TwoEdgeLoopKernel, self).__init__(
+            master_kernel=None, sim_params=SumoParams())
+        self.lengths = {"a": 100, "b": 50}
+
+    def edge_length(self, edge_id):
+        return self.lengths[edge_id]
+
+    def num_lanes(self, edge_id):
+        return 2
+
+    def get_edge_list(self):
+        return ["a", "b"]
+
+    def get_junction_list(self):
+        return []
+
+    def next_edge(self, edge, lane):
+        return [("b" if edge == "a" else "a", lane)]
+
+    def prev_edge(self, edge, lane):
+        return [("b" if edge == "a" else "a", lane)]
+
+
+class TestLaneGraph(unittest.TestCase):
+    """Tests the vectorized lane leader/follower computations."""
+
+    def setUp(self):
+        self.scenario = TwoEdgeLoopKernel()
+        self.lane_graph = self.scenario.get_lane_graph()
+
+    def test_cached(self):
+        self.assertIsInstance(self.lane_graph, LaneGraph)
+        self.assertIs(self.scenario.get_lane_graph(), self.lane_graph)
+
+    def test_offset_tables(self):
+        graph = self.lane_graph
+        self.assertEqual(graph.max_lanes, 2)
+        self.assertEqual(graph.next_key[graph.lane_key("a", 1)],
+                         graph.lane_key("b", 1))
+        self.assertEqual(graph.prev_key[graph.lane_key("a", 0)],
+                         graph.lane_key("b", 0))
+        self.assertEqual(graph.lane_key("c", 0), -1)
+        np.testing.assert_array_equal(
+            graph.lane_keys(["a", "b", "c"], [1, 0, 0]),
+            [graph.lane_key("a", 1), graph.lane_key("b", 0), -1])
+
+    def test_lane_neighbors(self):
+        graph = self.lane_graph
+
+        # vehicles: (edge, lane, position)
+        vehicles = [("a", 0, 10), ("a", 0, 40), ("a", 1, 20), ("b", 0, 30)]
+        keys = graph.lane_keys([v[0] for v in vehicles],
+                               [v[1] for v in vehicles])
+        order = graph.sort(keys, [v[2] for v in vehicles])
+        lengths = np.full(len(vehicles), 5.)
+
+        # lane 0 and 1 of the first vehicle, and lane 0 of the last vehicle
+        leader, headway, follower, tailway = graph.lane_neighbors(
+            order, lengths,
+            veh=[0, 0, 3],
+            keys=[graph.lane_key("a", 0), graph.lane_key("a", 1),
+                  graph.lane_key("b", 0)],
+            own=[True, False, True])
+
+        np.testing.assert_array_equal(leader, [1, 2, 0])
+        np.testing.assert_array_almost_equal(headway, [25, 5, 25])
+        np.testing.assert_array_equal(follower, [3, 2, 1])
+        np.testing.assert_array_almost_equal(tailway, [25, 135, 85])
+
+
+class JunctionKernel(KernelScenario):
+    """A small network with a junction, without simulator-specific features.
+
+    Edge "a" splits into "b" (lane 0) and "c" (lane 1) through junction
+    ":j", both of which merge into "d", which leads back to "a" and to the
+    dead end "e".
+    """
+
+    def __init__(self):
+        super(JunctionKernel, self).__init__(
+            master_kernel=None, sim_params=SumoParams())
+        self.lengths = {"a": 10, "b": 100, "c": 20, "d": 10, "e": 5}
+        self.connections = {
+            ("a", 0): [(":j", 0)], ("a", 1): [(":j", 1)],
+            (":j", 0): [("b", 0)], (":j", 1): [("c", 0)],
+            ("b", 0): [("d", 0)], ("c", 0): [("d", 0)],
+            ("d", 0): [("a", 0), ("e", 0)],
+        }
+
+    def edge_length(self, edge_id):
+        return self.lengths[edge_id]
+
+    def num_lanes(self, edge_id):
+        return 2 if edge_id == "a" else 1
+
+    def get_edge_list(self):
+        return ["a", "b", "c", "d", "e"]
+
+    def get_junction_list(self):
+        return [":j"]
+
+    def next_edge(self, edge, lane):
+        return self.connections.get((edge, lane), [])
+
+
+class TestRoutingEngine(unittest.TestCase):
+    """Tests the routing engine used by the routing controllers."""
+
+    def setUp(self):
+        self.scenario = JunctionKernel()
+        self.engine = self.scenario.get_routing_engine()
+
+    def test_cached(self):
+        self.assertIsInstance(self.engine, RoutingEngine)
+        self.assertIs(self.scenario.get_routing_engine(), self.engine)
+
+    def test_successors(self):
+        # internal links are skipped
+        self.assertListEqual(self.engine.successors("a"), ["b", "c"])
+        self.assertListEqual(self.engine.successors("d"), ["a", "e"])
+        self.assertListEqual(self.engine.successors("e"), [])
+
+        # only the connections of the lane are followed
+        self.assertListEqual(self.engine.successors("a", 0), ["b"])
+        self.assertListEqual(self.engine.successors("a", 1), ["c"])
+
+    def test_shortest_path(self):
+        self.assertListEqual(
+            self.engine.shortest_path("a", "d"), ["a", "c", "d"])
+        self.assertListEqual(
+            self.engine.shortest_path("b", "e"), ["b", "d", "e"])
+        self.assertListEqual(self.engine.shortest_path("d", "d"), ["d"])
+        self.assertIsNone(self.engine.shortest_path("e", "a"))
+        self.assertListEqual(
+            self.engine.shortest_paths(["a", "e"], "d"),
+            [["a", "c", "d"], None])
+
+        # the shortest path tree is only computed once per destination
+        tree = self.engine.shortest_path_tree("d")
+        self.assertIs(self.engine.shortest_path_tree("d"), tree)
+        np.testing.assert_array_almost_equal(
+            tree[1], [30, 10, 10, 0, np.inf])
+
+    def test_random_routes(self):
+        rng = np.random.RandomState(0)
+        routes = self.engine.random_routes(["a"] * 100 + ["e"], 3, rng)
+
+        # every route follows the edges of the network
+        for route in routes[:-1]:
+            self.assertEqual(len(route), 3)
+            self.assertIn(route[1], ["b", "c"])
+            self.assertEqual(route[2], "d")
+        self.assertSetEqual({route[1] for route in routes[:-1]}, {"b", "c"})
+
+        # routes are not extended past dead ends
+        self.assertListEqual(routes[-1], ["e"])
+        self.assertListEqual(self.engine.random_routes([], 3, rng), [])
+
+    def test_random_routes_lanes(self):
+        rng = np.random.RandomState(0)
+        routes = self.engine.random_routes(
+            ["a"] * 100 + ["d"], 3, rng, lanes=[0] * 50 + [1] * 50 + [0])
+
+        # the next edge can be reached from the lane of the vehicle
+        for route in routes[:50]:
+            self.assertListEqual(route, ["a", "b", "d"])
+        for route in routes[50:100]:
+            self.assertListEqual(route, ["a", "c", "d"])
+        self.assertIn(routes[-1][1], ["a", "e"])
+
+        # routes starting on an unknown lane use the successors of the edge
+        route = self.engine.random_route("a", 2, rng, lane=-1001)
+        self.assertIn(route[1], ["b", "c"])
+
+
+class TestNetworkCache(unittest.TestCase):
+    """Tests the cache of networks generated by netconvert."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        cache = NetworkCache(self.directory, max_size=2 ** 20)
+        edges = {'top': {'length': 10, 'lanes': 1, 'speed': 30}}
+        connections = {'next': {'top': {0: [('bottom', 0)]}}, 'prev': {}}
+
+        # keys only depend on the content of the inputs
+        key = cache.key([{'id': 'a', 'x': '0'}], {'lanes': 1})
+        self.assertEqual(key, cache.key([{'x': '0', 'id': 'a'}], {'lanes': 1}))
+        self.assertNotEqual(
+            key, cache.key([{'id': 'a', 'x': '1'}], {'lanes': 1}))
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, b'<net/>', edges, connections)
+        self.assertTupleEqual(cache.get(key), (b'<net/>', edges, connections))
+
+        # the entry is shared with other caches in the same directory
+        other = NetworkCache(self.directory, max_size=2 ** 20)
+        self.assertTupleEqual(other.get(key), (b'<net/>', edges, connections))
+
+        # incomplete entries are treated as misses
+        with open(os.path.join(self.directory, 'broken.net.pkl'), 'wb') as f:
+            f.write(b'\x80')
+        self.assertIsNone(cache.get('broken'))
+
+        cache.clear()
+        self.assertIsNone(cache.get(key))
+
+    def test_eviction(self):
+        cache = NetworkCache(self.directory, max_size=2500)
+        net = b'x' * 1000
+
+        cache.put('a', net, {}, {})
+        cache.put('b', net, {}, {})
+        os.utime(cache._path('a'), (0, 0))
+        os.utime(cache._path('b'), (1, 1))
+
+        # reading an entry makes it the most recently used one
+        cache.get('a')
+        cache.put('c', net, {}, {})
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_private_directory(self):
+        # the directory is only accessible by the current user
+        directory = os.path.join(self.directory, 'cache')
+        NetworkCache(directory, max_size=2 ** 20)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+        # directories writable by other users are rejected
+        os.chmod(directory, 0o777)
+        self.assertRaises(
+            PermissionError, NetworkCache, directory, max_size=2 ** 20)
+
+        # directories owned by other users are rejected
+        os.chmod(directory, 0o700)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertRaises(
+                PermissionError, NetworkCache, directory, max_size=2 ** 20)
+
+
+NET_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<net version="1.1">
+    <type id="fast" speed="25.00"/>
+    <edge id=":center_0" function="internal">
+        <lane id=":center_0_0" index="0" speed="10.00" length="5.00"/>
+    </edge>
+    <edge id="top" from="left" to="center" type="fast">
+        <lane id="top_0" index="0" speed="15.00" length="100.00"/>
+        <lane id="top_1" index="1" speed="15.00" length="100.00"/>
+        <param key="origId" value="1"/>
+    </edge>
+    <edge id="bottom" from="center" to="left">
+        <lane id="bottom_0" index="0" speed="20.00" length="80.00"/>
+    </edge>
+    <junction id="center" type="priority" x="0.00" y="0.00"/>
+    <connection from="top" to="bottom" fromLane="1" toLane="0"
+                via=":center_0_0"/>
+    <connection from=":center_0" to="bottom" fromLane="0" toLane="0"/>
+</net>
+"""
+
+
+class TestNetFile(unittest.TestCase):
+    """Tests the importer of .net.xml files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.net.xml')
+        with open(self.path, 'w') as f:
+            f.write(NET_XML)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_net(self):
+        edges, connections = read_net(self.path, no_internal_links=True)
+        self.assertDictEqual(edges, {
+            ':center_0': {'speed': 10, 'lanes': 1, 'length': 5},
+            'top': {'speed': 25, 'lanes': 2, 'length': 100},
+            'bottom': {'speed': 20, 'lanes': 1, 'length': 80},
+        })
+        self.assertDictEqual(connections, {
+            'next': {'top': {1: [('bottom', 0)]},
+                     ':center_0': {0: [('bottom', 0)]}},
+            'prev': {'bottom': {0: [('top', 1), (':center_0', 0)]}},
+        })
+
+        # with internal links, connections lead to the internal links
+        _, connections = read_net(self.path, no_internal_links=False)
+        self.assertListEqual(connections['next']['top'][1],
+                             [(':center_0', 0)])
+
+    def test_sidecar(self):
+        sidecar_path = self.path + SIDECAR_EXTENSION
+        expected = read_net(self.path, no_internal_links=True)
+
+        # the sidecar is written on the first import, and read afterwards
+        self.assertTupleEqual(
+            read_net(self.path, no_internal_links=True, sidecar=True),
+            expected)
+        self.assertTrue(os.path.exists(sidecar_path))
+        mtime = os.path.getmtime(sidecar_path)
+        self.assertTupleEqual(
+            read_net(self.path, no_internal_links=True, sidecar=True),
+            expected)
+        self.assertEqual(os.path.getmtime(sidecar_path), mtime)
+
+        # the sidecar is written again once the file is modified
+        with open(self.path, 'w') as f:
+            f.write(NET_XML.replace('80.00', '800.00'))
+        edges, _ = read_net(self.path, no_internal_links=True, sidecar=True)
+        self.assertEqual(edges['bottom']['length'], 800)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,14 @@ import csv
 import os
 import json
 import collections
+import shutil
+import struct
+import tempfile
+from unittest import mock
+
+import traci.constants as tc
+from traci.exceptions import TraCIException
+from traci.storage import Storage
 
 from flow.core.params import VehicleParams
 from flow.core.params import TrafficLightParams
@@ -10,9 +18,14 @@ from flow.controllers import IDMController, ContinuousRouter, RLController
 from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig, \
     InFlows, SumoCarFollowingParams
 from flow.core.util import emission_to_csv
+from flow.core.checkpoint import CheckpointStore
+from flow.core.warmup_cache import WarmupCache
+from flow.core.profiler import StepProfiler, profile_phase, NO_PHASE
 from flow.utils.flow_warnings import deprecation_warning
 from flow.utils.registry import make_create_env
 from flow.utils.rllib import FlowParamsEncoder, get_flow_params
+from flow.utils.traci_pipeline import TraCICommandBuffer, \
+    subscription_variables, send_simulation_step, receive_simulation_step
 
 os.environ["TEST_FLAG"] = "True"
 
@@ -339,5 +352,387 @@ class TestRllib(unittest.TestCase):
                                      flow_params["veh"].__dict__))
 
 
+class TestTraCICommandBuffer(unittest.TestCase):
+    """Tests the buffering of TraCI commands in TraCICommandBuffer."""
+
+    class FakeSocket(object):
+        def __init__(self):
+            self.messages = []
+
+        def send(self, message):
+            self.messages.append(message)
+
+    class FakeConnection(object):
+        """Replies to every message with the statuses in `statuses`."""
+
+        def __init__(self):
+            self._socket = TestTraCICommandBuffer.FakeSocket()
+            self.statuses = []
+
+        def _recvExact(self):
+            reply = b''
+            for cmd_id, status, description in self.statuses:
+                description = description.encode('latin1')
+                reply += struct.pack('!BBBi', 7 + len(description), cmd_id,
+                                     status, len(description)) + description
+            return Storage(reply)
+
+        def _readSubscription(self, result):
+            pass
+
+    def test_pipelined(self):
+        connection = self.FakeConnection()
+        buffer = TraCICommandBuffer(connection)
+        self.assertTrue(buffer.pipelined)
+
+        # no message should be sent if no commands are queued
+        buffer.flush()
+        self.assertEqual(len(connection._socket.messages), 0)
+
+        # commands are only sent when the buffer is flushed
+        buffer.queue('vehicle', 'setSpeedMode', 'human_0', 31)
+        buffer.queue('vehicle', 'setLaneChangeMode', 'human_0', 512)
+        buffer.queue('vehicle', 'setSpeedMode', 'human_1', 0)
+        buffer.discard('human_1')
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(len(connection._socket.messages), 0)
+
+        # all commands are sent in a single message
+        connection.statuses = [(tc.CMD_SET_VEHICLE_VARIABLE, 0, '')] * 2
+        buffer.flush()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(len(connection._socket.messages), 1)
+
+        obj_id = struct.pack('!i', 7) + b'human_0'
+        expected = \
+            struct.pack('!BB', 19, tc.CMD_SET_VEHICLE_VARIABLE) + \
+            struct.pack('!B', tc.VAR_SPEEDSETMODE) + obj_id + \
+            struct.pack('!Bi', tc.TYPE_INTEGER, 31) + \
+            struct.pack('!BB', 19, tc.CMD_SET_VEHICLE_VARIABLE) + \
+            struct.pack('!B', tc.VAR_LANECHANGE_MODE) + obj_id + \
+            struct.pack('!Bi', tc.TYPE_INTEGER, 512)
+        self.assertEqual(connection._socket.messages[0],
+                         struct.pack('!i', len(expected) + 4) + expected)
+
+    def test_actuation_commands(self):
+        connection = self.FakeConnection()
+        buffer = TraCICommandBuffer(connection)
+
+        buffer.queue('vehicle', 'slowDown', 'rl_0', 12.5, 1)
+        buffer.queue('vehicle', 'changeLane', 'rl_0', 1, 100000)
+        buffer.queue('vehicle', 'setRoute', 'rl_0', ['top', 'left'])
+        buffer.queue('vehicle', 'setColor', 'rl_0', (255, 0, 0, 255))
+        connection.statuses = [(tc.CMD_SET_VEHICLE_VARIABLE, 0, '')] * 4
+        buffer.flush()
+        self.assertEqual(len(connection._socket.messages), 1)
+
+        obj_id = struct.pack('!i', 4) + b'rl_0'
+        commands = [
+            (tc.CMD_SLOWDOWN, struct.pack(
+                '!BiBdBd', tc.TYPE_COMPOUND, 2, tc.TYPE_DOUBLE, 12.5,
+                tc.TYPE_DOUBLE, 1)),
+            (tc.CMD_CHANGELANE, struct.pack(
+                '!BiBbBd', tc.TYPE_COMPOUND, 2, tc.TYPE_BYTE, 1,
+                tc.TYPE_DOUBLE, 100000)),
+            (tc.VAR_ROUTE, struct.pack(
+                '!Bii3si4s', tc.TYPE_STRINGLIST, 2, 3, b'top', 4, b'left')),
+            (tc.VAR_COLOR, struct.pack(
+                '!BBBBB', tc.TYPE_COLOR, 255, 0, 0, 255)),
+        ]
+        expected = b''
+        for var_id, value in commands:
+            body = struct.pack('!B', var_id) + obj_id + value
+            expected += struct.pack(
+                '!BB', len(body) + 2, tc.CMD_SET_VEHICLE_VARIABLE) + body
+        self.assertEqual(connection._socket.messages[0],
+                         struct.pack('!i', len(expected) + 4) + expected)
+
+    def test_errors(self):
+        connection = self.FakeConnection()
+        buffer = TraCICommandBuffer(connection)
+
+        # only commands without return values can be buffered
+        self.assertRaises(ValueError, buffer.queue, 'vehicle', 'getSpeed',
+                          'human_0')
+
+        # errors of commands are raised once all commands are sent, unless
+        # they are ignored
+        buffer.queue('vehicle', 'setSpeedMode', 'human_0', 31,
+                     ignore_errors=True)
+        buffer.queue('vehicle', 'setSpeedMode', 'human_1', 31)
+        connection.statuses = [
+            (tc.CMD_SET_VEHICLE_VARIABLE, tc.RTYPE_ERR, 'unknown vehicle'),
+            (tc.CMD_SET_VEHICLE_VARIABLE, 0, '')]
+        buffer.flush()
+
+        buffer.queue('vehicle', 'setSpeedMode', 'human_0', 31)
+        buffer.queue('vehicle', 'setSpeedMode', 'human_1', 31)
+        connection.statuses = [
+            (tc.CMD_SET_VEHICLE_VARIABLE, tc.RTYPE_ERR, 'unknown vehicle'),
+            (tc.CMD_SET_VEHICLE_VARIABLE, 0, '')]
+        self.assertRaises(TraCIException, buffer.flush)
+        self.assertEqual(len(buffer), 0)
+
+    def test_not_pipelined(self):
+        calls = []
+
+        class FakeAPI(object):
+            def setSpeedMode(self, veh_id, mode):
+                calls.append((veh_id, mode))
+
+        class FakeModule(object):
+            vehicle = FakeAPI()
+
+        # commands are issued one by one if pipelining is not supported
+        buffer = TraCICommandBuffer(FakeModule())
+        self.assertFalse(buffer.pipelined)
+        buffer.queue('vehicle', 'setSpeedMode', 'human_0', 31)
+        buffer.queue('vehicle', 'setSpeedMode', 'human_1', 0)
+        buffer.flush()
+        self.assertListEqual(calls, [('human_0', 31), ('human_1', 0)])
+
+    def test_subscription_variables(self):
+        # variables are returned once, in the order of their names
+        self.assertListEqual(
+            subscription_variables('vehicle', ['speed', 'route', 'speed']),
+            [tc.VAR_SPEED, tc.VAR_EDGES])
+        self.assertListEqual(
+            subscription_variables('edge', ['mean_speed']),
+            [tc.LAST_STEP_MEAN_SPEED])
+        self.assertListEqual(subscription_variables('trafficlight', []), [])
+
+        # unknown variables are rejected
+        self.assertRaises(ValueError, subscription_variables, 'vehicle',
+                          ['mean_speed'])
+
+
+class TestDeferredSimulationStep(unittest.TestCase):
+    """Tests requesting a simulation step without waiting for the reply with
+    send_simulation_step and receive_simulation_step."""
+
+    class FakeConnection(TestTraCICommandBuffer.FakeConnection):
+        """Replies to a simulation step without subscription results."""
+
+        def __init__(self):
+            super().__init__()
+            self._subscriptionMapping = {}
+            self.steps = []
+
+        def _recvExact(self):
+            cmd_id, status, description = self.statuses[0]
+            description = description.encode('latin1')
+            return Storage(
+                struct.pack('!BBBi', 7 + len(description), cmd_id, status,
+                            len(description)) + description +
+                struct.pack('!i', 0))
+
+        def _manageStepListeners(self, step):
+            self.steps.append(step)
+
+    def test_deferred(self):
+        connection = self.FakeConnection()
+        connection.statuses = [(tc.CMD_SIMSTEP, 0, '')]
+
+        # the step is requested without reading the reply
+        self.assertTrue(send_simulation_step(connection, 2.5))
+        expected = struct.pack('!BBd', 10, tc.CMD_SIMSTEP, 2.5)
+        self.assertEqual(connection._socket.messages,
+                         [struct.pack('!i', len(expected) + 4) + expected])
+        self.assertListEqual(connection.steps, [])
+
+        receive_simulation_step(connection, 2.5)
+        self.assertListEqual(connection.steps, [2.5])
+
+        # errors of the step are raised once the reply is read
+        send_simulation_step(connection)
+        connection.statuses = [(tc.CMD_SIMSTEP, tc.RTYPE_ERR, 'error')]
+        self.assertRaises(TraCIException, receive_simulation_step, connection)
+
+    def test_not_pipelined(self):
+        steps = []
+
+        class FakeModule(object):
+            def simulationStep(self, step=0.):
+                steps.append(step)
+
+        # the step is performed at once if replies cannot be deferred
+        self.assertFalse(send_simulation_step(FakeModule(), 1.))
+        self.assertListEqual(steps, [1.])
+
+
+class TestStepProfiler(unittest.TestCase):
+    """Tests the profiling of the phases of steps with StepProfiler."""
+
+    def test_summary(self):
+        profiler = StepProfiler(window=10)
+        for _ in range(20):
+            with profile_phase(profiler, "step"):
+                with profile_phase(profiler, "compute_reward"):
+                    pass
+
+        summary = profiler.summary()
+        self.assertListEqual(list(summary.keys()), ["compute_reward", "step"])
+        self.assertEqual(summary["step"]["count"], 20)
+        self.assertLessEqual(summary["step"]["p50"], summary["step"]["p99"])
+        self.assertGreaterEqual(summary["step"]["p50"],
+                                summary["compute_reward"]["p50"])
+        self.assertIn("compute_reward", profiler.report())
+
+        # only the most recent durations are kept
+        self.assertEqual(len(profiler._durations["step"]), 10)
+
+        profiler.clear()
+        self.assertDictEqual(dict(profiler.summary()), {})
+
+    def test_disabled(self):
+        # phases are not timed without a profiler
+        self.assertIs(profile_phase(None, "step"), NO_PHASE)
+        with profile_phase(None, "step"):
+            pass
+
+    def test_export_trace(self):
+        profiler = StepProfiler(trace_length=5)
+        for _ in range(10):
+            with profile_phase(profiler, "step"):
+                pass
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "trace.json")
+        profiler.export_trace(path)
+        with open(path) as f:
+            trace = json.load(f)
+        shutil.rmtree(directory)
+
+        events = trace["traceEvents"]
+        self.assertEqual(len(events), 5)
+        for event in events:
+            self.assertEqual(event["name"], "step")
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["dur"], 0)
+
+
+class TestCheckpointStore(unittest.TestCase):
+    """Tests the storage of environment checkpoints."""
+
+    def setUp(self):
+        self.store = CheckpointStore(max_in_memory=2)
+
+    def tearDown(self):
+        self.store.clear()
+
+    def test_save_load(self):
+        tokens = [self.store.save({"step": i}) for i in range(5)]
+        self.assertEqual(len(set(tokens)), 5)
+
+        # only the most recent checkpoints are kept in memory, the others are
+        # read back from disk
+        self.assertEqual(list(self.store._in_memory), tokens[-2:])
+        for i, token in enumerate(tokens):
+            self.assertEqual(self.store.load(token), {"step": i})
+        self.assertEqual(list(self.store._in_memory), tokens[-2:])
+
+    def test_remove(self):
+        token = self.store.save({"step": 0})
+        self.assertIn(token, self.store)
+        self.store.remove(token)
+        self.assertNotIn(token, self.store)
+        self.assertRaises(KeyError, self.store.load, token)
+
+    def test_clear(self):
+        token = self.store.save({"step": 0})
+        directory = self.store._directory
+        self.store.clear()
+        self.assertFalse(os.path.exists(directory))
+        self.assertRaises(KeyError, self.store.load, token)
+
+        # tokens are not reused after the store is cleared
+        self.assertNotEqual(self.store.save({"step": 1}), token)
+
+
+class TestWarmupCache(unittest.TestCase):
+    """Tests the cache of the states of environments after warm-up."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = WarmupCache(self.directory)
+
+        # a state as returned by the kernel, see Kernel.save_state
+        self.state_file = os.path.join(self.directory, "state.xml")
+        with open(self.state_file, "w") as f:
+            f.write("<snapshot/>")
+        self.kernel_state = {
+            "simulation": (self.state_file, {1: 2}),
+            "vehicle": {"ids": ["a", "b"]},
+            "traffic_light": {},
+        }
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_key(self):
+        vehicles = VehicleParams()
+        vehicles.add("human", acceleration_controller=(IDMController, {}))
+        key = WarmupCache.key(vehicles, EnvParams(warmup_steps=10))
+
+        # the key only depends on the content of the parameters
+        vehicles = VehicleParams()
+        vehicles.add("human", acceleration_controller=(IDMController, {}))
+        self.assertEqual(
+            WarmupCache.key(vehicles, EnvParams(warmup_steps=10)), key)
+        self.assertNotEqual(
+            WarmupCache.key(vehicles, EnvParams(warmup_steps=20)), key)
+
+        vehicles = VehicleParams()
+        vehicles.add("human", acceleration_controller=(RLController, {}))
+        self.assertNotEqual(
+            WarmupCache.key(vehicles, EnvParams(warmup_steps=10)), key)
+
+    def test_put_get(self):
+        self.assertIsNone(self.cache.get("key", 0))
+        self.cache.put("key", 0, self.kernel_state, 100)
+        # the state file of the simulation may be removed afterwards
+        os.remove(self.state_file)
+
+        # the state is available in other processes using the same directory
+        cache = WarmupCache(self.directory)
+        kernel_state, time_counter = cache.get("key", 0)
+        self.assertEqual(time_counter, 100)
+        self.assertEqual(kernel_state["vehicle"], {"ids": ["a", "b"]})
+        state_file, sim_obs = kernel_state["simulation"]
+        self.assertEqual(sim_obs, {1: 2})
+        with open(state_file) as f:
+            self.assertEqual(f.read(), "<snapshot/>")
+
+        # the local copies of the states are removed once the cache is closed
+        cache.close()
+        self.assertFalse(os.path.exists(state_file))
+
+    def test_slots(self):
+        self.cache.put("key", 0, self.kernel_state, 100)
+        self.assertIsNone(self.cache.get("key", 1))
+        self.assertIsNone(self.cache.get("other_key", 0))
+
+        self.cache.put("key", 1, self.kernel_state, 200)
+        self.assertEqual(self.cache.get("key", 0)[1], 100)
+        self.assertEqual(self.cache.get("key", 1)[1], 200)
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("key", 0))
+
+    def test_private_directory(self):
+        # the directory is only accessible by the current user
+        directory = os.path.join(self.directory, "cache")
+        WarmupCache(directory).close()
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+        # directories other users may write to are rejected
+        os.chmod(directory, 0o777)
+        self.assertRaises(PermissionError, WarmupCache, directory)
+        os.chmod(directory, 0o700)
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            self.assertRaises(PermissionError, WarmupCache, directory)
+
+
 if __name__ == '__main__':
     unittest.main()
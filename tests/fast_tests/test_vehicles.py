@@ -1,16 +1,26 @@
 import unittest
 import os
 import numpy as np
+import traci.constants as tc
 
 from flow.core.params import VehicleParams
 from flow.core.params import SumoCarFollowingParams, NetParams, \
-    InitialConfig, SumoParams, SumoLaneChangeParams
+    InitialConfig, SumoParams, SumoLaneChangeParams, EnvParams, InFlows, \
+    SubscriptionProfile
 from flow.controllers.car_following_models import IDMController, \
     SimCarFollowingController
 from flow.controllers.lane_change_controllers import StaticLaneChanger
 from flow.controllers.rlcontroller import RLController
+from flow.core.kernel.vehicle.columnar import ColumnarVehicleState
+from flow.core.kernel.vehicle.window import StepCountWindow
+from flow.core.kernel.vehicle.edge_index import EdgeIndex
 
-from tests.setup_scripts import ring_road_exp_setup, highway_exp_setup
+from flow.envs.test import TestEnv
+from flow.scenarios.merge import MergeScenario, \
+    ADDITIONAL_NET_PARAMS as MERGE_PARAMS
+
+from tests.setup_scripts import ring_road_exp_setup, highway_exp_setup, \
+    figure_eight_exp_setup
 
 os.environ["TEST_FLAG"] = "True"
 
@@ -602,5 +612,376 @@ class TestObservedIDs(unittest.TestCase):
         self.assertCountEqual(env.k.vehicle.get_observed_ids(), ["test_1"])
 
 
+class TestDerivedAttributes(unittest.TestCase):
+    """Tests the lazy computation of headways, leaders, and followers."""
+
+    def test_lazy_leaders(self):
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=5)
+        env, _ = ring_road_exp_setup(vehicles=vehicles)
+        env.step(rl_actions=None)
+
+        # the leaders are only computed once they are accessed
+        kernel = env.k.vehicle
+        self.assertNotEqual(kernel._leaders_generation, kernel._generation)
+        ids = kernel.get_ids()
+        leaders = kernel.get_leader(ids)
+        self.assertEqual(kernel._leaders_generation, kernel._generation)
+
+        # every vehicle in the ring is the follower of its leader
+        for veh_id, leader in zip(ids, leaders):
+            self.assertEqual(kernel.get_follower(leader), veh_id)
+            self.assertLess(kernel.get_headway(veh_id), 1e+3)
+
+        # values set manually are not overwritten within the same step
+        kernel.set_headway(ids[0], 5)
+        self.assertEqual(kernel.get_headway(ids[0]), 5)
+
+        env.terminate()
+
+
+class TestNeighbors(unittest.TestCase):
+    """Tests the get_neighbors method in the vehicle kernel."""
+
+    def test_neighbors(self):
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=10)
+        env, _ = ring_road_exp_setup(vehicles=vehicles)
+        env.step(rl_actions=None)
+
+        ids = env.k.vehicle.get_ids()
+        positions = {
+            veh_id: np.array(env.k.vehicle.get_orientation(veh_id)[:2])
+            for veh_id in ids}
+
+        # compare the batched query with the pairwise distances
+        radius = 30
+        neighbors = env.k.vehicle.get_neighbors(ids, radius)
+        for veh_id, veh_neighbors in zip(ids, neighbors):
+            expected = [other for other in ids if other != veh_id and
+                        np.linalg.norm(positions[other] - positions[veh_id])
+                        <= radius]
+            self.assertCountEqual(veh_neighbors, expected)
+            self.assertListEqual(
+                env.k.vehicle.get_neighbors(veh_id, radius), veh_neighbors)
+
+        # unknown vehicles return the error value
+        self.assertListEqual(env.k.vehicle.get_neighbors("nope", radius), [])
+
+        env.terminate()
+
+
+class TestFlowLeaders(unittest.TestCase):
+    """Compares the leaders computed by Flow with the ones from sumo."""
+
+    def compare_leaders(self, create_env, num_steps=200, min_agreement=1.):
+        """Run the environments in lockstep and compare their leaders.
+
+        Parameters
+        ----------
+        create_env : callable
+            creates an environment given its simulation parameters
+        num_steps : int
+            number of steps to compare the leaders for
+        min_agreement : float
+            minimum fraction of vehicles whose leaders should be identical
+        """
+        env_sumo = create_env(SumoParams(sim_step=0.1, flow_leaders=False))
+        env_flow = create_env(SumoParams(sim_step=0.1, flow_leaders=True))
+        env_sumo.reset()
+        env_flow.reset()
+
+        num_vehicles, num_matches = 0, 0
+        for _ in range(num_steps):
+            env_sumo.step(rl_actions=None)
+            env_flow.step(rl_actions=None)
+
+            ids = env_sumo.k.vehicle.get_ids()
+            self.assertListEqual(ids, env_flow.k.vehicle.get_ids())
+            leaders = zip(env_sumo.k.vehicle.get_leader(ids),
+                          env_flow.k.vehicle.get_leader(ids),
+                          env_sumo.k.vehicle.get_headway(ids),
+                          env_flow.k.vehicle.get_headway(ids))
+            for lead_sumo, lead_flow, head_sumo, head_flow in leaders:
+                num_vehicles += 1
+                if lead_sumo == lead_flow:
+                    num_matches += 1
+                    self.assertAlmostEqual(head_sumo, head_flow, places=2)
+
+        self.assertGreater(num_vehicles, 0)
+        self.assertGreaterEqual(num_matches / num_vehicles, min_agreement)
+
+        env_sumo.terminate()
+        env_flow.terminate()
+
+    def test_ring(self):
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=10)
+        self.compare_leaders(lambda sim_params: ring_road_exp_setup(
+            sim_params=sim_params, vehicles=vehicles)[0])
+
+    def test_figure_eight(self):
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=14)
+        self.compare_leaders(lambda sim_params: figure_eight_exp_setup(
+            sim_params=sim_params, vehicles=vehicles)[0])
+
+    def test_merge(self):
+        def create_env(sim_params):
+            vehicles = VehicleParams()
+            vehicles.add(veh_id="human", num_vehicles=0)
+
+            inflow = InFlows()
+            inflow.add(veh_type="human", edge="inflow_highway",
+                       vehs_per_hour=1800, departLane="free", departSpeed=10)
+            inflow.add(veh_type="human", edge="inflow_merge",
+                       vehs_per_hour=300, departLane="free", departSpeed=7.5)
+
+            scenario = MergeScenario(
+                name="test_merge_leaders",
+                vehicles=vehicles,
+                net_params=NetParams(inflows=inflow,
+                                     additional_params=MERGE_PARAMS.copy()))
+            return TestEnv(EnvParams(), sim_params, scenario)
+
+        # sumo may pick a different leader close to the merge, where vehicles
+        # from both branches are about to enter the same lane
+        self.compare_leaders(create_env, num_steps=600, min_agreement=0.95)
+
+    def test_default(self):
+        # the leaders subscribed from sumo, which follow the routes of the
+        # vehicles, are used by default
+        env, _ = ring_road_exp_setup()
+        self.assertFalse(env.k.vehicle._use_flow_leaders)
+        env.terminate()
+
+
+class TestSubscriptionProfile(unittest.TestCase):
+    """Tests the variables subscribed to by the vehicle kernel."""
+
+    def test_vehicle_variables(self):
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=5)
+        sim_params = SumoParams(
+            sim_step=0.1,
+            subscriptions=SubscriptionProfile(vehicle=["acceleration"]))
+        env, _ = ring_road_exp_setup(sim_params=sim_params, vehicles=vehicles)
+        env.step(rl_actions=None)
+
+        kernel = env.k.vehicle
+        api = env.k.kernel_api.vehicle
+        veh_id = kernel.get_ids()[0]
+
+        # only the required and requested variables are subscribed to
+        self.assertCountEqual(
+            api.getSubscriptionResults(veh_id).keys(),
+            [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION, tc.VAR_ROAD_ID,
+             tc.VAR_SPEED, tc.VAR_ACCELERATION])
+        self.assertEqual(kernel.get_acceleration(veh_id),
+                         api.getAcceleration(veh_id))
+
+        # other variables are requested from sumo when accessed
+        self.assertEqual(kernel.get_route(veh_id), api.getRoute(veh_id))
+        self.assertEqual(kernel.get_distance(veh_id), api.getDistance(veh_id))
+        self.assertEqual(kernel.get_route("nope"), [])
+
+        # leaders are computed by Flow since they are not subscribed to
+        self.assertTrue(kernel._use_flow_leaders)
+        self.assertLess(kernel.get_headway(veh_id), 1e+3)
+
+        env.terminate()
+
+    def test_environment_profile(self):
+        # the profile requested by an environment is used without being
+        # stored in the simulation parameters
+        class EdgeEnv(TestEnv):
+            subscriptions = SubscriptionProfile(edge=["vehicle_number"])
+
+        env, scenario = ring_road_exp_setup()
+        env.terminate()
+        sim_params = SumoParams(sim_step=0.1)
+        env = EdgeEnv(EnvParams(), sim_params, scenario)
+        self.assertIsNone(sim_params.subscriptions)
+        self.assertListEqual(env.k.subscriptions.edge, ["vehicle_number"])
+        env.terminate()
+
+    def test_unsubscribed_edge_variables(self):
+        # edge variables that are not subscribed to are requested from sumo
+        # again in every step
+        env, _ = ring_road_exp_setup()
+        api = env.k.kernel_api.edge
+        for _ in range(5):
+            env.step(rl_actions=None)
+            for edge in env.k.scenario.get_edge_list():
+                self.assertEqual(env.k.scenario.get_edge_vehicle_number(edge),
+                                 api.getLastStepVehicleNumber(edge))
+        env.terminate()
+
+    def test_invalid_variable(self):
+        sim_params = SumoParams(
+            subscriptions=SubscriptionProfile(vehicle=["nope"]))
+        self.assertRaises(ValueError, ring_road_exp_setup,
+                          sim_params=sim_params)
+
+
+class TestColumnarVehicleState(unittest.TestCase):
+    """Tests the array-backed store of vehicle states."""
+
+    def test_slots(self):
+        columns = ColumnarVehicleState(capacity=2)
+        slots = [columns.add(veh_id) for veh_id in ["a", "b", "c"]]
+
+        # slots are unique and the store grows when needed
+        self.assertEqual(len(set(slots)), 3)
+        self.assertGreaterEqual(columns.capacity, 3)
+        self.assertEqual(columns.add("b"), slots[1])
+
+        # slots of removed vehicles are recycled
+        columns.remove("a")
+        self.assertNotIn("a", columns)
+        self.assertEqual(columns.add("d"), slots[0])
+        self.assertEqual(len(columns), 3)
+
+    def test_gather(self):
+        columns = ColumnarVehicleState()
+        for veh_id in ["a", "b", "c"]:
+            columns.add(veh_id)
+
+        slots = columns.slots_of(["a", "b", "c"])
+        columns.fill('speed', slots, [1., 2., 3.])
+        columns.fill('edge', slots, [columns.edge_index(edge)
+                                     for edge in ["top", "left", "top"]])
+        columns.fill('leader', slots, ["b", "c", ""])
+
+        np.testing.assert_array_equal(
+            columns.gather('speed', ["c", "a", "x"], -1001), [3., 1., -1001])
+        np.testing.assert_array_equal(
+            columns.gather_edges(["c", "b", "x"], ""), ["top", "left", ""])
+        np.testing.assert_array_equal(
+            columns.gather('leader', ["a", "x"], None), ["b", None])
+
+        # single vehicle updates
+        columns.set('speed', "b", 5.)
+        self.assertEqual(columns.gather('speed', ["b"], -1001)[0], 5.)
+
+    def test_kernel_getters(self):
+        """Compare the columnar getters with the dictionary getters."""
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="test", num_vehicles=10)
+
+        env_dict, _ = ring_road_exp_setup(vehicles=vehicles)
+        env_cols, _ = ring_road_exp_setup(
+            vehicles=vehicles,
+            sim_params=SumoParams(sim_step=0.1, columnar_state=True))
+
+        for _ in range(10):
+            env_dict.step(rl_actions=None)
+            env_cols.step(rl_actions=None)
+
+        ids = env_dict.k.vehicle.get_ids()
+        for getter in ["get_speed", "get_position", "get_lane", "get_edge",
+                       "get_length", "get_headway", "get_leader",
+                       "get_follower"]:
+            expected = getattr(env_dict.k.vehicle, getter)(ids)
+            actual = getattr(env_cols.k.vehicle, getter)(ids)
+            self.assertIsInstance(actual, np.ndarray)
+            self.assertListEqual(list(actual), list(expected))
+
+        env_dict.terminate()
+        env_cols.terminate()
+
+
+class TestStepCountWindow(unittest.TestCase):
+    """Tests the bounded counter of departed and arrived vehicles."""
+
+    def test_sum(self):
+        window = StepCountWindow(capacity=3)
+        self.assertEqual(window.sum(2), (0, 0))
+        self.assertEqual(window.last_count, 0)
+        self.assertListEqual(window.last_ids, [])
+
+        for count in [1, 2, 3, 4, 5]:
+            window.append(count, ["veh_{}".format(count)])
+
+        # only the last 3 steps are covered by the window
+        self.assertEqual(len(window), 3)
+        self.assertEqual(window.sum(1), (5, 1))
+        self.assertEqual(window.sum(2), (9, 2))
+        self.assertEqual(window.sum(3), (12, 3))
+        self.assertEqual(window.sum(10), (12, 3))
+        self.assertEqual(window.sum(0), (12, 3))
+        self.assertEqual(window.last_count, 5)
+        self.assertListEqual(window.last_ids, ["veh_5"])
+
+        window.clear()
+        self.assertEqual(len(window), 0)
+        self.assertEqual(window.sum(2), (0, 0))
+        window.append(7)
+        self.assertEqual(window.sum(2), (7, 1))
+
+    def test_invalid_capacity(self):
+        self.assertRaises(ValueError, StepCountWindow, 0)
+
+
+class TestEdgeIndex(unittest.TestCase):
+    """Tests the incrementally maintained index of vehicle locations."""
+
+    def test_updates(self):
+        positions = {"a": 5, "b": 1, "c": 3, "d": 2}
+        index = EdgeIndex()
+        for veh_id, lane in [("a", 0), ("b", 0), ("c", 1), ("d", 1)]:
+            self.assertTrue(index.update(veh_id, "top", lane))
+        index.update("e", "left", 0)
+        positions["e"] = 0
+        index.sort(positions.get)
+
+        # vehicles are sorted by lane and position
+        self.assertListEqual(index.ids_by_lane("top", 0), ["b", "a"])
+        self.assertListEqual(index.ids_by_edge("top"), ["b", "a", "d", "c"])
+        self.assertListEqual(index.ids_by_edges(["left", "top"]),
+                             ["e", "b", "a", "d", "c"])
+        self.assertListEqual(index.ids_by_edge("bottom"), [])
+
+        # vehicles that did not move are not updated
+        self.assertFalse(index.update("a", "top", 0))
+
+        # lane changes and removals are reflected in the index
+        positions["c"] = 4
+        index.update("c", "top", 0)
+        index.remove("b")
+        index.remove("x")
+        index.sort(positions.get)
+        self.assertListEqual(index.ids_by_edge("top"), ["c", "a", "d"])
+        self.assertEqual(index.location("c"), ("top", 0))
+        self.assertEqual(len(index), 4)
+
+        index.update("d", "left", 0)
+        positions["d"] = 1
+        index.sort(positions.get)
+        self.assertListEqual(index.ids_by_lane("top", 1), [])
+        self.assertListEqual(index.ids_by_edge("left"), ["e", "d"])
+
+        index.clear()
+        self.assertNotIn("a", index)
+        self.assertListEqual(index.ids_by_edge("top"), [])
+
+    def test_overtake_in_lane(self):
+        # vehicles may overtake each other without changing lanes, e.g. with
+        # the sublane model, or when teleported or moved with moveTo
+        positions = {"a": 1, "b": 2, "c": 3}
+        index = EdgeIndex()
+        for veh_id in ["a", "b", "c"]:
+            index.update(veh_id, "top", 0)
+        index.sort(positions.get)
+        self.assertListEqual(index.ids_by_edge("top"), ["a", "b", "c"])
+
+        # the vehicles did not change lanes, but their order changed
+        positions["a"] = 2.5
+        self.assertFalse(index.update("a", "top", 0))
+        index.sort(positions.get)
+        self.assertListEqual(index.ids_by_lane("top", 0), ["b", "a", "c"])
+        self.assertListEqual(index.ids_by_edge("top"), ["b", "a", "c"])
+
+
 if __name__ == '__main__':
     unittest.main()
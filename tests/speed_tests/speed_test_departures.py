@@ -0,0 +1,120 @@
+"""Measures the number of TraCI round trips needed per departing vehicle.
+
+Vehicles entering a highway from a high-volume inflow are ingested by the
+vehicle kernel, with commands to sumo either pipelined (several commands per
+message) or sent one by one. The number of messages exchanged with sumo and
+the time spent updating the vehicle kernel are reported for both cases.
+"""
+
+import argparse
+import time
+
+from flow.controllers import IDMController
+from flow.core.params import SumoParams, EnvParams, NetParams, \
+    InitialConfig, InFlows, VehicleParams
+from flow.envs.test import TestEnv
+from flow.scenarios.highway import HighwayScenario, ADDITIONAL_NET_PARAMS
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_departures.py --num_steps 1000
+
+Here the arguments are:
+num_steps - number of simulation steps performed per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures TraCI round trips per departing vehicle",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_steps", type=int, default=1000,
+                    help="number of simulation steps")
+
+
+def departures_env():
+    """Create an environment with a large inflow of vehicles."""
+    vehicles = VehicleParams()
+    vehicles.add(
+        veh_id="human",
+        acceleration_controller=(IDMController, {}),
+        num_vehicles=0)
+
+    inflow = InFlows()
+    inflow.add(
+        veh_type="human",
+        edge="highway_0",
+        vehs_per_hour=7200,
+        departLane="free",
+        departSpeed=20)
+
+    additional_net_params = ADDITIONAL_NET_PARAMS.copy()
+    net_params = NetParams(
+        inflows=inflow, additional_params=additional_net_params)
+
+    scenario = HighwayScenario(
+        name="speed_test_departures",
+        vehicles=vehicles,
+        net_params=net_params,
+        initial_config=InitialConfig())
+
+    return TestEnv(EnvParams(), SumoParams(sim_step=0.1), scenario)
+
+
+def run(num_steps, pipelined):
+    """Run the environment and count the messages needed for departures.
+
+    Returns
+    -------
+    int
+        number of vehicles that entered the network
+    int
+        number of messages exchanged with sumo
+    float
+        time spent updating the vehicle kernel, in seconds
+    """
+    env = departures_env()
+    env.reset()
+    env.k.simulation.command_buffer.pipelined = pipelined
+
+    connection = env.k.kernel_api
+    recv_exact = connection._recvExact
+    num_messages = [0]
+
+    def counted_recv_exact():
+        num_messages[0] += 1
+        return recv_exact()
+
+    num_departed = 0
+    update_time = 0
+    for _ in range(num_steps):
+        prev_ids = set(env.k.vehicle.get_ids())
+        connection.simulationStep()
+
+        # only count the messages used to update the vehicles and send the
+        # commands that were buffered while doing so
+        connection._recvExact = counted_recv_exact
+        t = time.time()
+        env.k.vehicle.update(reset=False)
+        env.k.simulation.command_buffer.flush()
+        update_time += time.time() - t
+        connection._recvExact = recv_exact
+
+        num_departed += len(set(env.k.vehicle.get_ids()) - prev_ids)
+
+    env.terminate()
+
+    return num_departed, num_messages[0], update_time
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for pipelined in [False, True]:
+        departed, messages, update_time = run(args.num_steps, pipelined)
+        print("pipelined: {}".format(pipelined))
+        print("  departed vehicles: {}".format(departed))
+        print("  messages per departure: {:.2f}".format(
+            messages / max(departed, 1)))
+        print("  vehicle update time per step: {:.3f} ms".format(
+            1000 * update_time / args.num_steps))
@@ -0,0 +1,86 @@
+"""Compares the simulation speed with leaders from sumo and from Flow.
+
+A multi-lane ring road with a large number of vehicles is simulated with the
+leaders, followers, and headways of all vehicles either subscribed from sumo
+(which searches for the leader of every vehicle every step) or computed by
+Flow from the lane-sorted vehicles. The number of steps per second is reported
+for both cases.
+"""
+
+import argparse
+import time
+
+from flow.core.params import SumoParams, EnvParams, NetParams, \
+    InitialConfig, VehicleParams
+from flow.envs.test import TestEnv
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_leaders.py --num_steps 1000 --num_vehicles 400
+
+Here the arguments are:
+num_steps - number of simulation steps performed per test
+num_vehicles - number of vehicles in the ring road
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Compares leaders from sumo and from Flow",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_steps", type=int, default=1000,
+                    help="number of simulation steps")
+parser.add_argument("--num_vehicles", type=int, default=400,
+                    help="number of vehicles in the network")
+
+
+def leaders_env(num_vehicles, flow_leaders):
+    """Create a multi-lane ring road with many vehicles."""
+    vehicles = VehicleParams()
+    vehicles.add(veh_id="human", num_vehicles=num_vehicles)
+
+    additional_net_params = ADDITIONAL_NET_PARAMS.copy()
+    additional_net_params["length"] = 10 * num_vehicles
+    additional_net_params["lanes"] = 4
+    net_params = NetParams(additional_params=additional_net_params)
+
+    scenario = LoopScenario(
+        name="speed_test_leaders",
+        vehicles=vehicles,
+        net_params=net_params,
+        initial_config=InitialConfig(lanes_distribution=4))
+
+    sim_params = SumoParams(sim_step=0.1, flow_leaders=flow_leaders)
+    return TestEnv(EnvParams(), sim_params, scenario)
+
+
+def run(num_steps, num_vehicles, flow_leaders):
+    """Run the environment and read the headways of all vehicles every step.
+
+    Returns
+    -------
+    float
+        number of steps per second
+    """
+    env = leaders_env(num_vehicles, flow_leaders)
+    env.reset()
+
+    t = time.time()
+    for _ in range(num_steps):
+        env.step(rl_actions=None)
+        env.k.vehicle.get_headway(env.k.vehicle.get_ids())
+    steps_per_sec = num_steps / (time.time() - t)
+
+    env.terminate()
+
+    return steps_per_sec
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for flow_leaders in [False, True]:
+        steps_per_sec = run(args.num_steps, args.num_vehicles, flow_leaders)
+        print("flow leaders: {}".format(flow_leaders))
+        print("  steps per second: {:.1f}".format(steps_per_sec))
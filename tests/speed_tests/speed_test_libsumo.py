@@ -0,0 +1,71 @@
+"""Measures the simulation speed of the sumo examples with TraCI and libsumo.
+
+Each of the ring road (sugiyama), merge, and grid examples is run for a
+number of steps with the kernel communicating with sumo through a TraCI socket
+and through libsumo (see SumoParams.use_libsumo), and the number of
+environment steps per second is reported for both. If libsumo is not
+installed, the second run falls back to TraCI and a warning is issued.
+"""
+
+import argparse
+import time
+from copy import deepcopy
+
+from examples.sumo.grid import grid_example
+from examples.sumo.merge import merge_example
+from examples.sumo.sugiyama import sugiyama_example
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_libsumo.py --num_steps 1000
+
+Here the arguments are:
+num_steps - number of environment steps performed per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the steps/sec of the examples with and without "
+                "libsumo",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_steps", type=int, default=1000,
+                    help="number of environment steps per test")
+
+EXAMPLES = [
+    ("ring", sugiyama_example),
+    ("merge", merge_example),
+    ("grid", grid_example),
+]
+
+
+def steps_per_sec(env, use_libsumo, num_steps):
+    """Return the steps/sec of a copy of env run with or without libsumo."""
+    sim_params = deepcopy(env.sim_params)
+    sim_params.use_libsumo = use_libsumo
+    env = type(env)(env.env_params, sim_params, env.scenario)
+
+    env.reset()
+    t = time.time()
+    for _ in range(num_steps):
+        env.step(rl_actions=None)
+    duration = time.time() - t
+
+    env.terminate()
+
+    return num_steps / duration
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for name, example in EXAMPLES:
+        exp = example(render=False)
+        # the environment of the example is only used as a template
+        exp.env.terminate()
+
+        print("{}:".format(name))
+        for use_libsumo in [False, True]:
+            print("  {}: {:.1f} steps/sec".format(
+                "libsumo" if use_libsumo else "traci",
+                steps_per_sec(exp.env, use_libsumo, args.num_steps)))
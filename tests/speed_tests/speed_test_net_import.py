@@ -0,0 +1,78 @@
+"""Measures the time needed to import the edges of the bay bridge network.
+
+The bay bridge .net.xml file is imported by the scenario kernel when a bay
+bridge environment is started. This compares the time (and peak memory) it
+takes to parse the file from scratch with the time it takes to read the
+sidecar file written after the first import.
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+import urllib.request
+
+from flow.core.kernel.scenario.net_file import read_net, SIDECAR_EXTENSION
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_net_import.py --num_runs 5
+
+Here the arguments are:
+num_runs - number of imports performed per test
+netfile - path to the .net.xml file, downloaded if it does not exist
+"""
+
+# location of the bay bridge network used by examples/sumo/bay_bridge.py
+NETFILE_URL = "https://s3-us-west-1.amazonaws.com/flow.netfiles/" \
+              "bay_bridge_TL_all_green.net.xml"
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the import time of the bay bridge network",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_runs", type=int, default=5,
+                    help="number of imports performed per test")
+parser.add_argument("--netfile", type=str, default=os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bay_bridge.net.xml"),
+                    help="path to the .net.xml file")
+
+
+def import_time(netfile, num_runs, sidecar):
+    """Return the average time and peak memory of an import, in s and MB."""
+    def run():
+        if not sidecar and os.path.exists(netfile + SIDECAR_EXTENSION):
+            os.remove(netfile + SIDECAR_EXTENSION)
+        read_net(netfile, no_internal_links=False, sidecar=sidecar)
+
+    t = time.time()
+    for _ in range(num_runs):
+        run()
+    average = (time.time() - t) / num_runs
+
+    # memory is measured separately, since tracing slows down the import
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return average, peak / 2 ** 20
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if not os.path.exists(args.netfile):
+        with open(args.netfile, "wb") as f:
+            f.write(urllib.request.urlopen(NETFILE_URL).read())
+
+    print("parsing:")
+    print("  time: {:.3f} s, peak memory: {:.1f} MB".format(
+        *import_time(args.netfile, args.num_runs, sidecar=False)))
+
+    # write the sidecar once, then read it in every run
+    read_net(args.netfile, no_internal_links=False, sidecar=True)
+    print("sidecar:")
+    print("  time: {:.3f} s, peak memory: {:.1f} MB".format(
+        *import_time(args.netfile, args.num_runs, sidecar=True)))
@@ -0,0 +1,59 @@
+"""Measures the overhead of profiling the phases of environment steps.
+
+The merge benchmark is run for a number of steps with and without profiling
+(see EnvParams.profile), and the number of steps per second is reported in
+both cases, followed by the statistics of the phases of the profiled run.
+"""
+
+import argparse
+import time
+from copy import deepcopy
+
+from flow.benchmarks.merge0 import flow_params
+from flow.utils.registry import make_create_env
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_profiler.py --num_steps 1000
+
+Here the arguments are:
+num_steps - number of environment steps performed per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the steps/sec of an environment with and without "
+                "profiling",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_steps", type=int, default=1000,
+                    help="number of environment steps per test")
+
+
+def steps_per_sec(profile, num_steps):
+    """Return the steps/sec of the environment, and its profiler."""
+    params = deepcopy(flow_params)
+    params["env"].profile = profile
+    create_env, _ = make_create_env(params)
+    env = create_env()
+
+    env.reset()
+    t = time.time()
+    for _ in range(num_steps):
+        env.step(env.action_space.sample())
+    duration = time.time() - t
+
+    env.terminate()
+
+    return num_steps / duration, env.profiler
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for profile in [False, True]:
+        speed, profiler = steps_per_sec(profile, args.num_steps)
+        print("{}: {:.1f} steps/sec".format(
+            "profiled" if profile else "not profiled", speed))
+
+    print(profiler.report())
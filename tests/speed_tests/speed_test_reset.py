@@ -0,0 +1,71 @@
+"""Measures the time needed to reset an environment that restarts sumo.
+
+Environments with restart_instance=True terminate their sumo instance and
+start a new one at every reset. This compares the reset latency when the new
+instance is launched during the reset with the latency when it is taken from
+a pool of instances launched in advance (see SumoParams.sumo_pool_size).
+"""
+
+import argparse
+import time
+
+from flow.core.params import SumoParams, EnvParams, NetParams, VehicleParams
+from flow.envs.test import TestEnv
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_reset.py --num_resets 20 --pool_size 2
+
+Here the arguments are:
+num_resets - number of resets performed per test
+num_steps - number of steps performed between two resets
+pool_size - number of sumo instances launched in advance
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the reset latency with and without a sumo pool",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_resets", type=int, default=20,
+                    help="number of resets performed per test")
+parser.add_argument("--num_steps", type=int, default=100,
+                    help="number of steps performed between two resets")
+parser.add_argument("--pool_size", type=int, default=2,
+                    help="number of sumo instances launched in advance")
+
+
+def reset_time(num_resets, num_steps, pool_size):
+    """Return the average duration of a reset, in seconds."""
+    vehicles = VehicleParams()
+    vehicles.add(veh_id="human", num_vehicles=22)
+    scenario = LoopScenario(
+        name="speed_test_reset",
+        vehicles=vehicles,
+        net_params=NetParams(additional_params=ADDITIONAL_NET_PARAMS))
+    sim_params = SumoParams(restart_instance=True, sumo_pool_size=pool_size)
+    env = TestEnv(EnvParams(), sim_params, scenario)
+
+    duration = 0
+    for _ in range(num_resets):
+        t = time.time()
+        env.reset()
+        duration += time.time() - t
+
+        # the pool is filled in the background while the rollout is run
+        for _ in range(num_steps):
+            env.step(rl_actions=None)
+
+    env.terminate()
+
+    return duration / num_resets
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for pool_size in [0, args.pool_size]:
+        print("pool size: {}".format(pool_size))
+        print("  reset latency: {:.3f} s".format(
+            reset_time(args.num_resets, args.num_steps, pool_size)))
@@ -0,0 +1,77 @@
+"""Measures the time needed to reset the merge and bottleneck benchmarks.
+
+The environments of these benchmarks restart sumo at every reset (and the
+bottleneck additionally performs warm-up steps). This compares the reset
+latency of the benchmarks with the latency when resetting by loading the state
+of sumo saved during the first reset, see SumoParams.snapshot_reset and
+SumoParams.snapshot_warmup.
+"""
+
+import argparse
+import time
+from copy import deepcopy
+
+from flow.benchmarks.bottleneck0 import flow_params as bottleneck_params
+from flow.benchmarks.merge0 import flow_params as merge_params
+from flow.utils.registry import make_create_env
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_snapshot_reset.py --num_resets 10
+
+Here the arguments are:
+num_resets - number of resets performed per test
+num_steps - number of steps performed between two resets
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the reset latency with and without saved states",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_resets", type=int, default=10,
+                    help="number of resets performed per test")
+parser.add_argument("--num_steps", type=int, default=100,
+                    help="number of steps performed between two resets")
+
+BENCHMARKS = [
+    ("merge", merge_params),
+    ("bottleneck", bottleneck_params),
+]
+
+
+def reset_time(flow_params, snapshot_reset, num_resets, num_steps):
+    """Return the average duration of a reset after the first, in seconds."""
+    flow_params = deepcopy(flow_params)
+    flow_params["sim"].snapshot_reset = snapshot_reset
+    flow_params["sim"].snapshot_warmup = snapshot_reset
+    create_env, _ = make_create_env(flow_params)
+    env = create_env()
+
+    # the first reset saves the states used by the following resets
+    env.reset()
+
+    duration = 0
+    for _ in range(num_resets):
+        for _ in range(num_steps):
+            env.step(rl_actions=None)
+
+        t = time.time()
+        env.reset()
+        duration += time.time() - t
+
+    env.terminate()
+
+    return duration / num_resets
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for name, flow_params in BENCHMARKS:
+        print("{}:".format(name))
+        for snapshot_reset in [False, True]:
+            print("  {}: {:.3f} s".format(
+                "snapshot reset" if snapshot_reset else "default reset",
+                reset_time(flow_params, snapshot_reset, args.num_resets,
+                           args.num_steps)))
@@ -0,0 +1,105 @@
+"""Measures the time needed to start a ring road environment.
+
+The startup of an environment is split into the following phases, the
+average duration of each of which is reported:
+
+- file generation: generating the xml files of the network (excluding the
+  call to netconvert)
+- netconvert: generating the .net.xml file with sumo's netconvert binary
+- sumo launch: starting the sumo process and connecting to it with TraCI
+- first step: resetting the environment and performing its first step
+"""
+
+import argparse
+import collections
+import contextlib
+import time
+
+from flow.core.kernel.scenario import TraCIScenario
+from flow.core.kernel.simulation import TraCISimulation
+from flow.core.params import SumoParams, EnvParams, NetParams, VehicleParams
+from flow.envs.test import TestEnv
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_startup.py --num_runs 10
+
+Here the arguments are:
+num_runs - number of environments started
+net_cache - whether to reuse the networks generated by netconvert
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the startup time of an environment",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_runs", type=int, default=10,
+                    help="number of environments started")
+parser.add_argument("--net_cache", action="store_true",
+                    help="reuse the networks generated by netconvert")
+
+
+@contextlib.contextmanager
+def timed(cls, method, durations):
+    """Accumulate the time spent in a method of a class in durations."""
+    original = getattr(cls, method)
+
+    def wrapper(*args, **kwargs):
+        t = time.time()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            durations[method] += time.time() - t
+
+    setattr(cls, method, wrapper)
+    try:
+        yield
+    finally:
+        setattr(cls, method, original)
+
+
+def startup_time(net_cache):
+    """Start an environment and return the duration of every phase."""
+    vehicles = VehicleParams()
+    vehicles.add(veh_id="human", num_vehicles=22)
+    scenario = LoopScenario(
+        name="speed_test_startup",
+        vehicles=vehicles,
+        net_params=NetParams(additional_params=ADDITIONAL_NET_PARAMS))
+    sim_params = SumoParams(net_cache_size=256 if net_cache else 0)
+
+    durations = collections.defaultdict(float)
+    with timed(TraCIScenario, "generate_network", durations), \
+            timed(TraCIScenario, "netconvert", durations), \
+            timed(TraCISimulation, "start_simulation", durations):
+        env = TestEnv(EnvParams(), sim_params, scenario)
+
+    t = time.time()
+    env.reset()
+    env.step(rl_actions=None)
+    first_step = time.time() - t
+
+    env.terminate()
+
+    return collections.OrderedDict([
+        ("file generation",
+         durations["generate_network"] - durations["netconvert"]),
+        ("netconvert", durations["netconvert"]),
+        ("sumo launch", durations["start_simulation"]),
+        ("first step", first_step),
+    ])
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    total = collections.OrderedDict()
+    for _ in range(args.num_runs):
+        for phase, duration in startup_time(args.net_cache).items():
+            total[phase] = total.get(phase, 0) + duration
+
+    for phase, duration in total.items():
+        print("{}: {:.3f} s".format(phase, duration / args.num_runs))
+    print("total: {:.3f} s".format(sum(total.values()) / args.num_runs))
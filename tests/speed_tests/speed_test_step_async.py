@@ -0,0 +1,71 @@
+"""Measures the speed of stepping environments without waiting for sumo.
+
+Several environments of the merge benchmark are advanced in a single thread,
+either with `step` (each environment waits for its simulation step before the
+next one is advanced) or with `step_async` followed by `step_wait` (the
+simulation steps of all environments are requested before waiting for any of
+them, so that the sumo instances compute them in parallel). The total number
+of environment steps per second is reported in both cases.
+"""
+
+import argparse
+import time
+
+from flow.benchmarks.merge0 import flow_params
+from flow.utils.registry import make_create_env
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_step_async.py --num_envs 4 --num_steps 200
+
+Here the arguments are:
+num_envs - number of environments advanced together
+num_steps - number of steps performed by every environment per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the steps/sec of environments advanced with step "
+                "and with step_async/step_wait",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_envs", type=int, default=4,
+                    help="number of environments advanced together")
+parser.add_argument("--num_steps", type=int, default=200,
+                    help="number of steps performed by every environment")
+
+
+def steps_per_sec(envs, use_async, num_steps):
+    """Return the total number of environment steps performed per second."""
+    actions = [env.action_space.sample() for env in envs]
+    for env in envs:
+        env.reset()
+
+    t = time.time()
+    for _ in range(num_steps):
+        if use_async:
+            for env, action in zip(envs, actions):
+                env.step_async(action)
+            for env in envs:
+                env.step_wait()
+        else:
+            for env, action in zip(envs, actions):
+                env.step(action)
+    duration = time.time() - t
+
+    return len(envs) * num_steps / duration
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    create_env, _ = make_create_env(flow_params)
+    envs = [create_env() for _ in range(args.num_envs)]
+
+    for use_async in [False, True]:
+        print("{}: {:.1f} steps/sec".format(
+            "step_async/step_wait" if use_async else "step",
+            steps_per_sec(envs, use_async, args.num_steps)))
+
+    for env in envs:
+        env.terminate()
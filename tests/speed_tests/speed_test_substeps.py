@@ -0,0 +1,71 @@
+"""Measures the speed of rollouts with several simulation steps per step.
+
+Vehicles entering a highway from a high-volume inflow are simulated with
+several sumo simulation steps per rollout step, which are either advanced one
+at a time (with the kernel updated after every one of them) or all at once
+(see EnvParams.batch_substeps). The number of rollout steps per second is
+reported for every number of simulation steps per rollout step.
+"""
+
+import argparse
+import time
+
+from flow.core.params import SumoParams, EnvParams, NetParams, InFlows, \
+    VehicleParams
+from flow.envs.test import TestEnv
+from flow.scenarios.highway import HighwayScenario, ADDITIONAL_NET_PARAMS
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_substeps.py --num_steps 500
+
+Here the arguments are:
+num_steps - number of rollout steps performed per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the speed of rollouts with batched simulation "
+                "steps",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--num_steps", type=int, default=500,
+                    help="number of rollout steps per test")
+
+
+def steps_per_sec(sims_per_step, batch_substeps, num_steps):
+    """Return the number of rollout steps performed per second."""
+    vehicles = VehicleParams()
+    vehicles.add(veh_id="human", num_vehicles=0)
+    inflows = InFlows()
+    inflows.add(veh_type="human", edge="highway_0", vehs_per_hour=4000,
+                depart_lane="free", depart_speed="max")
+    scenario = HighwayScenario(
+        name="speed_test_substeps",
+        vehicles=vehicles,
+        net_params=NetParams(
+            inflows=inflows, additional_params=ADDITIONAL_NET_PARAMS))
+    env_params = EnvParams(sims_per_step=sims_per_step,
+                           batch_substeps=batch_substeps)
+    env = TestEnv(env_params, SumoParams(), scenario)
+
+    env.reset()
+    t = time.time()
+    for _ in range(num_steps):
+        env.step(rl_actions=None)
+    duration = time.time() - t
+
+    env.terminate()
+
+    return num_steps / duration
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for sims_per_step in [5, 10]:
+        print("sims_per_step: {}".format(sims_per_step))
+        for batch_substeps in [False, True]:
+            print("  {}: {:.1f} steps/sec".format(
+                "batched" if batch_substeps else "one at a time",
+                steps_per_sec(sims_per_step, batch_substeps, args.num_steps)))
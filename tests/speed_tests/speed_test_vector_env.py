@@ -0,0 +1,73 @@
+"""Measures the speed of stepping several environments at once.
+
+Several environments of a benchmark are advanced one after the other,
+concurrently on a pool of threads (see flow.envs.vector_env.FlowVectorEnv),
+and in worker processes sharing their observations through shared memory (see
+flow.envs.vector_env.FlowSubprocVectorEnv). The total number of environment
+steps per second is reported in all cases for every number of environments.
+"""
+
+import argparse
+import importlib
+import time
+
+from flow.envs.vector_env import FlowVectorEnv, FlowSubprocVectorEnv
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_vector_env.py --benchmark bottleneck0 --num_steps 200
+
+Here the arguments are:
+benchmark - name of the benchmark in flow/benchmarks the environments are
+            created from
+num_steps - number of steps performed by every environment per test
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the steps/sec of several environments stepped "
+                "sequentially, on threads, and in worker processes",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--benchmark", type=str, default="merge0",
+                    help="name of the benchmark the environments run")
+parser.add_argument("--num_steps", type=int, default=200,
+                    help="number of steps performed by every environment")
+
+MODES = ["sequential", "thread pool", "subprocess"]
+
+
+def steps_per_sec(flow_params, num_envs, mode, num_steps):
+    """Return the total number of environment steps performed per second."""
+    if mode == "subprocess":
+        env = FlowSubprocVectorEnv(flow_params, num_envs=num_envs)
+    else:
+        env = FlowVectorEnv(flow_params, num_envs=num_envs)
+    env.reset()
+    actions = [env.action_space.sample() for _ in range(num_envs)]
+
+    t = time.time()
+    for _ in range(num_steps):
+        if mode == "sequential":
+            for sub_env, action in zip(env.envs, actions):
+                sub_env.step(action)
+        else:
+            env.step(actions)
+    duration = time.time() - t
+
+    env.close()
+
+    return num_envs * num_steps / duration
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    benchmark = importlib.import_module(
+        "flow.benchmarks.{}".format(args.benchmark))
+
+    for num_envs in [1, 2, 4, 8]:
+        print("num_envs: {}".format(num_envs))
+        for mode in MODES:
+            print("  {}: {:.1f} steps/sec".format(
+                mode, steps_per_sec(benchmark.flow_params, num_envs, mode,
+                                    args.num_steps)))
@@ -0,0 +1,85 @@
+"""Measures the time needed to reset environments with many warm-up steps.
+
+Environments of the merge and bottleneck benchmarks are created one after the
+other (as is the case for the workers of a training algorithm), and reset
+several times. The average reset latency is reported when the warm-up steps
+are performed at every reset, and when the states at the end of the warm-up
+steps are shared through the warm-up cache (see SumoParams.warmup_cache), in
+which case only the first reset of the first environment performs the warm-up
+steps of every state of the pool.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from copy import deepcopy
+
+from flow.benchmarks.bottleneck0 import flow_params as bottleneck_params
+from flow.benchmarks.merge0 import flow_params as merge_params
+from flow.utils.registry import make_create_env
+
+EXAMPLE_USAGE = """
+example usage:
+    python ./speed_test_warmup_cache.py --warmup_steps 200 --num_envs 4
+
+Here the arguments are:
+warmup_steps - number of warm-up steps of the environments
+num_envs - number of environments created per test
+num_resets - number of resets performed per environment
+pool_size - number of warm states cached per configuration
+"""
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="Measures the reset latency with and without a warm-up cache",
+    epilog=EXAMPLE_USAGE)
+
+parser.add_argument("--warmup_steps", type=int, default=200,
+                    help="number of warm-up steps of the environments")
+parser.add_argument("--num_envs", type=int, default=4,
+                    help="number of environments created per test")
+parser.add_argument("--num_resets", type=int, default=5,
+                    help="number of resets performed per environment")
+parser.add_argument("--pool_size", type=int, default=1,
+                    help="number of warm states cached per configuration")
+
+BENCHMARKS = [
+    ("merge", merge_params),
+    ("bottleneck", bottleneck_params),
+]
+
+
+def reset_time(flow_params, warmup_cache, args):
+    """Return the average duration of a reset, in seconds."""
+    cache_dir = tempfile.mkdtemp()
+    flow_params = deepcopy(flow_params)
+    flow_params["env"].warmup_steps = args.warmup_steps
+    flow_params["sim"].warmup_cache = warmup_cache
+    flow_params["sim"].warmup_cache_dir = cache_dir
+    flow_params["sim"].warmup_pool_size = args.pool_size
+
+    duration = 0
+    for _ in range(args.num_envs):
+        create_env, _ = make_create_env(flow_params)
+        env = create_env()
+        for _ in range(args.num_resets):
+            t = time.time()
+            env.reset()
+            duration += time.time() - t
+        env.terminate()
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return duration / (args.num_envs * args.num_resets)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for name, flow_params in BENCHMARKS:
+        print("{}:".format(name))
+        for warmup_cache in [False, True]:
+            print("  {}: {:.3f} s".format(
+                "warm-up cache" if warmup_cache else "no cache",
+                reset_time(flow_params, warmup_cache, args)))